@@ -0,0 +1,89 @@
+"""
+Coste de parseo por página de cada backend de parsing.py
+
+Uso (desde python_app/):
+    python benchmarks/bench_parsers.py [fichero.html | URL ...]
+
+Sin argumentos descarga la home y la primera página del listado de BASE_URL.
+"""
+import asyncio
+import os
+import sys
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import BASE_URL  # noqa: E402
+from parsing import PARSERS  # noqa: E402
+from scrapers.cards import extract_card  # noqa: E402
+from utils import fetch_html, close_http_client  # noqa: E402
+
+CARD_SELECTOR = ".TPost"
+
+
+async def _load_pages(sources: List[str]) -> List[Tuple[str, bytes]]:
+    pages = []
+    try:
+        for source in sources:
+            if source.startswith("http"):
+                content = await fetch_html(source)
+            else:
+                with open(source, "rb") as f:
+                    content = f.read()
+            if content:
+                pages.append((source, content))
+            else:
+                print(f"No se pudo cargar {source}")
+    finally:
+        await close_http_client()
+    return pages
+
+
+def _available_backends() -> List[str]:
+    backends = []
+    for name, parse in PARSERS.items():
+        try:
+            parse(b"<html></html>")
+        except RuntimeError as e:
+            print(f"Omitiendo {name}: {e}")
+            continue
+        backends.append(name)
+    return backends
+
+
+def _time_per_call(fn, min_time: float = 0.5) -> float:
+    """
+    Tiempo medio (ms) por llamada, repitiendo hasta acumular `min_time` segundos
+    """
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / calls * 1000
+
+
+def main() -> None:
+    sources = sys.argv[1:] or [BASE_URL, f"{BASE_URL}/series-online/"]
+    pages = asyncio.run(_load_pages(sources))
+    backends = _available_backends()
+
+    print(f"{'página':<45} {'KB':>6} {'backend':<11} {'parse ms':>9} {'parse+cards ms':>15}")
+    for source, content in pages:
+        for name in backends:
+            parse = PARSERS[name]
+
+            def parse_and_extract():
+                for item in parse(content).select(CARD_SELECTOR):
+                    extract_card(item)
+
+            parse_ms = _time_per_call(lambda: parse(content))
+            total_ms = _time_per_call(parse_and_extract)
+            print(f"{source[-45:]:<45} {len(content) / 1024:>6.1f} {name:<11} {parse_ms:>9.2f} {total_ms:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
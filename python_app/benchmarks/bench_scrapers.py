@@ -0,0 +1,404 @@
+"""
+Rendimiento de los scrapers y de los endpoints contra las páginas grabadas
+en benchmarks/fixtures/ (servidas por origin.py), sin depender de la red.
+
+Uso (desde python_app/):
+    python benchmarks/bench_scrapers.py [--mode all|inprocess|app] [--requests 200]
+        [--concurrency 16] [--delay 0.02] [--cache] [--output FICHERO]
+    python benchmarks/bench_scrapers.py --compare BASE [NUEVO] [--threshold 0.1]
+
+- inprocess: llama a scrape_home, scrape_series_list, scrape_series_detail,
+  scrape_episode_servers y scrape_search en este proceso.
+- app: arranca la API con uvicorn y la carga con peticiones HTTP concurrentes.
+
+Por defecto la caché y la revalidación están desactivadas (cada petición
+descarga y parsea); con --cache se mide el camino con caché caliente. Las
+variables de entorno (PARSER_BACKEND, PARSE_EXECUTOR, ...) se respetan.
+
+Los resultados se guardan en benchmarks/results/<commit>.json; --compare
+acepta ficheros o prefijos de commit y termina con código 1 si alguna
+métrica empeora más que el umbral.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(APP_DIR, "benchmarks")
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+sys.path.insert(0, APP_DIR)
+
+# Métricas comparadas y si un valor mayor es mejor
+COMPARED_METRICS = {"ops_s": True, "p50_ms": False, "p99_ms": False}
+
+# Configuración de la API durante la medición (se puede sobrescribir con el entorno)
+BENCH_ENV = {
+    "REVALIDATE_ENABLED": "0",
+    "GOVERNOR_RATE": "0",
+    "MAX_CONNECTIONS_PER_HOST": "64",
+    "FETCH_RETRIES": "0",
+    "PREWARM_ENABLED": "0",
+    "SEARCH_INDEX_ENABLED": "0",
+    "CATALOG_PATH": "",
+    "CACHE_DISK_PATH": "",
+}
+
+SERIES_ID = "bench-serie"
+EPISODE_PATH = "/episodio/bench-serie-1x1/"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 20) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El proceso de {url} terminó con código {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} no respondió en {timeout}s")
+
+
+def _start(args: List[str], health_url: str, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    process = subprocess.Popen(args, cwd=APP_DIR, env=env)
+    try:
+        _wait_until_up(health_url, process)
+    except Exception:
+        _stop(process)
+        raise
+    return process
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summary(latencies: List[float], elapsed: float, errors: int) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "ops_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 3),
+        "p90_ms": round(_percentile(ordered, 90) * 1000, 3),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+async def _load(call: Callable[[], Awaitable[bool]], requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Ejecuta `requests` llamadas con `concurrency` en vuelo; una llamada que
+    devuelve False o lanza una excepción cuenta como error
+    """
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                ok = await call()
+            except Exception as e:
+                print(f"Error en la llamada: {e}")
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, requests)))))
+    return _summary(latencies, time.perf_counter() - start, errors)
+
+
+def _print_table(title: str, results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{title}")
+    print(f"{'objetivo':<34} {'ops/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errores':>8}")
+    for name, stats in results.items():
+        print(
+            f"{name:<34} {stats['ops_s']:>9.1f} {stats['p50_ms']:>9.2f} {stats['p90_ms']:>9.2f} "
+            f"{stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f} {stats['errors']:>8}"
+        )
+
+
+async def bench_inprocess(origin_url: str, requests: int, concurrency: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Scrapers llamados directamente (descarga del origen local + parseo)
+    """
+    # Importados aquí: config lee el entorno preparado en main()
+    from scrapers.home_scraper import scrape_home
+    from scrapers.series_scraper import scrape_series_list, scrape_series_detail, scrape_episode_servers
+    from scrapers.search_scraper import scrape_search
+    from utils import close_http_client, shutdown_parse_pool
+
+    scrapers: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "scrape_home": scrape_home,
+        "scrape_series_list": lambda: scrape_series_list(1),
+        "scrape_series_detail": lambda: scrape_series_detail(SERIES_ID),
+        "scrape_episode_servers": lambda: scrape_episode_servers(origin_url + EPISODE_PATH),
+        "scrape_search": lambda: scrape_search("casa"),
+    }
+
+    results = {}
+    try:
+        for name, scrape in scrapers.items():
+            async def call(scrape=scrape) -> bool:
+                return bool(await scrape())
+
+            if warmup:
+                await _load(call, warmup, concurrency)
+            results[name] = await _load(call, requests, concurrency)
+    finally:
+        await close_http_client()
+        shutdown_parse_pool()
+    return results
+
+
+async def bench_app(api_url: str, origin_url: str, requests: int, concurrency: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Endpoints de la API a través de HTTP (uvicorn + FastAPI + serialización)
+    """
+    import httpx
+
+    episode_url = urllib.parse.quote(origin_url + EPISODE_PATH, safe="")
+    endpoints = {
+        "GET /api/home": "/api/home",
+        "GET /api/series": "/api/series?page=1",
+        "GET /api/series/{id}": f"/api/series/{SERIES_ID}",
+        "GET /api/series/episode/servers": f"/api/series/episode/servers?episode_url={episode_url}",
+        "GET /api/search": "/api/search?q=casa",
+    }
+
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api_url, timeout=60, limits=limits) as client:
+        for name, path in endpoints.items():
+            async def call(path=path) -> bool:
+                response = await client.get(path)
+                return response.status_code == 200
+
+            if warmup:
+                await _load(call, warmup, concurrency)
+            results[name] = await _load(call, requests, concurrency)
+    return results
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _fixtures_hash() -> str:
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*"))):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def _metadata(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "subject": _git("log", "-1", "--format=%s"),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "fixtures": _fixtures_hash(),
+        "params": params,
+    }
+
+
+def _save(report: Dict[str, Any], output: Optional[str]) -> str:
+    if output is None:
+        meta = report["meta"]
+        name = meta["commit"] + ("-dirty" if meta["dirty"] else "")
+        output = os.path.join(RESULTS_DIR, f"{name}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def _resolve_result(ref: str) -> str:
+    """
+    Fichero de resultados a partir de una ruta o de un prefijo de commit
+    """
+    if os.path.isfile(ref):
+        return ref
+    matches = sorted(glob.glob(os.path.join(RESULTS_DIR, f"{ref}*.json")), key=os.path.getmtime)
+    if not matches:
+        raise SystemExit(f"No hay resultados para {ref!r} en {RESULTS_DIR}")
+    return matches[-1]
+
+
+def compare(base_ref: str, new_ref: Optional[str], threshold: float) -> int:
+    """
+    Compara dos ejecuciones (por defecto contra la más reciente) y devuelve
+    el número de regresiones por encima del umbral
+    """
+    if new_ref is None:
+        candidates = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")), key=os.path.getmtime)
+        if not candidates:
+            raise SystemExit(f"No hay resultados en {RESULTS_DIR}")
+        new_ref = candidates[-1]
+    with open(_resolve_result(base_ref), encoding="utf-8") as f:
+        base = json.load(f)
+    with open(_resolve_result(new_ref), encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"base:  {base['meta']['commit']} {base['meta'].get('subject', '')}")
+    print(f"nuevo: {new['meta']['commit']} {new['meta'].get('subject', '')}")
+    # El modo puede diferir: solo se comparan los objetivos presentes en ambas
+    for field in ("fixtures", "params", "python"):
+        before, after = base["meta"].get(field), new["meta"].get(field)
+        if field == "params":
+            before, after = ({k: v for k, v in p.items() if k != "mode"} for p in (before or {}, after or {}))
+        if before != after:
+            print(f"Aviso: {field} distinto entre las dos ejecuciones; la comparación puede no ser válida")
+
+    regressions = 0
+    print(f"\n{'objetivo':<40} {'métrica':<8} {'base':>10} {'nuevo':>10} {'cambio':>9}")
+    for mode, targets in new["results"].items():
+        for name, stats in targets.items():
+            base_stats = base["results"].get(mode, {}).get(name)
+            if base_stats is None:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                before, after = base_stats[metric], stats[metric]
+                if not before:
+                    continue
+                change = (after - before) / before
+                worse = -change if higher_is_better else change
+                flag = ""
+                if worse > threshold:
+                    flag = "  REGRESIÓN"
+                    regressions += 1
+                print(f"{mode + ' ' + name:<40} {metric:<8} {before:>10.2f} {after:>10.2f} {change:>+8.1%}{flag}")
+    print(f"\n{regressions} regresiones por encima del {threshold:.0%}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de scrapers y endpoints con páginas grabadas")
+    parser.add_argument("--mode", choices=("all", "inprocess", "app"), default="all")
+    parser.add_argument("--requests", type=int, default=200, help="llamadas medidas por objetivo")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=10, help="llamadas previas sin medir por objetivo")
+    parser.add_argument("--delay", type=float, default=0.0, help="latencia simulada del origen (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="variación de la latencia del origen (s)")
+    parser.add_argument("--cache", action="store_true", help="medir con la caché de respuestas activada")
+    parser.add_argument("--output", help="fichero de resultados (por defecto results/<commit>.json)")
+    parser.add_argument("--no-save", action="store_true", help="no guardar los resultados")
+    parser.add_argument("--compare", nargs="+", metavar="REF", help="comparar BASE [NUEVO] en vez de medir")
+    parser.add_argument("--threshold", type=float, default=0.10, help="empeoramiento tolerado en --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        if len(args.compare) > 2:
+            parser.error("--compare acepta una o dos referencias")
+        base_ref, new_ref = args.compare[0], (args.compare[1] if len(args.compare) > 1 else None)
+        sys.exit(1 if compare(base_ref, new_ref, args.threshold) else 0)
+
+    origin_port = _free_port()
+    origin_url = f"http://127.0.0.1:{origin_port}"
+    # El entorno se prepara antes de importar config (en este proceso y en la API)
+    os.environ["BASE_URL"] = origin_url
+    os.environ["CACHE_ENABLED"] = "1" if args.cache else "0"
+    for name, value in BENCH_ENV.items():
+        os.environ.setdefault(name, value)
+
+    params = {
+        "mode": args.mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "warmup": args.warmup,
+        "delay": args.delay,
+        "jitter": args.jitter,
+        "cache": args.cache,
+        "parser_backend": os.getenv("PARSER_BACKEND", "lxml"),
+        "parse_executor": os.getenv("PARSE_EXECUTOR", "thread"),
+    }
+    results: Dict[str, Dict[str, Any]] = {}
+
+    origin = _start(
+        [sys.executable, os.path.join(BENCH_DIR, "origin.py"), "--port", str(origin_port),
+         "--delay", str(args.delay), "--jitter", str(args.jitter)],
+        origin_url + "/",
+    )
+    try:
+        if args.mode in ("all", "inprocess"):
+            results["inprocess"] = asyncio.run(
+                bench_inprocess(origin_url, args.requests, args.concurrency, args.warmup)
+            )
+            _print_table("Scrapers (en proceso)", results["inprocess"])
+
+        if args.mode in ("all", "app"):
+            api_port = _free_port()
+            api_url = f"http://127.0.0.1:{api_port}"
+            api = _start(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port),
+                 "--log-level", "warning", "--no-access-log"],
+                api_url + "/health",
+                env=dict(os.environ),
+            )
+            try:
+                results["app"] = asyncio.run(
+                    bench_app(api_url, origin_url, args.requests, args.concurrency, args.warmup)
+                )
+            finally:
+                _stop(api)
+            _print_table("Endpoints (uvicorn)", results["app"])
+    finally:
+        _stop(origin)
+
+    if not args.no_save:
+        path = _save({"meta": _metadata(params), "results": results}, args.output)
+        print(f"\nResultados guardados en {os.path.relpath(path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Origen local que sirve las páginas grabadas en benchmarks/fixtures/ con las
+mismas rutas que el sitio real, para medir sin depender de la red.
+
+Uso (desde python_app/):
+    python benchmarks/origin.py [--port 9300] [--delay 0.02] [--jitter 0.01]
+
+Los enlaces absolutos al sitio grabado (base_url de fixtures/meta.json) se
+reescriben para apuntar a este origen. Cualquier serie, temporada o episodio
+devuelve la misma página grabada. Responde con ETag y 304 a If-None-Match.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+from typing import Dict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Página grabada de cada tipo de ruta
+PAGES = {
+    "home": "home.html",
+    "series_list": "series_list.html",
+    "serie": "serie.html",
+    "season": "season.html",
+    "episode": "episode.html",
+    "search": "search.html",
+}
+
+
+def load_fixtures(origin_url: str) -> Dict[str, bytes]:
+    """
+    Lee las páginas grabadas reescribiendo el dominio original por `origin_url`
+    """
+    with open(os.path.join(FIXTURES_DIR, "meta.json"), encoding="utf-8") as f:
+        recorded_base = json.load(f)["base_url"].rstrip("/").encode()
+    pages = {}
+    for name, filename in PAGES.items():
+        with open(os.path.join(FIXTURES_DIR, filename), "rb") as f:
+            pages[name] = f.read().replace(recorded_base, origin_url.rstrip("/").encode())
+    return pages
+
+
+def create_app(origin_url: str, delay: float = 0.0, jitter: float = 0.0) -> Starlette:
+    pages = load_fixtures(origin_url)
+    etags = {name: '"%s"' % hashlib.sha1(content).hexdigest() for name, content in pages.items()}
+
+    def page(name: str):
+        async def endpoint(request: Request) -> Response:
+            # Latencia simulada del origen
+            if delay or jitter:
+                await asyncio.sleep(max(0.0, delay + random.uniform(-jitter, jitter)))
+            # WordPress sirve la búsqueda en la home con ?s=
+            key = "search" if name == "home" and "s" in request.query_params else name
+            headers = {"ETag": etags[key], "Cache-Control": "max-age=0"}
+            if request.headers.get("if-none-match") == etags[key]:
+                return Response(status_code=304, headers=headers)
+            return Response(pages[key], media_type="text/html; charset=UTF-8", headers=headers)
+        return endpoint
+
+    return Starlette(routes=[
+        Route("/", page("home")),
+        Route("/series-online/", page("series_list")),
+        Route("/series-online/page/{page:int}/", page("series_list")),
+        Route("/serie/{slug}/", page("serie")),
+        Route("/temporada/{slug}/", page("season")),
+        Route("/episodio/{slug}/", page("episode")),
+    ])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Origen local con las páginas grabadas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9300)
+    parser.add_argument("--delay", type=float, default=0.0, help="latencia media por respuesta (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="variación aleatoria de la latencia (s)")
+    args = parser.parse_args()
+
+    app = create_app(f"http://{args.host}:{args.port}", args.delay, args.jitter)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Graba en benchmarks/fixtures/ las páginas del sitio real que replayan
+origin.py y bench_scrapers.py: home, listado, una serie, una de sus
+temporadas, uno de sus episodios y una búsqueda.
+
+Uso (desde python_app/):
+    python benchmarks/record_fixtures.py [--query casa]
+
+Descarga de BASE_URL; la serie es la primera del listado que tenga temporadas.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import BASE_URL  # noqa: E402
+from utils import fetch_html, close_http_client  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _first_link(content: bytes, kind: str) -> Optional[str]:
+    """
+    Primer enlace a /{kind}/ de la página (serie, temporada o episodio)
+    """
+    match = re.search(rb'href="([^"]*/%s/[^"]+)"' % kind.encode(), content)
+    if match is None:
+        return None
+    return urllib.parse.urljoin(BASE_URL + "/", match.group(1).decode())
+
+
+async def _fetch(url: str) -> bytes:
+    content = await fetch_html(url)
+    if not content:
+        raise RuntimeError(f"No se pudo descargar {url}")
+    return content
+
+
+async def record(query: str) -> None:
+    pages = {
+        "home.html": await _fetch(f"{BASE_URL}/"),
+        "series_list.html": await _fetch(f"{BASE_URL}/series-online/"),
+        "search.html": await _fetch(f"{BASE_URL}/?s={urllib.parse.quote(query)}"),
+    }
+
+    # Primera serie del listado con enlaces a temporadas y episodios
+    series_urls = re.findall(rb'href="([^"]*/serie/[^"]+)"', pages["series_list.html"])
+    for series_url in dict.fromkeys(series_urls):
+        series_url = urllib.parse.urljoin(BASE_URL + "/", series_url.decode())
+        serie = await _fetch(series_url)
+        season_url = _first_link(serie, "temporada")
+        if season_url is None:
+            continue
+        season = await _fetch(season_url)
+        episode_url = _first_link(season, "episodio")
+        if episode_url is None:
+            continue
+        pages["serie.html"] = serie
+        pages["season.html"] = season
+        pages["episode.html"] = await _fetch(episode_url)
+        print(f"Serie grabada: {series_url}")
+        break
+    else:
+        raise RuntimeError("Ninguna serie del listado tiene temporadas con episodios")
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for filename, content in pages.items():
+        with open(os.path.join(FIXTURES_DIR, filename), "wb") as f:
+            f.write(content)
+        print(f"{filename:<18} {len(content) / 1024:>7.1f} KB")
+
+    with open(os.path.join(FIXTURES_DIR, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {"base_url": BASE_URL, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Graba las páginas de benchmarks/fixtures/")
+    parser.add_argument("--query", default="casa", help="término de la búsqueda grabada")
+    args = parser.parse_args()
+    try:
+        await record(args.query)
+    finally:
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,603 @@
+import asyncio
+import math
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from pydantic import TypeAdapter
+from config import CACHE_ENABLED, CACHE_MEMORY_BYTES, CACHE_STALE_TTL, CACHE_LEASE_SECONDS
+from governor import PRIORITY_USER, PriorityGroup, background_priority, current_priority, governor, priority_group
+from metrics import record_cache
+
+# Estados de caché que se exponen en la cabecera X-Cache
+HIT = "HIT"
+MISS = "MISS"
+# Entrada caducada servida mientras se refresca en segundo plano
+STALE = "STALE"
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def type_adapter(type_: Any) -> TypeAdapter:
+    """
+    TypeAdapter de pydantic reutilizable para serializar cada tipo cacheado
+    """
+    adapter = _adapters.get(type_)
+    if adapter is None:
+        adapter = TypeAdapter(type_)
+        _adapters[type_] = adapter
+    return adapter
+
+
+def _dump(value: Any, type_: Any) -> bytes:
+    """
+    Serializa un valor para guardarlo en disco (el HTML se guarda tal cual)
+    """
+    if type_ is bytes:
+        return value
+    return type_adapter(type_).dump_json(value)
+
+
+def _load(data: bytes, type_: Any) -> Any:
+    """
+    Reconstruye un valor guardado en disco
+    """
+    if type_ is bytes:
+        return data
+    return type_adapter(type_).validate_json(data)
+
+
+class MemoryCache:
+    """
+    Nivel en memoria: LRU con presupuesto máximo en bytes
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # clave -> (valor, JSON, tamaño, fresco_hasta, caduca_en)
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[bytes], int, float, float]]" = OrderedDict()
+        # id(valor) -> clave, para encontrar el JSON ya serializado de un valor cacheado
+        self._keys: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, allow_expired: bool = False) -> Optional[Tuple[Any, float, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, _, _, fresh_until, expires_at = entry
+        # Las entradas caducadas se conservan (hasta que las desaloje el LRU)
+        # para servirlas si el origen falla
+        if expires_at <= time.time() and not allow_expired:
+            return None
+        self._entries.move_to_end(key)
+        return value, fresh_until, expires_at
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        data: Optional[bytes],
+        size: int,
+        fresh_until: float,
+        expires_at: float,
+    ) -> None:
+        self.delete(key)
+        # Un valor más grande que todo el presupuesto no se guarda
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, data, size, fresh_until, expires_at)
+        self._keys[id(value)] = key
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._forget(evicted_key, evicted)
+
+    def serialized(self, value: Any) -> Optional[bytes]:
+        """
+        JSON guardado junto a `value` si es el mismo objeto que está en caché
+        """
+        key = self._keys.get(id(value))
+        entry = self._entries.get(key) if key is not None else None
+        if entry is None or entry[0] is not value:
+            return None
+        return entry[1]
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._forget(key, entry)
+
+    def _forget(self, key: str, entry: Tuple[Any, Optional[bytes], int, float, float]) -> None:
+        self.current_bytes -= entry[2]
+        # El mismo objeto puede estar guardado también con otra clave
+        if self._keys.get(id(entry[0])) == key:
+            del self._keys[id(entry[0])]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys.clear()
+        self.current_bytes = 0
+
+
+class DiskCache:
+    """
+    Nivel en disco (SQLite): sobrevive a los reinicios del proceso y, en modo
+    WAL, lo comparten los workers del servidor (lectores y un escritor a la vez)
+
+    Ningún método se llama desde el bucle de eventos si puede esperar a otro
+    proceso (hasta BUSY_TIMEOUT): las lecturas y las reservas de carga
+    (leases) se hacen en un hilo del executor, y las escrituras se encolan y
+    las hace un hilo propio en lotes (una transacción por lote). La
+    liberación de una reserva va por la misma cola, así que se publica
+    después de la entrada que se escribió con ella.
+    """
+
+    # Cada cuántas escrituras se purgan las entradas caducadas
+    PURGE_EVERY = 500
+    # Escrituras que se confirman juntas como mucho
+    WRITE_BATCH = 200
+    # Al cambiar el esquema se descarta la caché anterior
+    SCHEMA_VERSION = 3
+    # Segundos que se espera a que otro proceso libere la base de datos
+    BUSY_TIMEOUT = 5
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # En WAL basta con sincronizar en los checkpoints
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS cache")
+            self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "fresh_until REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        # Cargas en curso: qué proceso está obteniendo cada clave y hasta cuándo
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        # Feed de cambios (changes.py): el id es el cursor que ven los clientes
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS changes ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, "
+            "data TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        # La conexión la usan los hilos del executor de uno en uno
+        self._lock = threading.Lock()
+        # Escrituras pendientes: (sql, parámetros); None para el hilo
+        self._pending: "queue.Queue[Optional[Tuple[str, tuple]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="cache-writer", daemon=True)
+        self._writer.start()
+
+    # Lecturas y reservas (bloqueantes: desde un hilo)
+
+    def get(self, key: str, allow_expired: bool = False) -> Optional[Tuple[bytes, float, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, fresh_until, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (row[2] <= time.time() and not allow_expired):
+            return None
+        return row[0], row[1], row[2]
+
+    def stored_until(self, key: str) -> Optional[Tuple[float, float]]:
+        """
+        (fresco_hasta, caduca) de una clave, aunque haya caducado, sin leer
+        el valor: lo que consultan los workers que esperan a otro
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT fresh_until, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+
+    def acquire_lease(self, key: str, owner: str, seconds: float) -> bool:
+        """
+        Reserva la carga de `key` para `owner` si nadie la tiene (o ha caducado)
+        """
+        with self._lock:
+            now = time.time()
+            cursor = self._conn.execute(
+                "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at <= ?",
+                (key, owner, now + seconds, now),
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def add_changes(self, changes: List[Tuple[str, str]], keep: int) -> None:
+        """
+        Añade cambios (clave, JSON) ignorando las claves ya registradas y
+        conserva solo los `keep` más recientes
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO changes (key, data, created_at) VALUES (?, ?, ?)",
+                [(key, data, now) for key, data in changes],
+            )
+            self._conn.execute("DELETE FROM changes WHERE id <= (SELECT MAX(id) FROM changes) - ?", (keep,))
+            self._conn.commit()
+
+    def change_bounds(self) -> Tuple[int, int]:
+        """
+        (primer cursor guardado, último cursor); (0, 0) si no hay cambios
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(id), MAX(id) FROM changes").fetchone()
+        return row[0] or 0, row[1] or 0
+
+    def changes_since(self, cursor: int, until: int, limit: int) -> List[Tuple[int, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, data FROM changes WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                (cursor, until, limit),
+            ).fetchall()
+
+    # Escrituras (no bloquean: se encolan)
+
+    def set(self, key: str, data: bytes, fresh_until: float, expires_at: float) -> None:
+        self._pending.put((
+            "INSERT OR REPLACE INTO cache (key, value, fresh_until, expires_at) VALUES (?, ?, ?, ?)",
+            (key, data, fresh_until, expires_at),
+        ))
+
+    def delete(self, key: str) -> None:
+        self._pending.put(("DELETE FROM cache WHERE key = ?", (key,)))
+
+    def release_lease(self, key: str, owner: str) -> None:
+        self._pending.put(("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner)))
+
+    def flush(self) -> None:
+        """
+        Espera a que estén escritas todas las escrituras encoladas
+        """
+        self._pending.join()
+
+    def _write_loop(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        running = True
+        while running:
+            batch = [self._pending.get()]
+            while len(batch) < self.WRITE_BATCH:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for write in batch:
+                    if write is None:
+                        running = False
+                        continue
+                    conn.execute(*write)
+                    if write[0].startswith("INSERT"):
+                        self._writes += 1
+                        if self._writes % self.PURGE_EVERY == 0:
+                            self._purge_expired(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Error writing cache: {e}")
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+        conn.close()
+
+    @staticmethod
+    def _purge_expired(conn: sqlite3.Connection) -> None:
+        now = time.time()
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+
+    def close(self) -> None:
+        # Lo encolado se escribe antes de cerrar
+        self._pending.put(None)
+        self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Caché en dos niveles para HTML crudo (por URL) y modelos ya parseados.
+
+    Cada entrada es fresca durante su TTL y después puede servirse caducada
+    durante `stale_ttl` segundos mientras se refresca en segundo plano.
+    Las cargas concurrentes de una misma clave comparten una única tarea y,
+    con el nivel en disco, también entre procesos: el resto de workers espera
+    a que el que carga la clave la escriba en disco.
+    """
+
+    # Cada cuánto se mira si otro proceso ha terminado de cargar una clave
+    LEASE_POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        memory_bytes: int,
+        enabled: bool = True,
+        stale_ttl: float = 0,
+        lease_seconds: float = CACHE_LEASE_SECONDS,
+    ):
+        self.enabled = enabled
+        self.stale_ttl = stale_ttl
+        self.lease_seconds = lease_seconds
+        self.memory = MemoryCache(memory_bytes)
+        self.disk: Optional[DiskCache] = None
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        # Prioridad de las cargas en curso lanzadas en segundo plano
+        self._inflight_groups: Dict[str, PriorityGroup] = {}
+        self._owner = f"{os.getpid()}:{id(self)}"
+
+    def open_disk(self, path: str) -> None:
+        """
+        Activa el nivel en disco
+        """
+        if self.disk is None:
+            self.disk = DiskCache(path)
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    async def get_entry(self, key: str, type_: Any, allow_expired: bool = False) -> Optional[Tuple[Any, float]]:
+        """
+        Busca una clave en memoria y después en disco (promocionándola a memoria;
+        la lectura del disco se hace en un hilo).
+        Devuelve (valor, fresco_hasta), incluso si ya no está fresca; con
+        `allow_expired` también las que han superado su margen de caducidad.
+        Si la copia en memoria no está fresca se prefiere una más reciente en
+        disco (refrescada por otro worker).
+        """
+        if not self.enabled:
+            return None
+
+        entry = self.memory.get(key, allow_expired)
+        if entry is not None and (self.disk is None or entry[1] > time.time()):
+            return entry[0], entry[1]
+
+        if self.disk is not None:
+            loop = asyncio.get_running_loop()
+            stored = await loop.run_in_executor(None, self.disk.get, key, allow_expired)
+            if stored is not None and (entry is None or stored[1] > entry[1]):
+                data, fresh_until, expires_at = stored
+                try:
+                    value = _load(data, type_)
+                except Exception as e:
+                    print(f"Error loading cache entry {key}: {e}")
+                    self.disk.delete(key)
+                    return None
+                self.memory.set(key, value, self._json(data, type_), self._size(value, data), fresh_until, expires_at)
+                return value, fresh_until
+
+        if entry is not None:
+            return entry[0], entry[1]
+        return None
+
+    async def get(self, key: str, type_: Any) -> Optional[Any]:
+        """
+        Devuelve el valor solo si sigue fresco
+        """
+        entry = await self.get_entry(key, type_)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: float,
+        type_: Any,
+        stale_ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Guarda un valor en ambos niveles: fresco durante `ttl` segundos y
+        servible caducado durante `stale_ttl` segundos más. La escritura en
+        disco se encola (no espera a SQLite).
+        """
+        if not self.enabled or ttl <= 0:
+            return
+
+        fresh_until = time.time() + ttl
+        expires_at = fresh_until + (self.stale_ttl if stale_ttl is None else stale_ttl)
+        data = _dump(value, type_)
+        self.memory.set(key, value, self._json(data, type_), self._size(value, data), fresh_until, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, data, fresh_until, expires_at)
+
+    def get_or_build(self, key: str, build: Callable[[], Any], type_: Any) -> Any:
+        """
+        Valor que no caduca (su clave cambia cuando cambian los datos, p. ej.
+        con la versión del catálogo) guardado solo en memoria junto a su JSON.
+        `build` solo se llama si no está; los resultados vacíos no se guardan.
+        """
+        if not self.enabled:
+            return build()
+        entry = self.memory.get(key)
+        if entry is not None:
+            return entry[0]
+        value = build()
+        if value:
+            data = _dump(value, type_)
+            self.memory.set(key, value, self._json(data, type_), self._size(value, data), math.inf, math.inf)
+        return value
+
+    async def get_or_load(
+        self,
+        key: str,
+        ttl: float,
+        loader: Callable[[], Awaitable[Any]],
+        type_: Any,
+        stale_ttl: Optional[float] = None,
+        refresh: bool = False,
+    ) -> Tuple[Any, str]:
+        """
+        Devuelve el valor cacheado o lo obtiene con `loader` y lo guarda.
+        Una entrada caducada se sirve al momento y se refresca en segundo plano.
+        Con `refresh` se ignora la entrada actual y se espera a la recarga.
+        Los resultados vacíos (errores de scraping) no se cachean; si la carga
+        falla y queda una entrada anterior, aunque esté caducada, se sirve esa,
+        salvo con stale_ttl=0 (entradas que nunca se sirven caducadas).
+        """
+        entry = None if refresh else await self.get_entry(key, type_)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until > time.time():
+                record_cache(key, HIT)
+                return value, HIT
+            # El refresco en segundo plano no compite con las peticiones de usuarios
+            with background_priority():
+                self._load(key, ttl, loader, type_, stale_ttl)
+            record_cache(key, STALE)
+            return value, STALE
+
+        value = await asyncio.shield(self._load(key, ttl, loader, type_, stale_ttl))
+        if not value and stale_ttl != 0:
+            # Origen caído o con errores: mejor una respuesta antigua que ninguna
+            fallback = await self.get_entry(key, type_, allow_expired=True)
+            if fallback is not None:
+                record_cache(key, STALE)
+                return fallback[0], STALE
+        record_cache(key, MISS)
+        return value, MISS
+
+    def _load(
+        self,
+        key: str,
+        ttl: float,
+        loader: Callable[[], Awaitable[Any]],
+        type_: Any,
+        stale_ttl: Optional[float],
+    ) -> "asyncio.Task[Any]":
+        """
+        Single-flight: una sola tarea de carga en curso por clave. Si un
+        usuario se une a una carga en segundo plano (refresco, precalentamiento,
+        crawler) se le sube la prioridad.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            group = self._inflight_groups.get(key)
+            if group is not None and current_priority() == PRIORITY_USER:
+                governor.promote(group)
+            return task
+
+        async def run() -> Any:
+            try:
+                if self.disk is not None:
+                    return await self._load_shared(key, ttl, loader, type_, stale_ttl)
+                value = await loader()
+                if value:
+                    self.set(key, value, ttl, type_, stale_ttl)
+                return value
+            finally:
+                self._inflight.pop(key, None)
+                self._inflight_groups.pop(key, None)
+
+        if current_priority() == PRIORITY_USER:
+            task = asyncio.ensure_future(run())
+        else:
+            # Grupo propio de esta carga: subirlo no sube el del crawler o el
+            # precalentamiento que la lanzó
+            with background_priority():
+                task = asyncio.ensure_future(run())
+                self._inflight_groups[key] = priority_group()
+        task.add_done_callback(_log_task_error(key))
+        self._inflight[key] = task
+        return task
+
+    async def _load_shared(
+        self,
+        key: str,
+        ttl: float,
+        loader: Callable[[], Awaitable[Any]],
+        type_: Any,
+        stale_ttl: Optional[float],
+    ) -> Any:
+        """
+        Single-flight entre procesos: solo el worker que reserva la clave llama
+        a `loader`; los demás esperan a que la escriba en disco. Si el que la
+        reservó se cae, la reserva caduca y la carga la hace otro.
+
+        Las consultas de la reserva se hacen en un hilo: con la base de datos
+        bloqueada por otro proceso pueden esperar hasta BUSY_TIMEOUT.
+        """
+        disk = self.disk
+        loop = asyncio.get_running_loop()
+        previous = await loop.run_in_executor(None, disk.stored_until, key)
+        while not await loop.run_in_executor(None, disk.acquire_lease, key, self._owner, self.lease_seconds):
+            await asyncio.sleep(self.LEASE_POLL_INTERVAL)
+            stored = await loop.run_in_executor(None, disk.stored_until, key)
+            # Una entrada nueva (distinta de la que había) es la del otro worker
+            if stored is not None and stored[1] > time.time() and (previous is None or stored[0] != previous[0]):
+                entry = await self.get_entry(key, type_)
+                if entry is not None:
+                    return entry[0]
+        try:
+            value = await loader()
+            if value:
+                self.set(key, value, ttl, type_, stale_ttl)
+            return value
+        finally:
+            # Encolada detrás de la escritura de la entrada
+            disk.release_lease(key, self._owner)
+
+    def loading(self, key: str) -> bool:
+        """
+        Si hay una carga de `key` en curso en este proceso
+        """
+        return key in self._inflight
+
+    def to_json(self, value: Any, type_: Any) -> bytes:
+        """
+        JSON de un resultado para la respuesta HTTP. Si `value` es el objeto
+        cacheado se devuelve el JSON que se guardó con él, sin tocar el modelo.
+        """
+        data = self.memory.serialized(value)
+        if data is None:
+            data = type_adapter(type_).dump_json(value)
+        return data
+
+    def clear(self) -> None:
+        self.memory.clear()
+
+    @staticmethod
+    def _json(data: bytes, type_: Any) -> Optional[bytes]:
+        # El HTML crudo no se sirve como JSON
+        return None if type_ is bytes else data
+
+    @staticmethod
+    def _size(value: Any, data: bytes) -> int:
+        # El HTML se mide directamente; los modelos cuentan su tamaño
+        # serializado dos veces (el modelo y el JSON que se guarda con él)
+        if isinstance(value, (bytes, str)):
+            return sys.getsizeof(value)
+        return len(data) * 2
+
+
+def _log_task_error(key: str) -> Callable[["asyncio.Task[Any]"], None]:
+    """
+    Registra los errores de las cargas que nadie espera (refrescos en segundo plano)
+    """
+    def callback(task: "asyncio.Task[Any]") -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error loading {key}: {task.exception()}")
+    return callback
+
+
+response_cache = ResponseCache(CACHE_MEMORY_BYTES, enabled=CACHE_ENABLED, stale_ttl=CACHE_STALE_TTL)
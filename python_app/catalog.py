@@ -0,0 +1,292 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Union
+from schemas import SeriesBase, SeriesDetail, Season, SeasonInfo, Episode
+from compact import CompactCatalog
+from config import CATALOG_RELOAD_INTERVAL
+
+
+class Catalog:
+    """
+    Catálogo local de series en SQLite construido por crawler.py.
+
+    Guarda las páginas del listado, la ficha de cada serie y los episodios de
+    cada temporada, junto con el hash del HTML de cada página descargada para
+    que los rastreos incrementales solo procesen lo que ha cambiado.
+    """
+
+    # Espera máxima (segundos) si otra conexión tiene el catálogo bloqueado
+    BUSY_TIMEOUT = 5
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        # WAL: la API lee mientras el crawler escribe sin esperarlo
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS listing (
+                page INTEGER PRIMARY KEY,
+                series TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS series (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS seasons (
+                series_id TEXT NOT NULL,
+                number INTEGER NOT NULL,
+                url TEXT,
+                episodes TEXT NOT NULL,
+                PRIMARY KEY (series_id, number)
+            );
+            """
+        )
+        self._conn.commit()
+        # Escrituras de esta conexión (PRAGMA data_version solo cuenta las de otras)
+        self._writes = 0
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _commit(self) -> None:
+        self._conn.commit()
+        self._writes += 1
+
+    def data_version(self) -> int:
+        """
+        Cambia cada vez que se escribe en el catálogo, desde esta conexión o
+        desde otra (el crawler)
+        """
+        return self._conn.execute("PRAGMA data_version").fetchone()[0] + self._writes
+
+    # Hashes de páginas
+
+    def page_hash(self, url: str) -> Optional[str]:
+        row = self._conn.execute("SELECT hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def set_page_hash(self, url: str, content_hash: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO pages (url, hash, fetched_at) VALUES (?, ?, ?)",
+            (url, content_hash, time.time()),
+        )
+        self._commit()
+
+    # Listado
+
+    def get_listing(self, page: int) -> Optional[List[SeriesBase]]:
+        row = self._conn.execute("SELECT series FROM listing WHERE page = ?", (page,)).fetchone()
+        if row is None:
+            return None
+        return [SeriesBase(**item) for item in json.loads(row[0])]
+
+    def set_listing(self, page: int, series_list: List[SeriesBase]) -> None:
+        data = json.dumps([series.model_dump() for series in series_list])
+        self._conn.execute(
+            "INSERT OR REPLACE INTO listing (page, series) VALUES (?, ?)", (page, data)
+        )
+        self._commit()
+
+    # Series
+
+    def series_ids(self) -> Set[str]:
+        return {row[0] for row in self._conn.execute("SELECT id FROM series")}
+
+    def has_series(self, series_id: str) -> bool:
+        row = self._conn.execute("SELECT 1 FROM series WHERE id = ?", (series_id,)).fetchone()
+        return row is not None
+
+    def set_series(self, series: SeriesDetail) -> None:
+        """
+        Guarda la ficha de una serie; las temporadas se guardan aparte
+        """
+        data = series.model_dump_json(exclude={"seasons"})
+        self._conn.execute(
+            "INSERT OR REPLACE INTO series (id, data, updated_at) VALUES (?, ?, ?)",
+            (series.id, data, time.time()),
+        )
+        self._commit()
+
+    def iter_series(self) -> Iterator[SeriesDetail]:
+        """
+        Fichas de todas las series (sin temporadas)
+        """
+        for (data,) in self._conn.execute("SELECT data FROM series"):
+            yield SeriesDetail.model_validate_json(data)
+
+    def get_series(self, series_id: str) -> Optional[SeriesDetail]:
+        """
+        Ficha completa de una serie con todas sus temporadas
+        """
+        row = self._conn.execute("SELECT data FROM series WHERE id = ?", (series_id,)).fetchone()
+        if row is None:
+            return None
+        series = SeriesDetail.model_validate_json(row[0])
+        series.seasons = self.get_seasons(series_id)
+        return series
+
+    # Temporadas
+
+    def season_urls(self, series_id: str) -> Dict[int, str]:
+        rows = self._conn.execute(
+            "SELECT number, url FROM seasons WHERE series_id = ? AND url IS NOT NULL",
+            (series_id,),
+        )
+        return {number: url for number, url in rows}
+
+    def get_season_index(self, series_id: str) -> List[SeasonInfo]:
+        rows = self._conn.execute(
+            "SELECT number, url FROM seasons WHERE series_id = ? ORDER BY number",
+            (series_id,),
+        )
+        return [SeasonInfo(number=number, url=url) for number, url in rows]
+
+    def get_season(self, series_id: str, number: int) -> Optional[Season]:
+        row = self._conn.execute(
+            "SELECT episodes FROM seasons WHERE series_id = ? AND number = ?",
+            (series_id, number),
+        ).fetchone()
+        if row is None:
+            return None
+        return Season(number=number, episodes=[Episode(**ep) for ep in json.loads(row[0])])
+
+    def get_seasons(self, series_id: str) -> List[Season]:
+        rows = self._conn.execute(
+            "SELECT number, episodes FROM seasons WHERE series_id = ? ORDER BY number",
+            (series_id,),
+        )
+        return [
+            Season(number=number, episodes=[Episode(**ep) for ep in json.loads(episodes)])
+            for number, episodes in rows
+        ]
+
+    def set_season(self, series_id: str, season: Season, url: Optional[str] = None) -> None:
+        data = json.dumps([episode.model_dump() for episode in season.episodes])
+        self._conn.execute(
+            "INSERT OR REPLACE INTO seasons (series_id, number, url, episodes) VALUES (?, ?, ?, ?)",
+            (series_id, season.number, url, data),
+        )
+        self._commit()
+
+
+def load_compact_catalog(path: str) -> CompactCatalog:
+    """
+    Copia completa del catálogo en memoria (compact.py), leída con su propia
+    conexión y sin construir modelos de pydantic
+    """
+    compact = CompactCatalog()
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for (data,) in conn.execute("SELECT data FROM series"):
+            compact.add_series(json.loads(data))
+        for series_id, number, url, episodes in conn.execute(
+            "SELECT series_id, number, url, episodes FROM seasons ORDER BY series_id, number"
+        ):
+            compact.add_season(series_id, number, url, json.loads(episodes))
+        for page, series in conn.execute("SELECT page, series FROM listing"):
+            compact.set_listing(page, json.loads(series))
+    finally:
+        conn.close()
+    return compact
+
+
+_catalog: Optional[Catalog] = None
+
+# Copia residente en memoria y versión del SQLite de la que se cargó
+_resident: Optional[CompactCatalog] = None
+_resident_version: Optional[int] = None
+_resident_checked_at = 0.0
+_reload_thread: Optional[threading.Thread] = None
+
+
+def open_catalog(path: str) -> Catalog:
+    """
+    Abre (o crea) el catálogo compartido
+    """
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog(path)
+    return _catalog
+
+
+def get_catalog() -> Optional[Catalog]:
+    """
+    Catálogo abierto, o None si no está configurado
+    """
+    return _catalog
+
+
+def load_resident_catalog() -> Optional[CompactCatalog]:
+    """
+    Carga el catálogo abierto en memoria; a partir de entonces se sirve desde ahí
+    """
+    global _resident, _resident_version, _resident_checked_at
+    if _catalog is None:
+        return None
+    _resident_version = _catalog.data_version()
+    _resident = load_compact_catalog(_catalog.path)
+    _resident_checked_at = time.monotonic()
+    return _resident
+
+
+def _reload_resident(version: int) -> None:
+    global _resident, _resident_version, _reload_thread
+    try:
+        # La copia antes que la versión (ver services._serving_catalog)
+        _resident = load_compact_catalog(_catalog.path)
+        _resident_version = version
+    except Exception as e:
+        print(f"Error reloading catalog: {e}")
+    finally:
+        _reload_thread = None
+
+
+def get_serving_catalog() -> Optional[Union[Catalog, CompactCatalog]]:
+    """
+    Catálogo del que se sirven las peticiones: la copia residente si está
+    cargada o, si no, el SQLite. Como mucho cada CATALOG_RELOAD_INTERVAL
+    segundos se comprueba si el crawler lo ha modificado; en ese caso la copia
+    se recarga en un hilo y mientras tanto se sigue sirviendo la anterior.
+    """
+    global _resident_checked_at, _reload_thread
+    if _resident is None or _catalog is None:
+        return _catalog
+
+    now = time.monotonic()
+    if _reload_thread is None and now - _resident_checked_at >= CATALOG_RELOAD_INTERVAL:
+        _resident_checked_at = now
+        version = _catalog.data_version()
+        if version != _resident_version:
+            _reload_thread = threading.Thread(target=_reload_resident, args=(version,), daemon=True)
+            _reload_thread.start()
+    return _resident
+
+
+def serving_version() -> Optional[int]:
+    """
+    Versión de los datos que sirve get_serving_catalog(): cambia cuando se
+    modifica el SQLite o se recarga la copia residente
+    """
+    if _catalog is None:
+        return None
+    if _resident is not None:
+        return _resident_version
+    return _catalog.data_version()
+
+
+def close_catalog() -> None:
+    global _catalog, _resident
+    if _catalog is not None:
+        _catalog.close()
+        _catalog = None
+    _resident = None
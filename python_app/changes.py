@@ -0,0 +1,290 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, FrozenSet, List, Optional, Set, Tuple
+from schemas import Change, HomeContent, Season, SeriesDetail, Updates
+from cache import DiskCache, response_cache
+from config import (
+    CHANGES_ENABLED,
+    CHANGES_MAX_EVENTS,
+    CHANGES_TRACKED_SEASONS,
+    CHANGES_POLL_INTERVAL,
+)
+
+# Tipos de cambio
+HOME_EPISODE = "home_episode"
+NEW_EPISODE = "episode"
+
+
+class ChangeFeed:
+    """
+    Feed de episodios nuevos para que los clientes no tengan que volver a
+    pedir la home o el detalle completo de una serie para saber si hay algo
+    nuevo.
+
+    Cada home y cada temporada que se descarga del origen (services.py) o que
+    rastrea crawler.py se compara con la anterior que se vio: los elementos nuevos
+    de recent_episodes y los episodios nuevos de una temporada se registran
+    como cambios con un cursor creciente. La primera vez que se ve algo solo
+    queda como referencia.
+
+    Con la caché en disco activa los cambios se guardan en el SQLite
+    compartido: todos los workers usan los mismos cursores y un episodio que
+    detectan varios workers aparece una sola vez. Las consultas se hacen en
+    un hilo y, mientras hay clientes esperando, una sola tarea por worker
+    consulta el último cursor cada CHANGES_POLL_INTERVAL segundos y los
+    despierta.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = CHANGES_ENABLED,
+        max_events: int = CHANGES_MAX_EVENTS,
+        max_tracked: int = CHANGES_TRACKED_SEASONS,
+    ):
+        self.enabled = enabled
+        self.max_events = max_events
+        self.max_tracked = max_tracked
+        # Cambios en memoria (sin caché en disco): (clave, cambio)
+        self._events: Deque[Tuple[str, Change]] = deque()
+        self._keys: Dict[str, int] = {}
+        self._cursor = 0
+        # Referencias: URLs de recent_episodes, temporadas de cada serie y
+        # números de episodio de cada temporada
+        self._home: Optional[FrozenSet[str]] = None
+        self._series: "OrderedDict[str, FrozenSet[int]]" = OrderedDict()
+        self._seasons: "OrderedDict[Tuple[str, int], FrozenSet[int]]" = OrderedDict()
+        # Se activa (y se sustituye) cada vez que hay cambios nuevos
+        self._changed: Optional[asyncio.Event] = None
+        # Con caché en disco: último cursor que ha visto el sondeo, clientes
+        # esperando, tarea de sondeo y escrituras en curso
+        self._latest = 0
+        self._waiting = 0
+        self._poller: Optional["asyncio.Task[None]"] = None
+        self._writes: Set["asyncio.Task[None]"] = set()
+
+    # Detección
+
+    def observe_home(self, content: Optional[HomeContent]) -> None:
+        if not self.enabled or not content:
+            return
+        items = [item for item in content.recent_episodes if item.get("url")]
+        current = frozenset(item["url"] for item in items)
+        previous, self._home = self._home, current
+        if previous is None or current <= previous:
+            return
+
+        now = time.time()
+        self._record([
+            (f"home:{item['url']}", {"type": HOME_EPISODE, "at": now, "episode": dict(item)})
+            for item in items
+            if item["url"] not in previous
+        ])
+
+    def observe_series(self, series: Optional[SeriesDetail]) -> None:
+        """
+        Compara todas las temporadas de una serie; los episodios de una
+        temporada que no existía también cuentan como nuevos
+        """
+        if not self.enabled or not series:
+            return
+        known = self._remember(self._series, series.id, frozenset(s.number for s in series.seasons))
+        changes: List[Tuple[str, Dict[str, Any]]] = []
+        for season in series.seasons:
+            baseline = frozenset() if known is not None and season.number not in known else None
+            changes.extend(self._diff_season(series.id, season, baseline))
+        self._record(changes)
+
+    def observe_season(self, series_id: str, season: Optional[Season], previous: Optional[Season] = None) -> None:
+        """
+        `previous` es la temporada que ya se conocía (la del catálogo en
+        crawler.py); se compara con ella si no hay referencia en memoria
+        """
+        if not self.enabled or not season:
+            return
+        baseline = frozenset(episode.number for episode in previous.episodes) if previous is not None else None
+        self._record(self._diff_season(series_id, season, baseline))
+
+    def _diff_season(
+        self, series_id: str, season: Season, baseline: Optional[FrozenSet[int]]
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        numbers = frozenset(episode.number for episode in season.episodes)
+        previous = self._remember(self._seasons, (series_id, season.number), numbers)
+        if previous is None:
+            previous = baseline
+        if previous is None or numbers <= previous:
+            return []
+
+        now = time.time()
+        return [
+            (
+                f"episode:{episode.url}",
+                {
+                    "type": NEW_EPISODE,
+                    "at": now,
+                    "series_id": series_id,
+                    "season": season.number,
+                    "episode": episode.model_dump(exclude={"servers"}),
+                },
+            )
+            for episode in season.episodes
+            if episode.number not in previous
+        ]
+
+    def _remember(self, store: OrderedDict, key: Any, value: FrozenSet[int]) -> Optional[FrozenSet[int]]:
+        """
+        Guarda la nueva referencia (LRU) y devuelve la anterior
+        """
+        previous = store.pop(key, None)
+        store[key] = value
+        if len(store) > self.max_tracked:
+            store.popitem(last=False)
+        return previous
+
+    def _record(self, changes: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if not changes:
+            return
+
+        disk = response_cache.disk
+        if disk is not None:
+            task = asyncio.ensure_future(self._save(disk, [(key, json.dumps(data)) for key, data in changes]))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+            return
+
+        for key, data in changes:
+            if key in self._keys:
+                continue
+            self._cursor += 1
+            self._events.append((key, Change(cursor=self._cursor, **data)))
+            self._keys[key] = self._cursor
+            if len(self._events) > self.max_events:
+                old_key, _ = self._events.popleft()
+                self._keys.pop(old_key, None)
+        self._notify()
+
+    async def _save(self, disk: DiskCache, rows: List[Tuple[str, str]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, disk.add_changes, rows, self.max_events)
+            if self._waiting:
+                await self._refresh_latest(disk)
+        except Exception as e:
+            print(f"Error saving changes: {e}")
+
+    async def flush(self) -> None:
+        """
+        Espera a que se guarden los cambios pendientes (antes de cerrar la caché)
+        """
+        if self._writes:
+            await asyncio.gather(*self._writes)
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    # Consulta
+
+    def _bounds(self) -> Tuple[int, int]:
+        if not self._events:
+            return 0, self._cursor
+        return self._events[0][1].cursor, self._cursor
+
+    async def latest(self) -> int:
+        """
+        Cursor del último cambio
+        """
+        disk = response_cache.disk
+        if disk is None:
+            return self._cursor
+        loop = asyncio.get_running_loop()
+        return (await loop.run_in_executor(None, disk.change_bounds))[1]
+
+    async def since(self, cursor: int, limit: int) -> Updates:
+        """
+        Cambios posteriores a `cursor` (como mucho `limit`). Si se han perdido
+        cambios desde ese cursor se marca `reset` y se devuelven todos los que
+        se conservan.
+        """
+        disk = response_cache.disk
+        if disk is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._since_disk, disk, cursor, limit)
+
+        first, latest = self._bounds()
+        reset, cursor = self._check_cursor(cursor, first, latest)
+        changes = [change for _, change in self._events if change.cursor > cursor][: limit + 1]
+        return self._page(changes, reset, latest, limit)
+
+    def _since_disk(self, disk: DiskCache, cursor: int, limit: int) -> Updates:
+        first, latest = disk.change_bounds()
+        reset, cursor = self._check_cursor(cursor, first, latest)
+        rows = disk.changes_since(cursor, latest, limit + 1)
+        changes = [Change(cursor=change_id, **json.loads(data)) for change_id, data in rows]
+        return self._page(changes, reset, latest, limit)
+
+    @staticmethod
+    def _check_cursor(cursor: int, first: int, latest: int) -> Tuple[bool, int]:
+        reset = cursor > latest or (first > 0 and cursor < first - 1)
+        return reset, 0 if cursor > latest else cursor
+
+    @staticmethod
+    def _page(changes: List[Change], reset: bool, latest: int, limit: int) -> Updates:
+        more = len(changes) > limit
+        changes = changes[:limit]
+        next_cursor = changes[-1].cursor if more else latest
+        return Updates(cursor=next_cursor, reset=reset, more=more, changes=changes)
+
+    async def wait(self, cursor: int, timeout: float) -> bool:
+        """
+        Espera hasta que haya cambios posteriores a `cursor` o pasen `timeout`
+        segundos; devuelve False si no ha habido cambios. Con la caché en disco
+        los clientes esperan al sondeo compartido, que también ve los cambios
+        de los demás workers.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        disk = response_cache.disk
+        self._waiting += 1
+        try:
+            if disk is not None and self._poller is None:
+                await self._refresh_latest(disk)
+                self._poller = asyncio.ensure_future(self._poll(disk))
+            while (self._cursor if disk is None else self._latest) == cursor:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                if self._changed is None:
+                    self._changed = asyncio.Event()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            return True
+        finally:
+            self._waiting -= 1
+
+    async def _refresh_latest(self, disk: DiskCache) -> None:
+        latest = (await asyncio.get_running_loop().run_in_executor(None, disk.change_bounds))[1]
+        if latest != self._latest:
+            self._latest = latest
+            self._notify()
+
+    async def _poll(self, disk: DiskCache) -> None:
+        """
+        Sondeo del último cursor mientras haya clientes esperando
+        """
+        try:
+            while self._waiting:
+                await asyncio.sleep(CHANGES_POLL_INTERVAL)
+                try:
+                    await self._refresh_latest(disk)
+                except Exception as e:
+                    print(f"Error polling changes: {e}")
+        finally:
+            self._poller = None
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,292 @@
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from schemas import Season, SeasonInfo, SeriesBase, SeriesDetail
+
+# Representación compacta de series y episodios para tenerlos en memoria
+# (catálogo residente, índice de búsqueda). Registros con __slots__, columnas
+# con los episodios de cada temporada y prefijos de URL guardados una sola
+# vez. Los modelos de pydantic solo se construyen al responder, validando
+# diccionarios (en pydantic-core, más rápido que model_construct campo a campo).
+
+# Prefijo "sin URL" (imágenes que no existen)
+_NO_PREFIX = 0xFFFF
+
+
+class URLTable:
+    """
+    Prefijos de URL compartidos: "https://host/episodio/slug-1x1/" se guarda
+    como (id de "https://host/episodio/", "slug-1x1/")
+    """
+
+    __slots__ = ("_prefixes", "_ids")
+
+    def __init__(self):
+        # El prefijo 0 es "" (URLs guardadas enteras en el sufijo)
+        self._prefixes: List[str] = [""]
+        self._ids: Dict[str, int] = {"": 0}
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+    def split(self, url: Optional[str]) -> Tuple[int, str]:
+        if url is None:
+            return _NO_PREFIX, ""
+        # El último segmento (con su "/" final) es la parte propia de cada URL
+        cut = url.rfind("/", 0, len(url) - 1) + 1
+        prefix = url[:cut]
+        prefix_id = self._ids.get(prefix)
+        if prefix_id is None:
+            if len(self._prefixes) >= _NO_PREFIX:
+                # Tabla llena (no ocurre con un solo sitio): la URL entera es el sufijo
+                return 0, url
+            prefix_id = len(self._prefixes)
+            self._prefixes.append(prefix)
+            self._ids[prefix] = prefix_id
+        return prefix_id, url[cut:]
+
+    def join(self, prefix_id: int, suffix: str) -> Optional[str]:
+        if prefix_id == _NO_PREFIX:
+            return None
+        return self._prefixes[prefix_id] + suffix
+
+
+def _intern(text: Optional[str]) -> Optional[str]:
+    # Géneros, actores e idiomas se repiten entre series
+    return sys.intern(text) if text else text
+
+
+class CompactEpisodes:
+    """
+    Episodios de una temporada por columnas: números en un array de enteros,
+    URLs como (prefijo, sufijo) y servidores solo en los episodios que los tienen
+    """
+
+    __slots__ = ("numbers", "titles", "url_prefixes", "url_suffixes", "image_prefixes", "image_suffixes", "servers")
+
+    def __init__(self, urls: URLTable, episodes: Iterable[Dict[str, Any]]):
+        self.numbers = array("i")
+        self.titles: List[Optional[str]] = []
+        self.url_prefixes = array("H")
+        self.url_suffixes: List[str] = []
+        self.image_prefixes = array("H")
+        self.image_suffixes: List[str] = []
+        # posición -> ((nombre, url, calidad), ...)
+        self.servers: Optional[Dict[int, Tuple[Tuple[str, str, Optional[str]], ...]]] = None
+
+        for index, episode in enumerate(episodes):
+            self.numbers.append(episode["number"])
+            self.titles.append(episode.get("title"))
+            prefix, suffix = urls.split(episode["url"])
+            self.url_prefixes.append(prefix)
+            self.url_suffixes.append(suffix)
+            prefix, suffix = urls.split(episode.get("image"))
+            self.image_prefixes.append(prefix)
+            self.image_suffixes.append(suffix)
+            servers = episode.get("servers")
+            if servers:
+                if self.servers is None:
+                    self.servers = {}
+                self.servers[index] = tuple(
+                    (_intern(server["name"]), server["url"], _intern(server.get("quality")))
+                    for server in servers
+                )
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def to_dicts(self, urls: URLTable) -> List[Dict[str, Any]]:
+        servers = self.servers or {}
+        return [
+            {
+                "number": self.numbers[i],
+                "title": self.titles[i],
+                "url": urls.join(self.url_prefixes[i], self.url_suffixes[i]),
+                "image": urls.join(self.image_prefixes[i], self.image_suffixes[i]),
+                "servers": [
+                    {"name": name, "url": url, "quality": quality}
+                    for name, url, quality in servers.get(i, ())
+                ],
+            }
+            for i in range(len(self.numbers))
+        ]
+
+
+class CompactSeason:
+    __slots__ = ("number", "url", "episodes")
+
+    def __init__(self, number: int, url: Optional[str], episodes: CompactEpisodes):
+        self.number = number
+        self.url = url
+        self.episodes = episodes
+
+    def to_dict(self, urls: URLTable) -> Dict[str, Any]:
+        return {"number": self.number, "episodes": self.episodes.to_dicts(urls)}
+
+    def to_model(self, urls: URLTable) -> Season:
+        return Season.model_validate(self.to_dict(urls))
+
+
+class CompactSeries:
+    """
+    Ficha de una serie; `seasons` es None si solo se conocen los datos del
+    listado (SeriesBase)
+    """
+
+    __slots__ = (
+        "id", "title", "url_prefix", "url_suffix", "image_prefix", "image_suffix",
+        "year", "rating", "description", "genres", "cast", "seasons",
+    )
+
+    def __init__(self, urls: URLTable, data: Dict[str, Any]):
+        self.id = data["id"]
+        self.title = data["title"]
+        self.url_prefix, self.url_suffix = urls.split(data["url"])
+        self.image_prefix, self.image_suffix = urls.split(data.get("image"))
+        self.year = _intern(data.get("year"))
+        self.rating = _intern(data.get("rating"))
+        self.description = data.get("description")
+        self.genres = tuple(_intern(genre) for genre in data.get("genres") or ())
+        self.cast = tuple(_intern(actor) for actor in data.get("cast") or ())
+        self.seasons: Optional[Tuple[CompactSeason, ...]] = None
+
+    def base_fields(self, urls: URLTable) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "url": urls.join(self.url_prefix, self.url_suffix),
+            "image": urls.join(self.image_prefix, self.image_suffix),
+            "year": self.year,
+            "rating": self.rating,
+        }
+
+    def to_base(self, urls: URLTable) -> SeriesBase:
+        return SeriesBase.model_validate(self.base_fields(urls))
+
+    def to_detail(self, urls: URLTable, with_seasons: bool = True) -> SeriesDetail:
+        seasons = (self.seasons or ()) if with_seasons else ()
+        data = self.base_fields(urls)
+        data.update(
+            description=self.description,
+            genres=list(self.genres),
+            cast=list(self.cast),
+            seasons=[season.to_dict(urls) for season in seasons],
+        )
+        return SeriesDetail.model_validate(data)
+
+
+class CompactCatalog:
+    """
+    Catálogo completo en memoria con la misma interfaz de lectura que
+    catalog.Catalog (listado, fichas, índice de temporadas y temporadas)
+    """
+
+    def __init__(self):
+        self.urls = URLTable()
+        self._series: Dict[str, CompactSeries] = {}
+        self._listings: Dict[int, Tuple[CompactSeries, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    # Carga
+
+    def add_series(self, data: Dict[str, Any]) -> None:
+        record = CompactSeries(self.urls, data)
+        previous = self._series.get(record.id)
+        record.seasons = previous.seasons if previous is not None else ()
+        self._series[record.id] = record
+
+    def add_season(self, series_id: str, number: int, url: Optional[str], episodes: List[Dict[str, Any]]) -> None:
+        record = self._series.get(series_id)
+        if record is None:
+            return
+        season = CompactSeason(number, url, CompactEpisodes(self.urls, episodes))
+        others = [s for s in record.seasons or () if s.number != number]
+        record.seasons = tuple(sorted([*others, season], key=lambda s: s.number))
+
+    def set_listing(self, page: int, items: List[Dict[str, Any]]) -> None:
+        records = []
+        for data in items:
+            # Las series del catálogo comparten el registro con su ficha
+            record = self._series.get(data["id"])
+            if record is None:
+                record = CompactSeries(self.urls, data)
+            records.append(record)
+        self._listings[page] = tuple(records)
+
+    # Lectura (misma interfaz que catalog.Catalog)
+
+    def get_listing(self, page: int) -> Optional[List[SeriesBase]]:
+        records = self._listings.get(page)
+        if records is None:
+            return None
+        return [record.to_base(self.urls) for record in records]
+
+    def has_series(self, series_id: str) -> bool:
+        return series_id in self._series
+
+    def series_ids(self) -> Iterable[str]:
+        return self._series.keys()
+
+    def get_series(self, series_id: str) -> Optional[SeriesDetail]:
+        record = self._series.get(series_id)
+        return record.to_detail(self.urls) if record is not None else None
+
+    def iter_series(self) -> Iterator[SeriesDetail]:
+        """
+        Fichas de todas las series (sin temporadas)
+        """
+        for record in self._series.values():
+            yield record.to_detail(self.urls, with_seasons=False)
+
+    def get_season_index(self, series_id: str) -> List[SeasonInfo]:
+        record = self._series.get(series_id)
+        if record is None:
+            return []
+        return [SeasonInfo(number=s.number, url=s.url) for s in record.seasons or ()]
+
+    def get_season(self, series_id: str, number: int) -> Optional[Season]:
+        record = self._series.get(series_id)
+        if record is None:
+            return None
+        for season in record.seasons or ():
+            if season.number == number:
+                return season.to_model(self.urls)
+        return None
+
+
+class CompactBaseStore:
+    """
+    SeriesBase por id en forma compacta (para el índice de búsqueda)
+    """
+
+    def __init__(self):
+        self.urls = URLTable()
+        self._records: Dict[str, CompactSeries] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, series_id: str) -> bool:
+        return series_id in self._records
+
+    def set(self, series: SeriesBase) -> None:
+        self._records[series.id] = CompactSeries(
+            self.urls,
+            {
+                "id": series.id,
+                "title": series.title,
+                "url": series.url,
+                "image": series.image,
+                "year": series.year,
+                "rating": series.rating,
+            },
+        )
+
+    def get(self, series_id: str) -> Optional[SeriesBase]:
+        record = self._records.get(series_id)
+        return record.to_base(self.urls) if record is not None else None
+
+    def pop(self, series_id: str) -> None:
+        self._records.pop(series_id, None)
@@ -1,4 +1,6 @@
+import hashlib
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +9,11 @@ BASE_URL = os.getenv("BASE_URL", "https://seriesflix.boats")
 PORT = int(os.getenv("PORT", "8000"))
 HOST = os.getenv("HOST", "0.0.0.0")
 
+# Procesos worker del servidor de producción (serve.py); 0 = uno por CPU
+WORKERS = int(os.getenv("WORKERS", "1")) or (os.cpu_count() or 1)
+# Segundos que se esperan las peticiones en curso al apagar el servidor
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
 # Headers para las peticiones
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -16,5 +23,177 @@ HEADERS = {
     "Connection": "keep-alive",
 }
 
-# Timeout para las peticiones
+# Timeout para las peticiones (conexión y lectura tienen los suyos, más cortos)
 TIMEOUT = 30
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", "15"))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """
+    Lee una variable de entorno booleana ("true", "1", "yes", "on")
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Cliente HTTP compartido (pool de conexiones con keep-alive)
+HTTP2 = _env_bool("HTTP2", True)
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("KEEPALIVE_EXPIRY", "30"))
+# Máximo de peticiones simultáneas contra un mismo host. Este límite y los
+# del regulador son para todo el servidor: cada worker usa su parte
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("MAX_CONNECTIONS_PER_HOST", "10"))
+
+# Regulador de peticiones al origen (por host): ritmo máximo con token bucket
+# y concurrencia adaptativa (AIMD) entre GOVERNOR_MIN_CONCURRENCY y
+# MAX_CONNECTIONS_PER_HOST
+GOVERNOR_ENABLED = _env_bool("GOVERNOR_ENABLED", True)
+# Peticiones por segundo (0 = sin límite de ritmo) y ráfaga máxima
+GOVERNOR_RATE = float(os.getenv("GOVERNOR_RATE", "20"))
+GOVERNOR_BURST = int(os.getenv("GOVERNOR_BURST", "20"))
+GOVERNOR_MIN_CONCURRENCY = int(os.getenv("GOVERNOR_MIN_CONCURRENCY", "1"))
+# Respuestas más lentas que esto cuentan como señal de saturación
+GOVERNOR_SLOW_SECONDS = float(os.getenv("GOVERNOR_SLOW_SECONDS", "5"))
+GOVERNOR_BACKOFF_FACTOR = float(os.getenv("GOVERNOR_BACKOFF_FACTOR", "0.5"))
+# Mínimo de segundos entre dos reducciones de concurrencia
+GOVERNOR_BACKOFF_INTERVAL = float(os.getenv("GOVERNOR_BACKOFF_INTERVAL", "1"))
+# Pausa máxima (segundos) que se respeta de un Retry-After
+GOVERNOR_MAX_RETRY_AFTER = float(os.getenv("GOVERNOR_MAX_RETRY_AFTER", "60"))
+
+# Reintentos de las descargas (GET idempotentes) ante errores de red, 429 y 5xx,
+# con espera exponencial aleatoria entre 0 y FETCH_RETRY_BACKOFF * 2^intento
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+FETCH_RETRY_BACKOFF = float(os.getenv("FETCH_RETRY_BACKOFF", "0.25"))
+FETCH_RETRY_MAX_BACKOFF = float(os.getenv("FETCH_RETRY_MAX_BACKOFF", "4"))
+
+# Peticiones "hedged": si la respuesta tarda más que el p95 reciente del host
+# se lanza una segunda petición y se usa la primera que llegue
+HEDGE_ENABLED = _env_bool("HEDGE_ENABLED", False)
+# Retraso usado mientras no hay latencias suficientes para calcular el p95
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "1"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+
+# Circuit breaker por host: tras CIRCUIT_FAILURES fallos seguidos las descargas
+# fallan al momento (se sirve la caché caducada si existe) durante
+# CIRCUIT_RESET_SECONDS, y después se prueba con una petición
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# Temporadas que se descargan en paralelo al obtener el detalle de una serie
+SEASON_CONCURRENCY = int(os.getenv("SEASON_CONCURRENCY", "6"))
+# Servidores de episodios resueltos a la vez en las peticiones por lotes
+SERVERS_BATCH_CONCURRENCY = int(os.getenv("SERVERS_BATCH_CONCURRENCY", "8"))
+# Máximo de episodios por petición por lotes
+SERVERS_BATCH_MAX = int(os.getenv("SERVERS_BATCH_MAX", "100"))
+
+# Caché de respuestas (memoria LRU + disco opcional)
+CACHE_ENABLED = _env_bool("CACHE_ENABLED", True)
+CACHE_MEMORY_BYTES = int(os.getenv("CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+# Ruta del fichero SQLite para el nivel en disco; vacío lo desactiva. Con
+# varios workers es la caché que comparten y está activada por defecto, en un
+# fichero propio de cada instancia (BASE_URL y PORT) para que dos instancias
+# con distinto origen no compartan entradas ni reservas
+_INSTANCE = hashlib.sha256(f"{BASE_URL}|{PORT}".encode()).hexdigest()[:12]
+CACHE_DISK_PATH = os.getenv(
+    "CACHE_DISK_PATH",
+    os.path.join(tempfile.gettempdir(), f"seriesflix-cache-{_INSTANCE}.db") if WORKERS > 1 else "",
+)
+# Segundos que un worker espera a que otro termine de cargar una misma clave
+# antes de cargarla él (si el otro se ha caído)
+CACHE_LEASE_SECONDS = float(os.getenv("CACHE_LEASE_SECONDS", "30"))
+
+# Tiempo extra (segundos) durante el que una entrada caducada se sirve
+# mientras se refresca en segundo plano (stale-while-revalidate)
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "3600"))
+
+# TTL (segundos) por tipo de contenido
+CACHE_TTL_HTML = int(os.getenv("CACHE_TTL_HTML", "120"))
+CACHE_TTL_HOME = int(os.getenv("CACHE_TTL_HOME", "300"))
+CACHE_TTL_SERIES_LIST = int(os.getenv("CACHE_TTL_SERIES_LIST", "900"))
+CACHE_TTL_SERIES_DETAIL = int(os.getenv("CACHE_TTL_SERIES_DETAIL", "1800"))
+CACHE_TTL_SEASON = int(os.getenv("CACHE_TTL_SEASON", "1800"))
+CACHE_TTL_SEASON_INDEX = int(os.getenv("CACHE_TTL_SEASON_INDEX", "1800"))
+CACHE_TTL_EPISODE_SERVERS = int(os.getenv("CACHE_TTL_EPISODE_SERVERS", "3600"))
+CACHE_TTL_SEARCH = int(os.getenv("CACHE_TTL_SEARCH", "600"))
+
+# Peticiones condicionales (ETag / Last-Modified): HTML guardado para las
+# respuestas 304 y resultados de parseo reutilizados si el HTML no cambia
+REVALIDATE_ENABLED = _env_bool("REVALIDATE_ENABLED", True)
+REVALIDATE_MEMORY_BYTES = int(os.getenv("REVALIDATE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+PARSED_MEMO_ENTRIES = int(os.getenv("PARSED_MEMO_ENTRIES", "1000"))
+
+# Precalentamiento periódico de la caché (home, listado y series populares)
+PREWARM_ENABLED = _env_bool("PREWARM_ENABLED", False)
+PREWARM_INTERVAL = int(os.getenv("PREWARM_INTERVAL", "240"))
+# Retraso aleatorio máximo (segundos) entre ciclos y antes de cada trabajo
+PREWARM_JITTER = int(os.getenv("PREWARM_JITTER", "30"))
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+PREWARM_LIST_PAGES = int(os.getenv("PREWARM_LIST_PAGES", "3"))
+PREWARM_POPULAR_SERIES = int(os.getenv("PREWARM_POPULAR_SERIES", "20"))
+
+# Feed de cambios (/api/updates): episodios nuevos detectados al comparar la
+# home y las temporadas con lo obtenido anteriormente
+CHANGES_ENABLED = _env_bool("CHANGES_ENABLED", True)
+# Cambios que se conservan y series/temporadas de las que se guarda referencia
+CHANGES_MAX_EVENTS = int(os.getenv("CHANGES_MAX_EVENTS", "1000"))
+CHANGES_TRACKED_SEASONS = int(os.getenv("CHANGES_TRACKED_SEASONS", "20000"))
+# Máximo de cambios por respuesta
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE", "200"))
+# Espera máxima (segundos) de /api/updates?wait= y latido de las conexiones SSE
+CHANGES_MAX_WAIT = float(os.getenv("CHANGES_MAX_WAIT", "60"))
+CHANGES_HEARTBEAT = float(os.getenv("CHANGES_HEARTBEAT", "15"))
+# Con la caché en disco: cada cuánto se leen los cambios de los demás workers
+CHANGES_POLL_INTERVAL = float(os.getenv("CHANGES_POLL_INTERVAL", "1"))
+
+# Proxy de imágenes (/api/img): caché en disco con tamaño máximo y
+# miniaturas a los anchos de IMAGE_WIDTHS (requiere Pillow, opcional; sin él
+# se sirve siempre la imagen original)
+IMAGE_PROXY_ENABLED = _env_bool("IMAGE_PROXY_ENABLED", True)
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "seriesflix-images"))
+IMAGE_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_BYTES", str(512 * 1024 * 1024)))
+# Anchos permitidos: el pedido se redondea al siguiente de la lista
+IMAGE_WIDTHS = sorted(int(w) for w in os.getenv("IMAGE_WIDTHS", "92,154,185,342,500,780").split(",") if w.strip())
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+# Segundos durante los que no se reintenta redimensionar una imagen que no se pudo decodificar
+IMAGE_FAILED_TTL = float(os.getenv("IMAGE_FAILED_TTL", "300"))
+# Tamaño máximo de una imagen descargada del origen
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+# max-age (segundos) de las respuestas del proxy
+IMAGE_MAX_AGE = int(os.getenv("IMAGE_MAX_AGE", str(30 * 24 * 3600)))
+# Hosts de imágenes además del de BASE_URL (separados por comas)
+IMAGE_ALLOWED_HOSTS = [h.strip() for h in os.getenv("IMAGE_ALLOWED_HOSTS", "").split(",") if h.strip()]
+# Reescribir por defecto las imágenes de las respuestas para que pasen por el
+# proxy (cada petición puede elegir con ?img=origin|proxy|<ancho>)
+IMAGE_PROXY_REWRITE = _env_bool("IMAGE_PROXY_REWRITE", False)
+# URL pública del servidor para las imágenes reescritas (vacío: la de la petición)
+IMAGE_PROXY_BASE_URL = os.getenv("IMAGE_PROXY_BASE_URL", "")
+
+# Catálogo local (SQLite) generado por crawler.py; vacío lo desactiva
+CATALOG_PATH = os.getenv("CATALOG_PATH", "")
+# Copia compacta del catálogo en memoria (compact.py) en vez de leer el SQLite
+# en cada petición; se recarga cuando el crawler lo modifica
+CATALOG_RESIDENT = _env_bool("CATALOG_RESIDENT", True)
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "30"))
+# Servir /api/series y /api/series/{id} desde el catálogo cuando existan los datos
+CATALOG_SERVE = _env_bool("CATALOG_SERVE", True)
+# Peticiones simultáneas del crawler (series en paralelo)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+
+# Índice de búsqueda local (la búsqueda en el origen queda como respaldo)
+SEARCH_INDEX_ENABLED = _env_bool("SEARCH_INDEX_ENABLED", True)
+SEARCH_INDEX_LIMIT = int(os.getenv("SEARCH_INDEX_LIMIT", "50"))
+
+# Backend de parseo HTML: "lxml" (por defecto), "bs4" o "selectolax" (opcional)
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml")
+
+# Dónde se parsea el HTML: "thread" (por defecto), "process" o "inline" (en el event loop)
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "thread")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Home en streaming: se deja de descargar y parsear en cuanto están todas las
+# secciones que se devuelven (siempre con lxml)
+STREAM_PARSE = _env_bool("STREAM_PARSE", False)
@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+from typing import Dict, List, Optional
+from catalog import Catalog, open_catalog, close_catalog
+from schemas import Season
+from scrapers.series_scraper import (
+    series_list_url,
+    parse_series_list,
+    parse_series_page,
+    parse_season_episodes,
+)
+from utils import fetch_html, parse_html, close_http_client
+from cache import response_cache
+from changes import change_feed
+from governor import background_priority
+from revalidation import content_hash
+from config import BASE_URL, CATALOG_PATH, CACHE_DISK_PATH, CRAWL_CONCURRENCY
+
+# Rastreo de /series-online/ (listado, fichas y temporadas) hacia el catálogo local.
+#
+# En modo incremental solo se reprocesan las páginas cuyo HTML ha cambiado
+# (comparando su hash), aunque las series de cada página recorrida siempre se
+# repasan para encontrar episodios nuevos. El listado se deja de recorrer en
+# cuanto una página no trae ninguna serie nueva y la siguiente ya se completó
+# en un rastreo anterior.
+#
+# Los episodios nuevos que encuentra se registran en el feed de cambios
+# (changes.py). Para que los vea la API, el crawler y los workers deben
+# compartir la caché en disco (CACHE_DISK_PATH).
+
+
+class Crawler:
+    def __init__(self, catalog: Catalog, full: bool = False, concurrency: int = CRAWL_CONCURRENCY):
+        self.catalog = catalog
+        self.full = full
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stats: Dict[str, int] = {"pages": 0, "series": 0, "seasons": 0, "unchanged": 0}
+
+    async def _fetch(self, url: str) -> Optional[bytes]:
+        async with self.semaphore:
+            return await fetch_html(url)
+
+    def _changed(self, url: str, digest: str) -> bool:
+        if self.full or self.catalog.page_hash(url) != digest:
+            return True
+        self.stats["unchanged"] += 1
+        return False
+
+    async def run(self, max_pages: Optional[int] = None) -> Dict[str, int]:
+        """
+        Recorre el listado página a página y actualiza cada serie encontrada
+        """
+        known = self.catalog.series_ids()
+        page = 1
+
+        while max_pages is None or page <= max_pages:
+            url = series_list_url(page)
+            content = await self._fetch(url)
+            if not content:
+                break
+
+            digest = content_hash(content)
+            # Página idéntica a la última vez: se reutiliza el listado guardado
+            series_list = None if self._changed(url, digest) else self.catalog.get_listing(page)
+            if series_list is None:
+                series_list = parse_series_list(parse_html(content))
+                if not series_list:
+                    break
+                self.catalog.set_listing(page, series_list)
+
+            ids = list(dict.fromkeys(series.id for series in series_list))
+            new_ids = [series_id for series_id in ids if series_id not in known]
+
+            # Siempre se repasan las series de la página: un episodio nuevo no
+            # cambia el listado (fichas y temporadas sin cambios no se reprocesan)
+            await asyncio.gather(*(self.crawl_series(series_id) for series_id in ids))
+
+            # El hash se guarda al final para que un rastreo interrumpido repita la página
+            self.catalog.set_page_hash(url, digest)
+            known.update(ids)
+            self.stats["pages"] += 1
+
+            # Sin series nuevas se para, salvo que la página siguiente no se
+            # haya completado nunca (rastreo anterior interrumpido)
+            next_url = series_list_url(page + 1)
+            if not self.full and not new_ids and self.catalog.page_hash(next_url) is not None:
+                break
+            page += 1
+
+        return self.stats
+
+    async def crawl_series(self, series_id: str) -> None:
+        """
+        Actualiza la ficha de una serie y sus temporadas
+        """
+        url = f"{BASE_URL}/serie/{series_id}/"
+        content = await self._fetch(url)
+        if not content:
+            return
+
+        digest = content_hash(content)
+        # URL de la que sale cada temporada guardada
+        stored = self.catalog.season_urls(series_id)
+        known = self.catalog.has_series(series_id)
+        if self._changed(url, digest) or not known:
+            series, season_urls = parse_series_page(parse_html(content), series_id, url)
+            if not series:
+                return
+            self.catalog.set_series(series)
+            self.stats["series"] += 1
+
+            # Miniserie: los episodios vienen en la propia ficha
+            for season in series.seasons:
+                self._store_season(series_id, season, known)
+        else:
+            season_urls = {number: [season_url] for number, season_url in stored.items()}
+
+        results = await asyncio.gather(*(
+            self.crawl_season(series_id, number, urls, stored.get(number), known)
+            for number, urls in season_urls.items()
+        ))
+
+        # Si alguna temporada falla, la ficha se vuelve a procesar en el siguiente rastreo
+        if all(results):
+            self.catalog.set_page_hash(url, digest)
+
+    def _store_season(self, series_id: str, season: Season, known: bool, url: Optional[str] = None) -> None:
+        """
+        Guarda una temporada y registra sus episodios nuevos. Una temporada
+        nueva de una serie ya rastreada cuenta entera como nueva.
+        """
+        previous = self.catalog.get_season(series_id, season.number)
+        if previous is None and known:
+            previous = Season(number=season.number, episodes=[])
+        self.catalog.set_season(series_id, season, url)
+        change_feed.observe_season(series_id, season, previous)
+
+    async def crawl_season(
+        self, series_id: str, number: int, urls: List[str], stored: Optional[str], known: bool = True
+    ) -> bool:
+        """
+        Actualiza los episodios de una temporada; devuelve False si no se pudo
+        descargar. Si la ficha la enlaza varias veces se usa la primera URL
+        con episodios (`stored` es la de la temporada guardada).
+        """
+        for url in urls:
+            content = await self._fetch(url)
+            if not content:
+                return False
+
+            digest = content_hash(content)
+            if not self._changed(url, digest):
+                if url == stored:
+                    return True
+                # Sin cambios y sin episodios la última vez: la siguiente
+                continue
+
+            episodes = parse_season_episodes(parse_html(content))
+            if episodes:
+                self._store_season(series_id, Season(number=number, episodes=episodes), known, url)
+                self.stats["seasons"] += 1
+            self.catalog.set_page_hash(url, digest)
+            if episodes:
+                return True
+        return True
+
+
+async def crawl(catalog: Catalog, full: bool = False, max_pages: Optional[int] = None) -> Dict[str, int]:
+    # El rastreo nunca debe quitar turno a las peticiones de los usuarios
+    with background_priority():
+        return await Crawler(catalog, full=full).run(max_pages=max_pages)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    catalog = open_catalog(args.catalog)
+    # Feed de cambios compartido con los workers de la API
+    if CACHE_DISK_PATH:
+        response_cache.open_disk(CACHE_DISK_PATH)
+    try:
+        stats = await crawl(catalog, full=args.full, max_pages=args.max_pages)
+    finally:
+        await close_http_client()
+        close_catalog()
+        await change_feed.flush()
+        response_cache.close()
+    print(f"Rastreo completado: {stats}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rastrea /series-online/ y actualiza el catálogo local")
+    parser.add_argument("--catalog", default=CATALOG_PATH or "catalog.db", help="Ruta del catálogo SQLite")
+    parser.add_argument("--full", action="store_true", help="Reprocesar todas las páginas aunque no hayan cambiado")
+    parser.add_argument("--max-pages", type=int, default=None, help="Máximo de páginas del listado a recorrer")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+from config import (
+    GOVERNOR_ENABLED,
+    GOVERNOR_RATE,
+    GOVERNOR_BURST,
+    GOVERNOR_MIN_CONCURRENCY,
+    GOVERNOR_SLOW_SECONDS,
+    GOVERNOR_BACKOFF_FACTOR,
+    GOVERNOR_BACKOFF_INTERVAL,
+    GOVERNOR_MAX_RETRY_AFTER,
+    MAX_CONNECTIONS_PER_HOST,
+    WORKERS,
+    CIRCUIT_FAILURES,
+    CIRCUIT_RESET_SECONDS,
+)
+
+# Prioridades de las peticiones salientes: menor número, antes sale
+PRIORITY_USER = 0
+# Precalentamiento, crawler y refrescos en segundo plano de la caché
+PRIORITY_BACKGROUND = 10
+
+
+class PriorityGroup:
+    """
+    Prioridad de las peticiones de un bloque background_priority (y de las
+    tareas que se crean desde él). Se puede subir a la de los usuarios con
+    OutboundGovernor.promote mientras esperan; un grupo creado dentro de otro
+    en segundo plano sube con él.
+    """
+
+    __slots__ = ("_value", "parent")
+
+    def __init__(self, value: int, parent: Optional["PriorityGroup"] = None):
+        self._value = value
+        self.parent = parent
+
+    @property
+    def value(self) -> int:
+        if self.parent is None:
+            return self._value
+        return min(self._value, self.parent.value)
+
+    def promote(self) -> None:
+        self._value = PRIORITY_USER
+
+
+_priority: ContextVar[PriorityGroup] = ContextVar("outbound_priority", default=PriorityGroup(PRIORITY_USER))
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """
+    Las peticiones al origen hechas dentro de este bloque (y en las tareas
+    que se creen desde él) ceden el turno a las de los usuarios
+    """
+    current = _priority.get()
+    parent = current if current.value != PRIORITY_USER else None
+    token = _priority.set(PriorityGroup(PRIORITY_BACKGROUND, parent))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get().value
+
+
+def priority_group() -> PriorityGroup:
+    return _priority.get()
+
+
+class HostGovernor:
+    """
+    Control de las peticiones a un host: token bucket (ritmo máximo) más un
+    límite de concurrencia AIMD que sube poco a poco mientras el origen
+    responde bien y se reduce a la mitad ante 429, 5xx, errores o respuestas
+    lentas. Las peticiones que no pueden salir esperan en una cola por
+    prioridad.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        slow_seconds: float = 5.0,
+        backoff_factor: float = 0.5,
+        backoff_interval: float = 1.0,
+        max_retry_after: float = 60.0,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.slow_seconds = slow_seconds
+        self.backoff_factor = backoff_factor
+        self.backoff_interval = backoff_interval
+        self.max_retry_after = max_retry_after
+
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        # Sin peticiones nuevas hasta este instante (Retry-After de un 429)
+        self._paused_until = 0.0
+        self._last_backoff = 0.0
+        # (prioridad, orden de llegada, future, grupo de la prioridad)
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]", PriorityGroup]] = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Latencias recientes de las respuestas correctas (para el p95)
+        self._latencies: "deque[float]" = deque(maxlen=200)
+
+        # Métricas
+        self.requests = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.throttled = 0
+        self.backoffs = 0
+
+    # Admisión
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _blocked_for(self, now: float) -> float:
+        """
+        Segundos hasta que pueda salir una petición por ritmo (0 si ya puede)
+        """
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def _try_admit(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        now = time.monotonic()
+        delay = self._blocked_for(now)
+        if delay > 0:
+            self._schedule(delay)
+            return False
+        if self.rate > 0:
+            self._tokens -= 1
+        self.in_flight += 1
+        return True
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # Petición cancelada mientras esperaba
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_admit():
+                return
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    async def acquire(self, group: Optional[PriorityGroup] = None) -> None:
+        self.requests += 1
+        if not self._waiters and self._try_admit():
+            return
+
+        group = group or PriorityGroup(PRIORITY_USER)
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (group.value, next(self._counter), future, group))
+        # Por si delante solo quedan esperas canceladas
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Ya tenía hueco asignado: se devuelve
+                self.in_flight -= 1
+                self._dispatch()
+            raise
+        finally:
+            waited = time.monotonic() - start
+            self.waited += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def reprioritize(self) -> None:
+        """
+        Reordena la cola tras subir la prioridad de algún grupo
+        """
+        self._waiters = [(group.value, order, future, group) for _, order, future, group in self._waiters]
+        heapq.heapify(self._waiters)
+
+    # Resultado de cada petición
+
+    def release(self, ok: bool, latency: float, retry_after: Optional[float] = None) -> None:
+        self.in_flight -= 1
+        now = time.monotonic()
+        if retry_after:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, now + min(retry_after, self.max_retry_after))
+
+        if ok:
+            self._latencies.append(latency)
+
+        if ok and latency < self.slow_seconds:
+            # Aumento aditivo: +1 por cada "ventana" de peticiones correctas
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        elif now - self._last_backoff >= self.backoff_interval:
+            # Reducción multiplicativa, como mucho una vez por intervalo
+            self.limit = max(self.min_concurrency, self.limit * self.backoff_factor)
+            self._last_backoff = now
+            self.backoffs += 1
+        self._dispatch()
+
+    def latency_percentile(self, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """
+        Percentil de las latencias recientes, o None si hay pocas muestras
+        """
+        if len(self._latencies) < min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency_percentile(0.95)
+        return {
+            "latency_p95": round(p95, 4) if p95 is not None else None,
+            "queue_depth": sum(1 for _, _, future, _ in self._waiters if not future.done()),
+            "in_flight": self.in_flight,
+            "concurrency_limit": round(self.limit, 2),
+            "tokens": round(self._tokens, 2),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "requests": self.requests,
+            "waited": self.waited,
+            "avg_wait_seconds": round(self.wait_seconds / self.waited, 4) if self.waited else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 4),
+            "throttled": self.throttled,
+            "backoffs": self.backoffs,
+        }
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    # Solo el formato en segundos; la fecha HTTP se trata como una pausa corta
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return 1.0
+
+
+class Slot:
+    """
+    Hueco concedido a una petición; `record` anota el código de estado
+    """
+
+    __slots__ = ("ok", "retry_after")
+
+    def __init__(self):
+        self.ok = True
+        self.retry_after: Optional[float] = None
+
+    def record(self, status_code: int, retry_after: Optional[str] = None) -> None:
+        self.ok = status_code < 500 and status_code != 429
+        if status_code == 429 or status_code == 503:
+            self.retry_after = _retry_after_seconds(retry_after) or 1.0
+
+
+class CircuitBreaker:
+    """
+    Circuito por host: tras `failure_threshold` fallos seguidos se abre y las
+    descargas fallan al momento durante `reset_seconds`; después deja pasar
+    una petición de prueba (semiabierto) y se cierra si sale bien
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED or self.failure_threshold <= 0:
+            return True
+        now = time.monotonic()
+        # Semiabierto: una prueba por intervalo (por si la anterior nunca terminó)
+        if now - self._opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+            self._opened_at = now
+            return True
+        return False
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            self.failures = 0
+            self.state = self.CLOSED
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.failure_threshold > 0 and self.failures >= self.failure_threshold
+        ):
+            if self.state != self.OPEN:
+                self.opened += 1
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "opened": self.opened}
+
+
+class OutboundGovernor:
+    """
+    Regulador global de las peticiones al origen, con un HostGovernor por host
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._hosts: Dict[str, HostGovernor] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(CIRCUIT_FAILURES, CIRCUIT_RESET_SECONDS)
+            self._breakers[host] = breaker
+        return breaker
+
+    def host(self, url: str) -> HostGovernor:
+        host = urlsplit(url).netloc
+        governor = self._hosts.get(host)
+        if governor is None:
+            # Con varios workers cada proceso recibe su parte de los límites
+            max_concurrency = max(1, MAX_CONNECTIONS_PER_HOST // WORKERS)
+            governor = HostGovernor(
+                rate=GOVERNOR_RATE / WORKERS,
+                burst=max(1, GOVERNOR_BURST // WORKERS),
+                max_concurrency=max_concurrency,
+                min_concurrency=min(GOVERNOR_MIN_CONCURRENCY, max_concurrency),
+                slow_seconds=GOVERNOR_SLOW_SECONDS,
+                backoff_factor=GOVERNOR_BACKOFF_FACTOR,
+                backoff_interval=GOVERNOR_BACKOFF_INTERVAL,
+                max_retry_after=GOVERNOR_MAX_RETRY_AFTER,
+            )
+            self._hosts[host] = governor
+        return governor
+
+    def slot(self, url: str) -> "_SlotContext":
+        """
+        Uso: `async with governor.slot(url) as slot: ...; slot.record(status)`.
+        Una excepción dentro del bloque cuenta como fallo.
+        """
+        return _SlotContext(self, url)
+
+    def promote(self, group: PriorityGroup) -> None:
+        """
+        Sube un grupo en segundo plano a la prioridad de los usuarios (un
+        usuario espera ahora su resultado), también las peticiones que ya
+        están en cola
+        """
+        if group.value == PRIORITY_USER:
+            return
+        group.promote()
+        for host in self._hosts.values():
+            host.reprioritize()
+
+    def reset(self) -> None:
+        # Los circuitos se conservan: el estado del origen no depende del event loop
+        self._hosts.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        hosts = set(self._hosts) | set(self._breakers)
+        return {
+            host: {
+                **(self._hosts[host].stats() if host in self._hosts else {}),
+                "circuit": self._breakers[host].stats() if host in self._breakers else None,
+            }
+            for host in hosts
+        }
+
+
+class _SlotContext:
+    def __init__(self, governor: OutboundGovernor, url: str):
+        self._governor = governor
+        self._url = url
+        self._host: Optional[HostGovernor] = None
+        self._slot = Slot()
+        self._start = 0.0
+
+    async def __aenter__(self) -> Slot:
+        if self._governor.enabled:
+            self._host = self._governor.host(self._url)
+            await self._host.acquire(priority_group())
+        self._start = time.monotonic()
+        return self._slot
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._host is None:
+            return
+        # Una cancelación (cliente desconectado) no dice nada del origen
+        cancelled = exc_type is not None and issubclass(exc_type, asyncio.CancelledError)
+        ok = self._slot.ok and (exc_type is None or cancelled)
+        self._host.release(ok, time.monotonic() - self._start, self._slot.retry_after)
+
+
+governor = OutboundGovernor(enabled=GOVERNOR_ENABLED)
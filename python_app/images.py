@@ -0,0 +1,364 @@
+import asyncio
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlsplit
+import httpx
+from cache import HIT, MISS
+from config import (
+    BASE_URL,
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_BYTES,
+    IMAGE_WIDTHS,
+    IMAGE_QUALITY,
+    IMAGE_FAILED_TTL,
+    IMAGE_MAX_BYTES,
+    IMAGE_ALLOWED_HOSTS,
+    WORKERS,
+)
+from governor import governor
+from metrics import record_cache, record_fetch
+from utils import get_http_client
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow es opcional: sin él no se redimensiona
+    Image = None
+
+# Hosts de los que el proxy acepta imágenes (nunca URLs arbitrarias)
+_ALLOWED_HOSTS = {urlsplit(BASE_URL).netloc, *IMAGE_ALLOWED_HOSTS}
+
+# Campos "image" del JSON de las respuestas que apuntan a esos hosts
+_IMAGE_FIELD = re.compile(
+    rb'"image":"(https?://(?:'
+    + b"|".join(re.escape(host.encode()) for host in sorted(_ALLOWED_HOSTS))
+    + rb')/[^"]*)"'
+)
+
+# Prefijo de /api/img con el que se reescriben las imágenes de la respuesta
+# en curso (lo fija la opción ?img= de los routers); None = sin reescribir
+image_rewrite: ContextVar[Optional[str]] = ContextVar("image_rewrite", default=None)
+
+
+def is_proxyable(url: str) -> bool:
+    parts = urlsplit(url)
+    return parts.scheme in ("http", "https") and parts.netloc in _ALLOWED_HOSTS
+
+
+def snap_width(width: Optional[int]) -> Optional[int]:
+    """
+    Ancho de miniatura para un ancho pedido: el siguiente de IMAGE_WIDTHS
+    (así hay pocas variantes por imagen). None = imagen original.
+    """
+    if width is None or Image is None or not IMAGE_WIDTHS:
+        return None
+    return next((w for w in IMAGE_WIDTHS if w >= width), IMAGE_WIDTHS[-1])
+
+
+def rewrite_image_urls(body: bytes, prefix: str) -> bytes:
+    """
+    Cambia las imágenes del origen en un JSON por `prefix` + URL codificada
+    """
+    encoded = prefix.encode()
+    return _IMAGE_FIELD.sub(lambda m: b'"image":"' + encoded + quote(m.group(1), safe="").encode() + b'"', body)
+
+
+async def rewrite_stream(chunks: AsyncIterator[str], prefix: str) -> AsyncIterator[str]:
+    """
+    rewrite_image_urls para respuestas en streaming (cada trozo es un evento completo)
+    """
+    async for chunk in chunks:
+        yield rewrite_image_urls(chunk.encode(), prefix).decode()
+
+
+class CachedImage(NamedTuple):
+    path: str
+    # Hash del contenido, usado como ETag
+    etag: str
+
+
+class ImageCache:
+    """
+    Imágenes en disco con tamaño máximo. Cada fichero se llama
+    <clave>-<hash del contenido>.<extensión>: el hash es el ETag y la
+    extensión da el tipo. Al pasar del máximo se borran las usadas hace más
+    tiempo (la fecha de modificación se actualiza al servirlas).
+
+    Los workers comparten el directorio: cada uno vuelve a medirlo cuando ha
+    escrito su parte del espacio libre de la última medición, así que entre
+    todos no pasan del máximo. Las operaciones son bloqueantes (se llaman
+    desde varios hilos a la vez).
+    """
+
+    # Al limpiar se baja hasta esta fracción del máximo
+    TRIM_RATIO = 0.9
+
+    def __init__(self, directory: str, max_bytes: int, workers: int = WORKERS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        # Tamaño del directorio en la última medición y bytes escritos desde entonces
+        self._measured: Optional[int] = None
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def _shard(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2])
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        prefix = f"{key}-"
+        try:
+            with os.scandir(self._shard(key)) as entries:
+                for entry in entries:
+                    if entry.name.startswith(prefix) and not entry.name.endswith(".tmp"):
+                        os.utime(entry.path)
+                        return CachedImage(entry.path, entry.name[len(prefix):].partition(".")[0])
+        except FileNotFoundError:
+            pass
+        return None
+
+    def put(self, key: str, data: bytes, media_type: str) -> CachedImage:
+        etag = hashlib.sha256(data).hexdigest()[:32]
+        shard = self._shard(key)
+        os.makedirs(shard, exist_ok=True)
+        name = f"{key}-{etag}{mimetypes.guess_extension(media_type) or '.bin'}"
+        path = os.path.join(shard, name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        # Versiones anteriores de la misma imagen
+        with os.scandir(shard) as entries:
+            for entry in entries:
+                if entry.name.startswith(f"{key}-") and entry.name != name and not entry.name.endswith(".tmp"):
+                    self._remove(entry.path)
+
+        with self._lock:
+            self._written += len(data)
+            if self._measured is None or self._written > max(0, self.max_bytes - self._measured) / self.workers:
+                self._trim()
+        return CachedImage(path, etag)
+
+    def _files(self) -> List[Tuple[float, int, str]]:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _trim(self) -> None:
+        """
+        Mide el directorio (con lo escrito por todos los workers) y borra las
+        imágenes menos usadas si pasa del máximo. Se llama con `_lock`.
+        """
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        if total > self.max_bytes:
+            for _, size, path in files:
+                if total <= self.max_bytes * self.TRIM_RATIO:
+                    break
+                if self._remove(path):
+                    total -= size
+        self._measured = total
+        self._written = 0
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+# Redirecciones que se siguen al descargar una imagen. Se siguen a mano para
+# comprobar que cada salto va a un host permitido.
+_MAX_REDIRECTS = 3
+
+
+async def download_image(url: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Descarga una imagen (como mucho IMAGE_MAX_BYTES) a través del regulador.
+    Devuelve (contenido, tipo) o None.
+    """
+    for _ in range(_MAX_REDIRECTS + 1):
+        image, location = await _download_once(url)
+        if location is None:
+            return image
+        if not is_proxyable(location):
+            print(f"Error fetching image {url}: redirección a un host no permitido ({location})")
+            return None
+        url = location
+    print(f"Error fetching image {url}: demasiadas redirecciones")
+    return None
+
+
+async def _download_once(url: str) -> Tuple[Optional[Tuple[bytes, str]], Optional[str]]:
+    """
+    Un GET sin seguir redirecciones: ((contenido, tipo) o None, destino de la redirección)
+    """
+    breaker = governor.breaker(url)
+    if not breaker.allow():
+        print(f"Error fetching image {url}: circuito abierto, origen no disponible")
+        return None, None
+
+    headers = {"Accept": "image/avif,image/webp,image/*,*/*;q=0.8", "Referer": f"{BASE_URL}/"}
+    chunks: List[bytes] = []
+    size = 0
+    location = None
+    try:
+        async with governor.slot(url) as slot:
+            start = time.perf_counter()
+            async with get_http_client().stream("GET", url, headers=headers, follow_redirects=False) as response:
+                slot.record(response.status_code, response.headers.get("Retry-After"))
+                media_type = response.headers.get("Content-Type", "").partition(";")[0].strip()
+                if response.is_redirect:
+                    location = str(response.url.join(response.headers["Location"]))
+                elif response.status_code == 200 and media_type.startswith("image/"):
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > IMAGE_MAX_BYTES:
+                            break
+                        chunks.append(chunk)
+            record_fetch(time.perf_counter() - start, response.status_code, size)
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        breaker.record(False)
+        print(f"Error fetching image {url}: {str(e)}")
+        return None, None
+
+    breaker.record(response.status_code < 500)
+    if location is not None:
+        return None, location
+    if response.status_code != 200 or not media_type.startswith("image/"):
+        print(f"Error fetching image {url}: HTTP {response.status_code} ({media_type or 'sin tipo'})")
+        return None, None
+    if size > IMAGE_MAX_BYTES:
+        print(f"Error fetching image {url}: más de {IMAGE_MAX_BYTES} bytes")
+        return None, None
+    return (b"".join(chunks), media_type), None
+
+
+def _thumbnail(path: str, width: int, image_format: str) -> bytes:
+    """
+    Reduce una imagen a `width` de ancho (sin ampliarla) y la recomprime
+    """
+    with Image.open(path) as image:
+        image.thumbnail((width, image.height))
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+        output = io.BytesIO()
+        image.save(output, format=image_format.upper(), quality=IMAGE_QUALITY, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+def _key(*parts: object) -> str:
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:40]
+
+
+class ImageProxy:
+    """
+    Proxy de imágenes del origen: la original se descarga una sola vez y las
+    miniaturas se generan a partir de la copia en disco
+    """
+
+    def __init__(self, cache: ImageCache, failed_ttl: float = IMAGE_FAILED_TTL):
+        self.cache = cache
+        self.failed_ttl = failed_ttl
+        self._inflight: Dict[str, "asyncio.Task[Optional[CachedImage]]"] = {}
+        # Miniaturas que no se pudieron generar: clave -> hasta cuándo no se reintenta
+        self._failed: Dict[str, float] = {}
+
+    async def get(self, url: str, width: Optional[int], webp: bool) -> Tuple[Optional[CachedImage], str]:
+        """
+        Imagen original (width=None) o miniatura en WebP/JPEG. Devuelve
+        (imagen, estado de caché); si no se puede redimensionar se devuelve
+        la original.
+
+        La limpieza de la caché (de este u otro worker) puede borrar el
+        fichero en cualquier momento: si ya no está se vuelve a cargar una vez
+        y, si tampoco, se devuelve None.
+        """
+        loop = asyncio.get_running_loop()
+        for _ in range(2):
+            image, cache_status = await self._get(url, width, webp)
+            if image is None or await loop.run_in_executor(None, os.path.exists, image.path):
+                return image, cache_status
+        return None, cache_status
+
+    async def _get(self, url: str, width: Optional[int], webp: bool) -> Tuple[Optional[CachedImage], str]:
+        original, cache_status = await self._once(_key(url), lambda key: self._fetch(key, url))
+        if original is None or width is None:
+            return original, cache_status
+
+        image_format = "webp" if webp else "jpeg"
+        key = _key(url, width, image_format)
+        if self._failed.get(key, 0) > time.monotonic():
+            return original, cache_status
+        resized, cache_status = await self._once(key, lambda key: self._resize(key, original, width, image_format))
+        return resized or original, cache_status
+
+    async def _once(
+        self, key: str, load: Callable[[str], Awaitable[Optional[CachedImage]]]
+    ) -> Tuple[Optional[CachedImage], str]:
+        """
+        Busca en disco y, si no está, una sola carga en curso por clave
+        """
+        loop = asyncio.get_running_loop()
+        image = await loop.run_in_executor(None, self.cache.get, key)
+        if image is not None:
+            record_cache(f"img:{key}", HIT)
+            return image, HIT
+
+        record_cache(f"img:{key}", MISS)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), MISS
+
+    async def _fetch(self, key: str, url: str) -> Optional[CachedImage]:
+        downloaded = await download_image(url)
+        if downloaded is None:
+            return None
+        return await self._store(key, *downloaded)
+
+    async def _resize(self, key: str, original: CachedImage, width: int, image_format: str) -> Optional[CachedImage]:
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(None, _thumbnail, original.path, width, image_format)
+        except FileNotFoundError:
+            # Original borrada por la limpieza: get() la vuelve a descargar
+            return None
+        except Exception as e:
+            print(f"Error resizing image {original.path}: {e}")
+            now = time.monotonic()
+            self._failed = {k: until for k, until in self._failed.items() if until > now}
+            self._failed[key] = now + self.failed_ttl
+            return None
+        return await self._store(key, data, f"image/{image_format}")
+
+    async def _store(self, key: str, data: bytes, media_type: str) -> Optional[CachedImage]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self.cache.put, key, data, media_type)
+        except OSError as e:
+            print(f"Error saving image {key}: {e}")
+            return None
+
+
+image_proxy = ImageProxy(ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_BYTES))
@@ -1,16 +1,53 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from routers import home, series, movies, search
-from config import PORT, HOST
+from fastapi.responses import JSONResponse, Response
+from routers import home, series, movies, search, updates, images
+from config import PORT, HOST, CACHE_DISK_PATH, PREWARM_ENABLED, CATALOG_PATH, CATALOG_RESIDENT
+from utils import start_http_client, close_http_client, shutdown_parse_pool
+from cache import response_cache
+from changes import change_feed
+from prewarm import prewarm_scheduler
+from catalog import open_catalog, close_catalog, load_resident_catalog
+from search_index import search_index
+from governor import governor
+from metrics import ServerTimingMiddleware, render_metrics
 import uvicorn
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un único cliente HTTP (pool de conexiones) para toda la vida de la app
+    await start_http_client()
+    # Nivel de caché en disco opcional (persiste entre reinicios)
+    if CACHE_DISK_PATH:
+        response_cache.open_disk(CACHE_DISK_PATH)
+    # Catálogo local generado por crawler.py
+    if CATALOG_PATH:
+        catalog = open_catalog(CATALOG_PATH)
+        # Copia compacta en memoria: las peticiones no leen el SQLite
+        if CATALOG_RESIDENT:
+            catalog = load_resident_catalog()
+        search_index.add_many(catalog.iter_series())
+    if PREWARM_ENABLED:
+        prewarm_scheduler.start()
+    yield
+    await prewarm_scheduler.stop()
+    await close_http_client()
+    shutdown_parse_pool()
+    # Cambios pendientes de guardar en el SQLite compartido
+    await change_feed.flush()
+    response_cache.close()
+    close_catalog()
+
+
 app = FastAPI(
     title="SeriesFlix Scraping API",
     description="API REST para obtener información de SERIES de SeriesFlix mediante scraping. NOTA: SeriesFlix.boats solo tiene series, no películas.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Configurar CORS
@@ -22,11 +59,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Incluir routers
-app.include_router(home.router)
-app.include_router(series.router)
-app.include_router(movies.router)
-app.include_router(search.router)
+# Cabecera Server-Timing con el tiempo de cada etapa (fetch, parse, extract)
+app.add_middleware(ServerTimingMiddleware)
+
+# Incluir routers; los de JSON aceptan ?img= para servir las imágenes por el proxy
+image_option = [Depends(images.image_option)]
+app.include_router(home.router, dependencies=image_option)
+app.include_router(series.router, dependencies=image_option)
+app.include_router(movies.router, dependencies=image_option)
+app.include_router(search.router, dependencies=image_option)
+app.include_router(updates.router, dependencies=image_option)
+app.include_router(images.router)
 
 
 @app.get("/")
@@ -43,7 +86,12 @@ async def root():
                 "detail": "/api/series/{series_id}",
                 "episode_servers": "/api/series/episode/servers?episode_url=URL"
             },
-            "search": "/api/search?q=query"
+            "search": "/api/search?q=query",
+            "image": "/api/img?url=URL&w=342",
+            "updates": {
+                "poll": "/api/updates?since=0",
+                "stream": "/api/updates/stream"
+            }
         }
     }
 
@@ -53,6 +101,24 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/health/outbound")
+async def outbound_health():
+    """
+    Estado del regulador de peticiones al origen por host: cola, esperas,
+    concurrencia actual y reducciones por 429/5xx
+    """
+    return governor.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Métricas en formato Prometheus
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     return JSONResponse(
@@ -62,6 +128,7 @@ async def global_exception_handler(request, exc):
 
 
 if __name__ == "__main__":
+    # Desarrollo: un proceso con recarga automática (producción: serve.py)
     uvicorn.run(
         "main:app",
         host=HOST,
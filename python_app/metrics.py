@@ -0,0 +1,215 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+from governor import governor
+from revalidation import validators, parsed_results
+
+# Métricas Prometheus (expuestas en /metrics) y cabecera Server-Timing por petición
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+_SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+ORIGIN_FETCH_SECONDS = Histogram(
+    "origin_fetch_seconds",
+    "Latencia de las peticiones al origen",
+    ["outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+ORIGIN_FETCH_BYTES = Histogram(
+    "origin_fetch_bytes",
+    "Tamaño del HTML descargado del origen",
+    buckets=_SIZE_BUCKETS,
+)
+PARSE_SECONDS = Histogram(
+    "parse_seconds",
+    "Tiempo de construcción del árbol HTML por scraper",
+    ["scraper"],
+    buckets=_PARSE_BUCKETS,
+)
+EXTRACT_SECONDS = Histogram(
+    "extract_seconds",
+    "Tiempo de extracción de datos sobre el árbol por scraper",
+    ["scraper"],
+    buckets=_PARSE_BUCKETS,
+)
+PARSE_FAILURES = Counter(
+    "parse_failures_total",
+    "Elementos que no se pudieron extraer, por scraper y sección",
+    ["scraper", "section"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Consultas a la caché por tipo de entrada y resultado (HIT, MISS, STALE, CATALOG, INDEX)",
+    ["kind", "status"],
+)
+
+
+def fetch_outcome(status_code: Optional[int]) -> str:
+    """
+    Etiqueta de resultado de una petición: 2xx, 3xx, 4xx, 5xx o error (de red)
+    """
+    return "error" if status_code is None else f"{status_code // 100}xx"
+
+
+def record_fetch(seconds: float, status_code: Optional[int], size: int = 0) -> None:
+    ORIGIN_FETCH_SECONDS.labels(fetch_outcome(status_code)).observe(seconds)
+    if size:
+        ORIGIN_FETCH_BYTES.observe(size)
+    add_timing("fetch", seconds)
+
+
+def record_parse(scraper: str, parse_seconds: float, extract_seconds: float) -> None:
+    PARSE_SECONDS.labels(scraper).observe(parse_seconds)
+    EXTRACT_SECONDS.labels(scraper).observe(extract_seconds)
+    add_timing("parse", parse_seconds)
+    add_timing("extract", extract_seconds)
+
+
+def cache_kind(key: str) -> str:
+    """
+    Tipo de entrada a partir de la clave ("series:detail:x" -> "series:detail",
+    "html:https://..." -> "html"), para no crear una serie por clave
+    """
+    prefix, _, rest = key.partition(":")
+    if prefix == "series":
+        return f"series:{rest.partition(':')[0]}"
+    return prefix
+
+
+def record_cache(key: str, status: str) -> None:
+    CACHE_REQUESTS.labels(cache_kind(key), status).inc()
+
+
+# Fallos de extracción. Los parsers pueden ejecutarse en otro proceso (modo
+# process): ahí se acumulan en una lista que parse_in_pool cuenta al volver.
+_failure_sink: ContextVar[Optional[List[Tuple[str, str]]]] = ContextVar("parse_failures", default=None)
+
+
+def record_parse_failure(scraper: str, section: str) -> None:
+    """
+    Cuenta un elemento que no se pudo extraer (sustituye a los print de error)
+    """
+    sink = _failure_sink.get()
+    if sink is not None:
+        sink.append((scraper, section))
+    else:
+        PARSE_FAILURES.labels(scraper, section).inc()
+
+
+def collect_parse_failures() -> Any:
+    """
+    Empieza a acumular los fallos del hilo o proceso actual; devuelve el token
+    para `finish_parse_failures`
+    """
+    return _failure_sink.set([])
+
+
+def finish_parse_failures(token: Any) -> List[Tuple[str, str]]:
+    failures = _failure_sink.get() or []
+    _failure_sink.reset(token)
+    return failures
+
+
+def count_parse_failures(failures: List[Tuple[str, str]]) -> None:
+    for scraper, section in failures:
+        PARSE_FAILURES.labels(scraper, section).inc()
+
+
+class _OutboundCollector:
+    """
+    Estado del regulador de peticiones, de la revalidación y de los
+    resultados de parseo reutilizados, leído en cada scrape
+    """
+
+    def collect(self):
+        queue = GaugeMetricFamily("outbound_queue_depth", "Peticiones esperando turno por host", labels=["host"])
+        in_flight = GaugeMetricFamily("outbound_in_flight", "Peticiones en curso por host", labels=["host"])
+        limit = GaugeMetricFamily("outbound_concurrency_limit", "Límite de concurrencia AIMD por host", labels=["host"])
+        wait = GaugeMetricFamily("outbound_avg_wait_seconds", "Espera media en cola por host", labels=["host"])
+        circuit = GaugeMetricFamily("outbound_circuit_open", "1 si el circuito del host está abierto", labels=["host"])
+        for host, stats in governor.stats().items():
+            if "queue_depth" in stats:
+                queue.add_metric([host], stats["queue_depth"])
+                in_flight.add_metric([host], stats["in_flight"])
+                limit.add_metric([host], stats["concurrency_limit"])
+                wait.add_metric([host], stats["avg_wait_seconds"])
+            if stats.get("circuit"):
+                circuit.add_metric([host], 1 if stats["circuit"]["state"] == "open" else 0)
+        yield from (queue, in_flight, limit, wait, circuit)
+
+        not_modified = CounterMetricFamily("origin_not_modified", "Respuestas 304 aprovechadas")
+        not_modified.add_metric([], validators.not_modified)
+        reused = CounterMetricFamily("parsed_results_reused", "Parseos evitados por HTML sin cambios")
+        reused.add_metric([], parsed_results.hits)
+        yield from (not_modified, reused)
+
+
+_outbound_collector = _OutboundCollector()
+REGISTRY.register(_outbound_collector)
+
+# Con varios workers (serve.py) cada uno escribe sus contadores e histogramas
+# en este directorio y /metrics los suma
+_MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Métricas de todos los workers. El estado del regulador, la revalidación
+    y los parseos reutilizados (_OutboundCollector) son siempre los del
+    worker que responde.
+    """
+    if not _MULTIPROCESS_DIR:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_outbound_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# Server-Timing: cada etapa suma su duración al registro de la petición en curso
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timing", default=None)
+
+
+def add_timing(stage: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware ASGI que añade la cabecera Server-Timing (fetch, parse, extract
+    y total, en milisegundos). Cada etapa es la suma de sus duraciones, así
+    que las descargas en paralelo pueden superar al total. Las etapas
+    compartidas por varias peticiones (single-flight) se atribuyen a la que
+    las inició.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = time.perf_counter() - start
+                value = ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", value.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
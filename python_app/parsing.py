@@ -0,0 +1,312 @@
+import codecs
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Pattern
+from bs4 import BeautifulSoup, Tag
+import lxml.html
+from lxml import etree
+from cssselect import HTMLTranslator
+
+# API común de nodos sobre la que trabajan los scrapers. Cada backend
+# (BeautifulSoup, lxml.html, selectolax) envuelve sus elementos en una clase
+# con los mismos métodos: select, select_one, get, get_text, find_parent,
+# find_text, children, parents, name y classes.
+
+
+class SoupNode:
+    """
+    Backend BeautifulSoup (el parser original de la API)
+    """
+
+    __slots__ = ("_tag",)
+
+    def __init__(self, tag: Tag):
+        self._tag = tag
+
+    @property
+    def name(self) -> str:
+        return self._tag.name
+
+    @property
+    def classes(self) -> List[str]:
+        return self._tag.get("class") or []
+
+    def get(self, attr: str, default: Optional[str] = None) -> Optional[str]:
+        value = self._tag.get(attr, default)
+        return " ".join(value) if isinstance(value, list) else value
+
+    def get_text(self) -> str:
+        return self._tag.get_text()
+
+    def select(self, css: str) -> List["SoupNode"]:
+        return [SoupNode(tag) for tag in self._tag.select(css)]
+
+    def select_one(self, css: str) -> Optional["SoupNode"]:
+        tag = self._tag.select_one(css)
+        return SoupNode(tag) if tag is not None else None
+
+    def find_parent(self, name: str) -> Optional["SoupNode"]:
+        tag = self._tag.find_parent(name)
+        return SoupNode(tag) if tag is not None else None
+
+    def find_text(self, pattern: Pattern) -> Optional["SoupNode"]:
+        text = self._tag.find(string=pattern)
+        parent = text.find_parent() if text is not None else None
+        return SoupNode(parent) if parent is not None else None
+
+    def children(self) -> List["SoupNode"]:
+        return [SoupNode(child) for child in self._tag.contents if isinstance(child, Tag)]
+
+    def parents(self) -> Iterator["SoupNode"]:
+        return (SoupNode(parent) for parent in self._tag.parents)
+
+
+# Selectores CSS compilados a XPath una sola vez por selector
+_translator = HTMLTranslator()
+_xpath_cache: Dict[str, etree.XPath] = {}
+
+
+def _xpath(css: str) -> etree.XPath:
+    compiled = _xpath_cache.get(css)
+    if compiled is None:
+        # Solo descendientes, igual que select() de BeautifulSoup
+        compiled = etree.XPath(_translator.css_to_xpath(css, prefix="descendant::"))
+        _xpath_cache[css] = compiled
+    return compiled
+
+
+_text_nodes = etree.XPath("descendant::text()")
+
+
+class LxmlNode:
+    """
+    Backend lxml.html: selectores CSS precompilados a XPath
+    """
+
+    __slots__ = ("_el",)
+
+    def __init__(self, el):
+        self._el = el
+
+    @property
+    def name(self) -> str:
+        return self._el.tag
+
+    @property
+    def classes(self) -> List[str]:
+        return (self._el.get("class") or "").split()
+
+    def get(self, attr: str, default: Optional[str] = None) -> Optional[str]:
+        return self._el.get(attr, default)
+
+    def get_text(self) -> str:
+        return self._el.text_content()
+
+    def select(self, css: str) -> List["LxmlNode"]:
+        return [LxmlNode(el) for el in _xpath(css)(self._el)]
+
+    def select_one(self, css: str) -> Optional["LxmlNode"]:
+        found = _xpath(css)(self._el)
+        return LxmlNode(found[0]) if found else None
+
+    def find_parent(self, name: str) -> Optional["LxmlNode"]:
+        for parent in self._el.iterancestors(name):
+            return LxmlNode(parent)
+        return None
+
+    def find_text(self, pattern: Pattern) -> Optional["LxmlNode"]:
+        for text in _text_nodes(self._el):
+            if pattern.search(text):
+                parent = text.getparent()
+                # El "tail" de un elemento pertenece al elemento padre
+                if text.is_tail:
+                    parent = parent.getparent()
+                return LxmlNode(parent) if parent is not None else None
+        return None
+
+    def children(self) -> List["LxmlNode"]:
+        # Se descartan comentarios e instrucciones de procesamiento
+        return [LxmlNode(child) for child in self._el if isinstance(child.tag, str)]
+
+    def parents(self) -> Iterator["LxmlNode"]:
+        return (LxmlNode(parent) for parent in self._el.iterancestors())
+
+
+class SelectolaxNode:
+    """
+    Backend selectolax (lexbor): el más rápido, dependencia opcional
+    """
+
+    __slots__ = ("_node",)
+
+    def __init__(self, node):
+        self._node = node
+
+    @property
+    def name(self) -> str:
+        return self._node.tag
+
+    @property
+    def classes(self) -> List[str]:
+        return (self._node.attributes.get("class") or "").split()
+
+    def get(self, attr: str, default: Optional[str] = None) -> Optional[str]:
+        value = self._node.attributes.get(attr)
+        return default if value is None else value
+
+    def get_text(self) -> str:
+        return self._node.text(deep=True)
+
+    def select(self, css: str) -> List["SelectolaxNode"]:
+        # css() incluye al propio nodo si casa y repite los nodos que casan con
+        # varios selectores de un grupo ("a, b"); select() devuelve cada
+        # descendiente una sola vez
+        seen = {self._node.mem_id}
+        nodes = []
+        for node in self._node.css(css):
+            if node.mem_id not in seen:
+                seen.add(node.mem_id)
+                nodes.append(SelectolaxNode(node))
+        return nodes
+
+    def select_one(self, css: str) -> Optional["SelectolaxNode"]:
+        own_id = self._node.mem_id
+        for node in self._node.css(css):
+            if node.mem_id != own_id:
+                return SelectolaxNode(node)
+        return None
+
+    def find_parent(self, name: str) -> Optional["SelectolaxNode"]:
+        parent = self._node.parent
+        while parent is not None:
+            if parent.tag == name:
+                return SelectolaxNode(parent)
+            parent = parent.parent
+        return None
+
+    def find_text(self, pattern: Pattern) -> Optional["SelectolaxNode"]:
+        for node in self._node.traverse(include_text=True):
+            if node.tag == "-text" and pattern.search(node.text_content or ""):
+                return SelectolaxNode(node.parent) if node.parent is not None else None
+        return None
+
+    def children(self) -> List["SelectolaxNode"]:
+        return [
+            SelectolaxNode(child)
+            for child in self._node.iter(include_text=False)
+            if child.is_element_node
+        ]
+
+    def parents(self) -> Iterator["SelectolaxNode"]:
+        parent = self._node.parent
+        while parent is not None:
+            yield SelectolaxNode(parent)
+            parent = parent.parent
+
+
+def _parse_bs4(content: bytes) -> SoupNode:
+    return SoupNode(BeautifulSoup(content, 'lxml'))
+
+
+# Sin <meta charset> lxml asume latin-1; si el contenido es UTF-8 válido se fuerza
+_utf8_parser = lxml.html.HTMLParser(encoding="utf-8")
+
+
+def _parse_lxml(content: bytes) -> LxmlNode:
+    try:
+        content.decode("utf-8")
+        parser = _utf8_parser
+    except UnicodeDecodeError:
+        parser = None
+    try:
+        return LxmlNode(lxml.html.document_fromstring(content, parser=parser))
+    except etree.ParserError:
+        # Documento vacío: raíz sin contenido, como haría BeautifulSoup
+        return LxmlNode(lxml.html.Element("html"))
+
+
+# <meta charset> o <meta http-equiv="Content-Type" content="...; charset=...">
+_META_CHARSET = re.compile(rb"""<meta[^>]*?charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+# Bytes del principio del documento en los que se busca (como los navegadores)
+_CHARSET_PRESCAN = 1024
+
+
+def _sniff_encoding(head: bytes) -> str:
+    """
+    Codificación declarada en un <meta> de `head`; si no hay, UTF-8 (como _parse_lxml)
+    """
+    match = _META_CHARSET.search(head)
+    if match is not None:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return "utf-8"
+
+
+class LxmlStreamParser:
+    """
+    Parser incremental de lxml para HTML que llega por trozos: `feed` devuelve
+    los elementos que se han cerrado con ese trozo y `close` el árbol
+    construido hasta el momento (aunque el documento esté incompleto).
+    Sin `encoding` (la respuesta no trae charset) se retienen los primeros
+    bytes hasta saber si el documento lo declara en un <meta>.
+    """
+
+    def __init__(self, encoding: Optional[str] = None):
+        self._parser = None
+        self._head = b""
+        if encoding is not None:
+            self._start(encoding)
+
+    def _start(self, encoding: str) -> None:
+        self._parser = etree.HTMLPullParser(events=("end",), encoding=encoding)
+        # Elementos de lxml.html (text_content, etc.), como en _parse_lxml
+        self._parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+
+    def feed(self, chunk: bytes) -> Iterator:
+        if self._parser is None:
+            self._head += chunk
+            if len(self._head) < _CHARSET_PRESCAN:
+                return iter(())
+            chunk, self._head = self._head, b""
+            self._start(_sniff_encoding(chunk))
+        self._parser.feed(chunk)
+        return (el for _, el in self._parser.read_events())
+
+    def close(self) -> LxmlNode:
+        if self._parser is None:
+            self._start(_sniff_encoding(self._head))
+            self._parser.feed(self._head)
+        try:
+            root = self._parser.close()
+        except etree.LxmlError:
+            root = None
+        # Documento vacío: raíz sin contenido, igual que _parse_lxml
+        return LxmlNode(root if root is not None else lxml.html.Element("html"))
+
+
+def _parse_selectolax(content: bytes) -> SelectolaxNode:
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+    except ImportError:
+        raise RuntimeError("PARSER_BACKEND=selectolax requiere instalar selectolax") from None
+    return SelectolaxNode(LexborHTMLParser(content).root)
+
+
+PARSERS: Dict[str, Callable[[bytes], object]] = {
+    "bs4": _parse_bs4,
+    "lxml": _parse_lxml,
+    "selectolax": _parse_selectolax,
+}
+
+
+def get_parser(backend: str) -> Callable[[bytes], object]:
+    """
+    Función de parseo del backend indicado
+    """
+    try:
+        return PARSERS[backend]
+    except KeyError:
+        raise ValueError(
+            f"PARSER_BACKEND desconocido: {backend!r} (opciones: {', '.join(PARSERS)})"
+        ) from None
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import random
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional
+import services
+from governor import background_priority
+from config import (
+    CACHE_DISK_PATH,
+    PREWARM_INTERVAL,
+    PREWARM_JITTER,
+    PREWARM_CONCURRENCY,
+    PREWARM_LIST_PAGES,
+    PREWARM_POPULAR_SERIES,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Máximo de series distintas que se recuerdan en el contador de tráfico
+_MAX_TRACKED_SERIES = 1000
+
+# Visitas recientes a /api/series/{id}; se reducen a la mitad en cada ciclo
+_series_views: Counter = Counter()
+
+
+def record_series_view(series_id: str) -> None:
+    """
+    Registra una visita de usuario al detalle de una serie
+    """
+    _series_views[series_id] += 1
+    if len(_series_views) > _MAX_TRACKED_SERIES * 2:
+        _trim_views()
+
+
+def popular_series(limit: int) -> List[str]:
+    """
+    Series más visitadas recientemente
+    """
+    return [series_id for series_id, _ in _series_views.most_common(limit)]
+
+
+def _trim_views() -> None:
+    kept = _series_views.most_common(_MAX_TRACKED_SERIES)
+    _series_views.clear()
+    _series_views.update(dict(kept))
+
+
+def _decay_views() -> None:
+    for series_id, count in list(_series_views.items()):
+        if count > 1:
+            _series_views[series_id] = count // 2
+        else:
+            del _series_views[series_id]
+
+
+class LeaderLock:
+    """
+    Lock de fichero no bloqueante: de los procesos que comparten `path` solo
+    uno lo obtiene. El sistema lo libera si ese proceso muere, y otro lo
+    toma en su siguiente intento. Sin `path` (o sin fcntl) siempre se obtiene.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        if self._fd is not None or not self.path or fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class PrewarmScheduler:
+    """
+    Refresca periódicamente la home, las primeras páginas del listado y las
+    series populares para que las peticiones de usuario encuentren la caché caliente.
+
+    Con la caché en disco compartida por varios workers solo precalienta el
+    que tiene el lock (`lock_path`); el resto lee lo que este escribe.
+    """
+
+    def __init__(
+        self,
+        interval: float = PREWARM_INTERVAL,
+        jitter: float = PREWARM_JITTER,
+        concurrency: int = PREWARM_CONCURRENCY,
+        list_pages: int = PREWARM_LIST_PAGES,
+        popular_series: int = PREWARM_POPULAR_SERIES,
+        lock_path: str = f"{CACHE_DISK_PATH}.prewarm.lock" if CACHE_DISK_PATH else "",
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.list_pages = list_pages
+        self.popular_series = popular_series
+        self._lock = LeaderLock(lock_path)
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._lock.release()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Los workers sin el lock reintentan en cada ciclo
+                if self._lock.acquire():
+                    with background_priority():
+                        await self.run_once()
+            except Exception as e:
+                print(f"Error prewarming cache: {e}")
+            await asyncio.sleep(self.interval + random.uniform(0, self.jitter))
+
+    async def run_once(self) -> None:
+        """
+        Ejecuta un ciclo completo de precalentamiento
+        """
+        home, _ = await services.get_home(refresh=True)
+
+        series_ids = []
+        if home:
+            series_ids.extend(s.id for s in home.featured + home.trending_series)
+        series_ids.extend(popular_series(self.popular_series))
+        _decay_views()
+
+        jobs: List[Callable[[], Awaitable[object]]] = [
+            lambda page=page: services.get_series_list(page, refresh=True)
+            for page in range(1, self.list_pages + 1)
+        ]
+        jobs.extend(
+            lambda series_id=series_id: services.get_series_detail(series_id, refresh=True)
+            for series_id in dict.fromkeys(series_ids)
+        )
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_job(job: Callable[[], Awaitable[object]]) -> None:
+            # Repartir el arranque de los trabajos para no generar ráfagas
+            await asyncio.sleep(random.uniform(0, self.jitter))
+            async with semaphore:
+                try:
+                    await job()
+                except Exception as e:
+                    print(f"Error prewarming job: {e}")
+
+        await asyncio.gather(*(run_job(job) for job in jobs))
+
+
+prewarm_scheduler = PrewarmScheduler()
@@ -0,0 +1,30 @@
+from typing import Any, Dict, Optional
+from fastapi import Response
+from cache import response_cache
+from images import image_rewrite, rewrite_image_urls
+
+# Respuestas JSON serializadas directamente a bytes. Cuando un endpoint
+# devuelve un Response, FastAPI no valida ni vuelve a serializar el resultado
+# con response_model, que se sigue declarando para el esquema OpenAPI.
+
+
+class JSONBytesResponse(Response):
+    """
+    Respuesta con el cuerpo JSON ya serializado. Si la petición lo pide
+    (?img=), las imágenes del origen se cambian por URLs de /api/img.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        body = super().render(content)
+        prefix = image_rewrite.get()
+        return rewrite_image_urls(body, prefix) if prefix else body
+
+
+def json_response(value: Any, type_: Any, headers: Optional[Dict[str, str]] = None) -> JSONBytesResponse:
+    """
+    Serializa un resultado con pydantic-core (sin validarlo de nuevo); los
+    resultados cacheados reutilizan el JSON que se guardó con ellos
+    """
+    return JSONBytesResponse(response_cache.to_json(value, type_), headers=headers)
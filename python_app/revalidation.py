@@ -0,0 +1,135 @@
+import hashlib
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from config import REVALIDATE_ENABLED, REVALIDATE_MEMORY_BYTES, PARSED_MEMO_ENTRIES
+
+# Peticiones condicionales (If-None-Match / If-Modified-Since) y reutilización
+# de resultados ya parseados cuando el HTML no ha cambiado.
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()
+
+
+class Validators:
+    """
+    Validadores de una URL (ETag, Last-Modified) y el HTML al que corresponden
+    """
+
+    __slots__ = ("etag", "last_modified", "content")
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], content: bytes):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content = content
+
+    def headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ValidatorStore:
+    """
+    Validadores por URL, en un LRU con presupuesto en bytes (el HTML guardado
+    es lo que se devuelve cuando el origen responde 304)
+    """
+
+    def __init__(self, max_bytes: int, enabled: bool = True):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, Validators]" = OrderedDict()
+        self.not_modified = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[Validators]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+        return entry
+
+    def store(self, url: str, etag: Optional[str], last_modified: Optional[str], content: bytes) -> None:
+        """
+        Guarda los validadores de una respuesta 200; sin ETag ni
+        Last-Modified no hay nada que revalidar
+        """
+        if not self.enabled:
+            return
+        self.delete(url)
+        if not etag and not last_modified:
+            return
+        size = sys.getsizeof(content)
+        if size > self.max_bytes:
+            return
+        self._entries[url] = Validators(etag, last_modified, content)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= sys.getsizeof(evicted.content)
+
+    def delete(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self.current_bytes -= sys.getsizeof(entry.content)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+
+class ParsedResults:
+    """
+    Resultados de parseo por (función, argumentos, hash del HTML). Un HTML
+    idéntico (304 o misma respuesta sin validadores) no se vuelve a parsear.
+    Los resultados se comparten entre llamadas: no deben modificarse.
+    """
+
+    def __init__(self, max_entries: int, enabled: bool = True):
+        self.enabled = enabled and max_entries > 0
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(parse_fn: Callable[..., Any], content: bytes, args: Tuple) -> Hashable:
+        return (parse_fn.__module__, parse_fn.__qualname__, repr(args), content_hash(content))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return result
+
+    def set(self, key: Hashable, result: Any) -> None:
+        # Los resultados vacíos suelen ser errores: no se memorizan
+        if not self.enabled or not result:
+            return
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+validators = ValidatorStore(REVALIDATE_MEMORY_BYTES, enabled=REVALIDATE_ENABLED)
+parsed_results = ParsedResults(PARSED_MEMO_ENTRIES, enabled=REVALIDATE_ENABLED)
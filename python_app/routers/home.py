@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from schemas import HomeContent
-from scrapers.home_scraper import scrape_home
+from responses import json_response
+import services
 
 router = APIRouter(prefix="/api", tags=["home"])
 
@@ -10,7 +11,7 @@ async def get_home():
     """
     Obtiene el contenido de la página principal
     """
-    content = await scrape_home()
+    content, cache_status = await services.get_home()
     if not content:
         raise HTTPException(status_code=500, detail="Error al obtener contenido de la home")
-    return content
+    return json_response(content, HomeContent, headers={"X-Cache": cache_status})
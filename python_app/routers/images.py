@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
+from typing import Optional
+from images import image_proxy, image_rewrite, is_proxyable, snap_width
+from config import IMAGE_PROXY_ENABLED, IMAGE_PROXY_REWRITE, IMAGE_PROXY_BASE_URL, IMAGE_MAX_AGE
+
+router = APIRouter(prefix="/api", tags=["images"])
+
+
+async def image_option(
+    request: Request,
+    img: Optional[str] = Query(
+        None,
+        pattern=r"^(origin|proxy|\d+)$",
+        description="Imágenes de la respuesta: origin (URL del origen), proxy (a través de /api/img) o un ancho en píxeles",
+    ),
+) -> None:
+    """
+    Opción común de los endpoints JSON: reescribir los campos image para que
+    pasen por /api/img (por defecto según IMAGE_PROXY_REWRITE)
+    """
+    mode = img or ("proxy" if IMAGE_PROXY_REWRITE else "origin")
+    if mode == "origin" or not IMAGE_PROXY_ENABLED:
+        return
+    base = IMAGE_PROXY_BASE_URL or str(request.base_url).rstrip("/")
+    width = snap_width(int(mode)) if mode.isdigit() else None
+    image_rewrite.set(f"{base}/api/img?" + (f"w={width}&" if width else "") + "url=")
+
+
+@router.get("/img")
+async def get_image(
+    url: str = Query(..., description="URL de la imagen en el origen"),
+    w: Optional[int] = Query(None, ge=1, le=4096, description="Ancho máximo (se redondea al siguiente de IMAGE_WIDTHS)"),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Imagen del origen a través de la caché local en disco
+
+    Con `w` se sirve una miniatura recomprimida (WebP si el cliente lo
+    acepta, si no JPEG); requiere Pillow, sin él se sirve la original. Las
+    respuestas llevan un ETag fuerte (hash del contenido) y Cache-Control de
+    larga duración.
+    """
+    if not IMAGE_PROXY_ENABLED:
+        raise HTTPException(status_code=404, detail="Proxy de imágenes desactivado")
+    if not is_proxyable(url):
+        raise HTTPException(status_code=400, detail="URL de imagen no permitida")
+
+    width = snap_width(w)
+    image, cache_status = await image_proxy.get(url, width, "image/webp" in (accept or ""))
+    if image is None:
+        raise HTTPException(status_code=502, detail="No se pudo obtener la imagen del origen")
+
+    etag = f'"{image.etag}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={IMAGE_MAX_AGE}",
+        "X-Cache": cache_status,
+    }
+    if width is not None:
+        # El formato de la miniatura depende de Accept
+        headers["Vary"] = "Accept"
+    if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(image.path, headers=headers)
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Query
 from schemas import SearchResult
-from scrapers.search_scraper import scrape_search
+from responses import json_response
+import services
 
 router = APIRouter(prefix="/api/search", tags=["search"])
 
@@ -10,5 +11,5 @@ async def search(q: str = Query(..., min_length=1, description="Término de bús
     """
     Busca series y películas por título
     """
-    results = await scrape_search(q)
-    return results
+    results, cache_status = await services.search(q)
+    return json_response(results, SearchResult, headers={"X-Cache": cache_status})
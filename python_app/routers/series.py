@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
-from schemas import SeriesBase, SeriesDetail, Server
-from scrapers.series_scraper import scrape_series_list, scrape_series_detail, scrape_episode_servers
+from fastapi import APIRouter, HTTPException, Path, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Type, Union, get_args, get_origin
+from schemas import SeriesBase, SeriesDetail, Season, SeasonInfo, Server, EpisodeServers, EpisodeServersRequest
+from prewarm import record_series_view
+from responses import JSONBytesResponse, json_response
+from images import image_rewrite, rewrite_stream
+from config import SERVERS_BATCH_MAX
+import services
 
 router = APIRouter(prefix="/api/series", tags=["series"])
 
@@ -11,19 +17,215 @@ async def get_series(page: int = Query(1, ge=1, description="Número de página"
     """
     Obtiene el listado de series con paginación
     """
-    series_list = await scrape_series_list(page)
-    return series_list
+    series_list, cache_status = await services.get_series_list(page)
+    return json_response(series_list, List[SeriesBase], headers={"X-Cache": cache_status})
+
+
+def _parse_include_servers(value: Optional[str]) -> Optional[Set[int]]:
+    """
+    "season:1" o "season:1,2" -> {1, 2}; "all" -> set vacío (todas)
+    """
+    if value is None:
+        return None
+    if value == "all":
+        return set()
+    prefix, _, numbers = value.partition(":")
+    try:
+        if prefix != "season" or not numbers:
+            raise ValueError
+        return {int(number) for number in numbers.split(",")}
+    except ValueError:
+        raise HTTPException(
+            status_code=422, detail="include_servers debe ser 'season:N', 'season:N,M' o 'all'"
+        ) from None
+
+
+def _field_tree(model: Type[BaseModel], path: List[str]) -> Union[bool, Dict[str, Any]]:
+    """
+    Convierte una ruta de campos ("seasons.episodes.url") en el `include`
+    anidado de model_dump; las listas de modelos usan "__all__"
+    """
+    name = path[0]
+    field = model.model_fields.get(name)
+    if field is None:
+        raise HTTPException(status_code=422, detail=f"Campo desconocido en fields: '{name}'")
+    if len(path) == 1:
+        return {name: True}
+
+    annotation = field.annotation
+    is_list = get_origin(annotation) in (list, List)
+    inner = get_args(annotation)[0] if is_list else annotation
+    if not (isinstance(inner, type) and issubclass(inner, BaseModel)):
+        raise HTTPException(status_code=422, detail=f"El campo '{name}' no tiene subcampos")
+    subtree = _field_tree(inner, path[1:])
+    return {name: {"__all__": subtree} if is_list else subtree}
+
+
+def _merge(tree: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in other.items():
+        current = tree.get(key)
+        if current is True or value is True:
+            tree[key] = True
+        elif isinstance(current, dict):
+            _merge(current, value)
+        else:
+            tree[key] = value
+    return tree
+
+
+def _parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    if value is None:
+        return None
+    paths = [path.strip() for path in value.split(",") if path.strip()]
+    if not paths:
+        raise HTTPException(status_code=422, detail="fields no puede estar vacío")
+    return paths
+
+
+def _wants(paths: Optional[List[str]], field: str) -> bool:
+    """
+    Si la proyección incluye `field` (o alguno de sus subcampos)
+    """
+    if paths is None:
+        return True
+    return any(field == path or field.startswith(path + ".") or path.startswith(field + ".") for path in paths)
 
 
 @router.get("/{series_id}", response_model=SeriesDetail)
-async def get_series_detail(series_id: str):
+async def get_series_detail(
+    series_id: str,
+    include_servers: Optional[str] = Query(
+        None, description="Resolver los servidores de 'season:N', 'season:N,M' o 'all'"
+    ),
+    fields: Optional[str] = Query(
+        None, description="Campos a devolver separados por comas, p. ej. 'id,title,seasons.episodes.url'"
+    ),
+):
     """
     Obtiene el detalle de una serie incluyendo todas sus temporadas y episodios
+
+    - include_servers: rellena `servers` de los episodios de esas temporadas
+      (como mucho SERVERS_BATCH_MAX episodios)
+    - fields: devuelve solo esos campos (rutas con puntos para campos anidados);
+      si no se pide `seasons` no se descargan las temporadas
+    """
+    seasons_numbers = _parse_include_servers(include_servers)
+    paths = _parse_fields(fields)
+    include = None
+    if paths is not None:
+        include = {}
+        for path in paths:
+            _merge(include, _field_tree(SeriesDetail, path.split(".")))
+
+    if _wants(paths, "seasons"):
+        series, cache_status = await services.get_series_detail(series_id)
+    else:
+        series, cache_status = await services.get_series_info(series_id)
+    if not series:
+        raise HTTPException(status_code=404, detail=f"Serie '{series_id}' no encontrada")
+    record_series_view(series_id)
+
+    if seasons_numbers is not None and _wants(paths, "seasons.episodes.servers"):
+        # Copia: el modelo cacheado no debe quedarse con los servidores
+        series = series.model_copy(deep=True)
+        episodes = [
+            episode
+            for season in series.seasons
+            if not seasons_numbers or season.number in seasons_numbers
+            for episode in season.episodes
+        ]
+        # Mismo límite que el endpoint por lotes: cada episodio es una descarga
+        if len(episodes) > SERVERS_BATCH_MAX:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Máximo {SERVERS_BATCH_MAX} episodios por petición; elige menos temporadas en include_servers",
+            )
+        results = await services.get_episode_servers_batch([episode.url for episode in episodes])
+        servers_by_url = {result.episode_url: result.servers for result in results}
+        for episode in episodes:
+            episode.servers = servers_by_url.get(episode.url, [])
+
+    if include is not None:
+        return JSONBytesResponse(series.model_dump_json(include=include), headers={"X-Cache": cache_status})
+
+    return json_response(series, SeriesDetail, headers={"X-Cache": cache_status})
+
+
+async def _ndjson(series: SeriesDetail, seasons: AsyncIterator) -> AsyncIterator[str]:
+    yield '{"type":"series","data":' + series.model_dump_json(exclude={"seasons"}) + "}\n"
+    async for season in seasons:
+        yield '{"type":"season","data":' + season.model_dump_json() + "}\n"
+    yield '{"type":"end"}\n'
+
+
+async def _sse(series: SeriesDetail, seasons: AsyncIterator) -> AsyncIterator[str]:
+    yield f"event: series\ndata: {series.model_dump_json(exclude={'seasons'})}\n\n"
+    async for season in seasons:
+        yield f"event: season\ndata: {season.model_dump_json()}\n\n"
+    yield "event: end\ndata: {}\n\n"
+
+
+@router.get("/{series_id}/stream")
+async def stream_series_detail(
+    series_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="ndjson o sse"),
+):
     """
-    series = await scrape_series_detail(series_id)
+    Detalle de una serie en streaming: primero la ficha y después cada
+    temporada en cuanto se parsean sus episodios (en orden de llegada, cada
+    temporada lleva su número)
+
+    Formatos:
+    - ndjson: una línea JSON por evento {"type": "series" | "season" | "end", "data": ...}
+    - sse: server-sent events con los eventos series, season y end
+    """
+    series, seasons, cache_status = await services.stream_series_detail(series_id)
     if not series:
         raise HTTPException(status_code=404, detail=f"Serie '{series_id}' no encontrada")
-    return series
+    record_series_view(series_id)
+
+    if format == "sse":
+        body, media_type = _sse(series, seasons), "text/event-stream"
+    else:
+        body, media_type = _ndjson(series, seasons), "application/x-ndjson"
+    prefix = image_rewrite.get()
+    if prefix:
+        body = rewrite_stream(body, prefix)
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"X-Cache": cache_status, "Cache-Control": "no-cache"},
+    )
+
+
+@router.get("/{series_id}/seasons", response_model=List[SeasonInfo])
+async def get_series_seasons(series_id: str):
+    """
+    Índice de temporadas de una serie (número y URL), sin sus episodios
+
+    Solo descarga la página de la serie; los episodios de cada temporada se
+    obtienen con /api/series/{series_id}/seasons/{number}.
+    """
+    index, cache_status = await services.get_season_index(series_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"Serie '{series_id}' no encontrada")
+    record_series_view(series_id)
+    return json_response(index, List[SeasonInfo], headers={"X-Cache": cache_status})
+
+
+@router.get("/{series_id}/seasons/{number}", response_model=Season)
+async def get_series_season(series_id: str, number: int = Path(..., ge=0, description="Número de temporada")):
+    """
+    Episodios de una temporada de una serie
+
+    Descarga solo la página de esa temporada (y la de la serie si su índice
+    de temporadas no está en caché).
+    """
+    season, cache_status = await services.get_season(series_id, number)
+    if season is None:
+        raise HTTPException(status_code=404, detail=f"Temporada {number} de '{series_id}' no encontrada")
+    record_series_view(series_id)
+    return json_response(season, Season, headers={"X-Cache": cache_status})
 
 
 @router.get("/episode/servers", response_model=List[Server])
@@ -33,7 +235,42 @@ async def get_episode_servers(episode_url: str = Query(..., description="URL del
 
     Parámetro: episode_url - URL completa del episodio
     """
-    servers = await scrape_episode_servers(episode_url)
+    servers, cache_status = await services.get_episode_servers(episode_url)
     if not servers:
         raise HTTPException(status_code=404, detail="No se encontraron servidores para este episodio")
-    return servers
+    return json_response(servers, List[Server], headers={"X-Cache": cache_status})
+
+
+@router.post("/episode/servers/batch", response_model=List[EpisodeServers])
+async def get_episode_servers_batch(request: EpisodeServersRequest):
+    """
+    Obtiene los servidores de varios episodios en una sola petición
+
+    Cuerpo (una de las dos formas):
+    - {"episode_urls": [...]}: URLs completas de los episodios
+    - {"series_id": "...", "season": N}: todos los episodios de una temporada
+
+    Cada elemento de la respuesta incluye `error` si ese episodio falló.
+    """
+    episode_urls = list(request.episode_urls)
+
+    if request.series_id:
+        if request.season is None:
+            raise HTTPException(status_code=422, detail="Falta 'season' junto a 'series_id'")
+        # Solo la página de esa temporada, no todas las de la serie
+        season, _ = await services.get_season(request.series_id, request.season)
+        if season is None:
+            raise HTTPException(
+                status_code=404, detail=f"Temporada {request.season} de '{request.series_id}' no encontrada"
+            )
+        episode_urls.extend(episode.url for episode in season.episodes)
+
+    if not episode_urls:
+        raise HTTPException(status_code=422, detail="Indica 'episode_urls' o 'series_id' y 'season'")
+    if len(episode_urls) > SERVERS_BATCH_MAX:
+        raise HTTPException(
+            status_code=422, detail=f"Máximo {SERVERS_BATCH_MAX} episodios por petición"
+        )
+
+    results = await services.get_episode_servers_batch(episode_urls)
+    return json_response(results, List[EpisodeServers])
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+from schemas import Updates
+from responses import json_response
+from changes import change_feed
+from images import image_rewrite, rewrite_stream
+from config import CHANGES_PAGE_SIZE, CHANGES_MAX_WAIT, CHANGES_HEARTBEAT
+
+router = APIRouter(prefix="/api/updates", tags=["updates"])
+
+
+@router.get("", response_model=Updates)
+async def get_updates(
+    since: int = Query(0, ge=0, description="Cursor de la última respuesta (0 = desde el principio)"),
+    wait: float = Query(0, ge=0, le=CHANGES_MAX_WAIT, description="Segundos que se espera a que haya cambios"),
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=CHANGES_PAGE_SIZE, description="Máximo de cambios"),
+):
+    """
+    Episodios nuevos desde el cursor `since`
+
+    La respuesta trae el cursor para la siguiente petición. Si `reset` es
+    true se han perdido cambios y hay que volver a pedir la home o las series
+    completas. Con `wait` la petición espera a que haya algún cambio (long
+    polling).
+    """
+    if wait:
+        await change_feed.wait(since, wait)
+    return json_response(await change_feed.since(since, limit), Updates, headers={"Cache-Control": "no-cache"})
+
+
+async def _sse(cursor: int) -> AsyncIterator[str]:
+    while True:
+        updates = await change_feed.since(cursor, CHANGES_PAGE_SIZE)
+        if updates.reset:
+            yield f"id: {updates.cursor}\nevent: reset\ndata: {{}}\n\n"
+        for change in updates.changes:
+            yield f"id: {change.cursor}\nevent: change\ndata: {change.model_dump_json()}\n\n"
+        cursor = updates.cursor
+        if updates.more:
+            continue
+
+        if not await change_feed.wait(cursor, CHANGES_HEARTBEAT):
+            # Comentario SSE: mantiene viva la conexión a través de proxies
+            yield ": ping\n\n"
+
+
+@router.get("/stream")
+async def stream_updates(
+    since: Optional[int] = Query(None, ge=0, description="Cursor desde el que enviar cambios (por defecto, solo los nuevos)"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Episodios nuevos en tiempo real (server-sent events)
+
+    Eventos:
+    - change: un cambio (mismo formato que en /api/updates); su id es el cursor
+    - reset: se han perdido cambios desde el cursor pedido
+
+    Al reconectar, el navegador envía Last-Event-ID y se continúa desde ahí.
+    """
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = await change_feed.latest()
+    body = _sse(since)
+    prefix = image_rewrite.get()
+    if prefix:
+        body = rewrite_stream(body, prefix)
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -21,6 +21,24 @@ class Season(BaseModel):
     episodes: List[Episode] = []
 
 
+class SeasonInfo(BaseModel):
+    number: int
+    # None en las miniseries, cuyos episodios están en la propia ficha
+    url: Optional[str] = None
+
+
+class EpisodeServersRequest(BaseModel):
+    episode_urls: List[str] = []
+    series_id: Optional[str] = None
+    season: Optional[int] = None
+
+
+class EpisodeServers(BaseModel):
+    episode_url: str
+    servers: List[Server] = []
+    error: Optional[str] = None
+
+
 class SeriesBase(BaseModel):
     id: str
     title: str
@@ -62,3 +80,25 @@ class HomeContent(BaseModel):
 
 class SearchResult(BaseModel):
     series: List[SeriesBase] = []
+
+
+class Change(BaseModel):
+    cursor: int
+    # "home_episode" (nuevo en recent_episodes de la home) o "episode" (nuevo
+    # en una temporada; lleva series_id y season)
+    type: str
+    at: float
+    series_id: Optional[str] = None
+    season: Optional[int] = None
+    episode: dict = {}
+
+
+class Updates(BaseModel):
+    # Cursor para la siguiente petición (since=)
+    cursor: int
+    # Se han perdido cambios desde `since` (demasiado antiguo o el servidor se
+    # ha reiniciado): hay que volver a pedir los datos completos
+    reset: bool = False
+    # Quedan más cambios: pedirlos con el nuevo cursor
+    more: bool = False
+    changes: List[Change] = []
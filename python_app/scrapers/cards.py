@@ -0,0 +1,66 @@
+class Card:
+    """
+    Elementos relevantes de una card .TPost, encontrados en un único recorrido
+    """
+
+    __slots__ = ("link", "serie_link", "title", "image", "first_image", "year", "info")
+
+    def __init__(self):
+        self.link = None          # primer <a>
+        self.serie_link = None    # primer a[href*='/serie/']
+        self.title = None         # primer .Title
+        self.image = None         # primer img dentro de .Image o <figure>
+        self.first_image = None   # primer <img>
+        self.year = None          # primer .Qlty
+        self.info = None          # primer .Info
+
+
+def _is_image_container(node) -> bool:
+    return node.name == "figure" or "Image" in node.classes
+
+
+def extract_card(item) -> Card:
+    """
+    Recorre una sola vez el subárbol de una card y localiza enlace, título,
+    imagen, año e info, en el mismo orden de documento que `select_one`.
+    Sustituye a las 4-6 llamadas a `select_one` (una travesía CSS cada una).
+    """
+    card = Card()
+
+    # ".Image img" y "figure img" también casan si el contenedor es un ancestro
+    inside_image = _is_image_container(item) or any(
+        _is_image_container(node) for node in item.parents()
+    )
+
+    # Recorrido en profundidad en orden de documento
+    stack = [(child, inside_image) for child in reversed(item.children())]
+    while stack:
+        node, inside = stack.pop()
+        name = node.name
+        classes = node.classes
+
+        if name == "a":
+            if card.link is None:
+                card.link = node
+            if card.serie_link is None and "/serie/" in (node.get("href") or ""):
+                card.serie_link = node
+        elif name == "img":
+            if card.first_image is None:
+                card.first_image = node
+            if inside and card.image is None:
+                card.image = node
+
+        if classes:
+            if card.title is None and "Title" in classes:
+                card.title = node
+            if card.year is None and "Qlty" in classes:
+                card.year = node
+            if card.info is None and "Info" in classes:
+                card.info = node
+
+        children = node.children()
+        if children:
+            inside_children = inside or name == "figure" or "Image" in classes
+            stack.extend((child, inside_children) for child in reversed(children))
+
+    return card
@@ -1,30 +1,131 @@
-from typing import Optional
+from typing import Callable, Dict, Iterable, Optional, Tuple
 from schemas import HomeContent, SeriesBase, MovieBase
-from utils import fetch_page, extract_id_from_url, clean_text, make_absolute_url
-from config import BASE_URL
+from utils import fetch_html, parse_in_pool, stream_parse, extract_id_from_url, clean_text, make_absolute_url
+from scrapers.cards import extract_card
+from metrics import record_parse_failure
+from config import BASE_URL, STREAM_PARSE
+
+# Elementos que se usan de cada sección de la home
+FEATURED_LIMIT = 10
+TRENDING_LIMIT = 20
+TOP10_LIMIT = 10
+EPISODES_LIMIT = 15
 
 
 async def scrape_home() -> Optional[HomeContent]:
     """
     Scrape de la página principal de SeriesFlix
     """
-    soup = await fetch_page(BASE_URL)
-    if not soup:
+    if STREAM_PARSE:
+        return await stream_parse(BASE_URL, HomeStreamLimits(), parse_home, HomeContent)
+
+    content = await fetch_html(BASE_URL)
+    if not content:
         return None
 
+    return await parse_in_pool(content, parse_home, HomeContent)
+
+
+# Condiciones sobre elementos lxml equivalentes a los selectores de parse_home
+
+def _classes(el) -> set:
+    return set((el.get("class") or "").split())
+
+
+def _is_featured(el) -> bool:
+    classes = _classes(el)
+    return "TPost" in classes and "A" in classes
+
+
+def _is_trending(el) -> bool:
+    classes = _classes(el)
+    return "TPost" in classes and ("B" in classes or "C" in classes)
+
+
+def _is_top10(el) -> bool:
+    classes = _classes(el)
+    if "TPost" in classes and "C" in classes:
+        return True
+    return "tns-item" in classes and any(
+        "hometop10" in _classes(parent) for parent in el.iterancestors()
+    )
+
+
+def _is_episode_link(el) -> bool:
+    return el.tag == "a" and "/episodio/" in (el.get("href") or "")
+
+
+def _episode_context(el) -> Iterable:
+    # parse_home toma el título y la imagen del <li> (o <article>) que lo contiene
+    for tag in ("li", "article"):
+        for parent in el.iterancestors(tag):
+            return [parent]
+    return []
+
+
+# sección -> (límite, condición, contenedores que deben estar completos)
+_SECTIONS: Dict[str, Tuple[int, Callable, Optional[Callable]]] = {
+    "featured": (FEATURED_LIMIT, _is_featured, None),
+    "trending": (TRENDING_LIMIT, _is_trending, None),
+    "top10": (TOP10_LIMIT, _is_top10, None),
+    "episodes": (EPISODES_LIMIT, _is_episode_link, _episode_context),
+}
+
+
+class HomeStreamLimits:
+    """
+    Condición de parada del parseo en streaming de la home.
+
+    Recibe los elementos según se cierran y se cumple cuando cada sección
+    tiene sus elementos completos. Además espera a que se cierren los
+    ancestros de esos elementos que también casan con la sección (el orden
+    del documento los pone antes) y los contenedores de los episodios, de
+    modo que parse_home sobre el árbol parcial devuelve lo mismo que sobre
+    la página completa.
+    """
+
+    def __init__(self):
+        self._counts = {section: 0 for section in _SECTIONS}
+        # Elementos abiertos que todavía tienen que cerrarse
+        self._pending = set()
+
+    def __call__(self, el) -> bool:
+        if not isinstance(el.tag, str):
+            return False
+        self._pending.discard(el)
+
+        done = True
+        for section, (limit, matches, context) in _SECTIONS.items():
+            if self._counts[section] < limit and matches(el):
+                self._counts[section] += 1
+                self._pending.update(parent for parent in el.iterancestors() if matches(parent))
+                if context is not None:
+                    self._pending.update(context(el))
+            if self._counts[section] < limit:
+                done = False
+
+        return done and not self._pending
+
+
+def parse_home(soup) -> HomeContent:
+    """
+    Extrae las secciones de la página principal
+    """
     home_content = HomeContent()
 
     # Featured content - cards destacadas (TPost.A)
     featured_section = soup.select(".TPost.A, article.TPost.A")
-    for item in featured_section[:10]:
+    for item in featured_section[:FEATURED_LIMIT]:
         try:
+            card = extract_card(item)
+
             # Buscar enlace y título
-            link = item.select_one("a")
-            title_elem = item.select_one(".Title, h2.Title")
-            img = item.select_one(".Image img, figure img")
+            link = card.link
+            title_elem = card.title
+            img = card.image
 
             # Extraer año de .Qlty o .Info
-            year_elem = item.select_one(".Qlty, .Info .Qlty")
+            year_elem = card.year
 
             if link and link.get("href"):
                 url = make_absolute_url(link.get("href"))
@@ -32,9 +133,8 @@ async def scrape_home() -> Optional[HomeContent]:
                 url = make_absolute_url(title_elem.find_parent("a").get("href", ""))
             else:
                 # Si no hay enlace directo, buscar en el item
-                all_links = item.select("a[href*='/serie/']")
-                if all_links:
-                    url = make_absolute_url(all_links[0].get("href"))
+                if card.serie_link:
+                    url = make_absolute_url(card.serie_link.get("href"))
                 else:
                     continue
 
@@ -46,27 +146,26 @@ async def scrape_home() -> Optional[HomeContent]:
                 year=clean_text(year_elem.get_text()) if year_elem else None,
             )
             home_content.featured.append(series)
-        except Exception as e:
-            print(f"Error parsing featured item: {e}")
+        except Exception:
+            record_parse_failure("home", "featured")
             continue
 
     # Series en tendencia - usar TPost.B y TPost.C
     series_section = soup.select(".TPost.B, .TPost.C, li .TPost.B")
-    for item in series_section[:20]:
+    for item in series_section[:TRENDING_LIMIT]:
         try:
+            card = extract_card(item)
+
             # Buscar enlace principal
-            link = item.select_one("a[href*='/serie/']")
+            link = card.serie_link
             if not link:
                 link = item.find_parent("a")
 
-            title_elem = item.select_one(".Title, a.Title, h3.Title span")
-            img = item.select_one(".Image img, figure img")
+            title_elem = card.title
+            img = card.image
 
             # Extraer año de .Qlty
-            year_elem = item.select_one(".Qlty")
-
-            # Buscar info adicional
-            info_elem = item.select_one(".Info")
+            year_elem = card.year
 
             if link and link.get("href"):
                 url = make_absolute_url(link.get("href"))
@@ -91,17 +190,18 @@ async def scrape_home() -> Optional[HomeContent]:
                 year=clean_text(year_elem.get_text()) if year_elem else None,
             )
             home_content.trending_series.append(series)
-        except Exception as e:
-            print(f"Error parsing series item: {e}")
+        except Exception:
+            record_parse_failure("home", "trending")
             continue
 
     # Top 10 - hometop10 con numeración
     top10_section = soup.select(".hometop10 .tns-item, .TPost.C")
-    for item in top10_section[:10]:
+    for item in top10_section[:TOP10_LIMIT]:
         try:
-            link = item.select_one("a[href*='/serie/']")
-            title_elem = item.select_one(".Title, h3.Title span")
-            img = item.select_one("img")
+            card = extract_card(item)
+            link = card.serie_link
+            title_elem = card.title
+            img = card.first_image
 
             if link and link.get("href"):
                 url = make_absolute_url(link.get("href"))
@@ -114,15 +214,15 @@ async def scrape_home() -> Optional[HomeContent]:
                 # Evitar duplicados
                 if not any(s.id == series.id for s in home_content.trending_series):
                     home_content.trending_series.append(series)
-        except Exception as e:
-            print(f"Error parsing top10 item: {e}")
+        except Exception:
+            record_parse_failure("home", "top10")
             continue
 
     # Episodios recientes - buscar enlaces a /episodio/
     episodes_section = soup.select("a[href*='/episodio/']")
     seen_episodes = set()
 
-    for link in episodes_section[:15]:
+    for link in episodes_section[:EPISODES_LIMIT]:
         try:
             url = make_absolute_url(link.get("href"))
 
@@ -150,8 +250,8 @@ async def scrape_home() -> Optional[HomeContent]:
                 "image": make_absolute_url(img.get("src") or img.get("data-src", "")) if img else None,
                 "episode": extract_id_from_url(url),  # El ID contiene info del episodio
             })
-        except Exception as e:
-            print(f"Error parsing episode item: {e}")
+        except Exception:
+            record_parse_failure("home", "recent_episodes")
             continue
 
     return home_content
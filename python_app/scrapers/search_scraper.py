@@ -1,11 +1,13 @@
-from typing import List
+from typing import List, Optional
 from schemas import SearchResult, SeriesBase, MovieBase
-from utils import fetch_page, extract_id_from_url, clean_text, make_absolute_url
+from utils import fetch_html, parse_in_pool, extract_id_from_url, clean_text, make_absolute_url
+from scrapers.cards import extract_card
+from metrics import record_parse_failure
 from config import BASE_URL
 import urllib.parse
 
 
-async def scrape_search(query: str) -> SearchResult:
+async def scrape_search(query: str) -> Optional[SearchResult]:
     """
     Scrape de los resultados de búsqueda usando ?s= parameter
     Solo busca SERIES (SeriesFlix.boats no tiene películas)
@@ -15,11 +17,19 @@ async def scrape_search(query: str) -> SearchResult:
     # La búsqueda usa el parámetro ?s= estándar de WordPress
     search_url = f"{BASE_URL}/?s={encoded_query}"
 
-    soup = await fetch_page(search_url)
+    content = await fetch_html(search_url)
 
-    if not soup:
-        return SearchResult()
+    if not content:
+        # None (no un resultado vacío) para que el fallo no se cachee
+        return None
 
+    return await parse_in_pool(content, parse_search, SearchResult)
+
+
+def parse_search(soup) -> SearchResult:
+    """
+    Extrae las series de una página de resultados de búsqueda
+    """
     search_result = SearchResult()
 
     # Buscar items con las clases .TPost (A, B, o C)
@@ -27,10 +37,10 @@ async def scrape_search(query: str) -> SearchResult:
 
     for item in items:
         try:
+            card = extract_card(item)
+
             # Buscar enlace a serie
-            link = item.select_one("a[href*='/serie/']")
-            if not link:
-                link = item.select_one("a")
+            link = card.serie_link or card.link
 
             if not link or not link.get("href"):
                 continue
@@ -42,13 +52,13 @@ async def scrape_search(query: str) -> SearchResult:
                 continue
 
             # Título
-            title_elem = item.select_one(".Title, a.Title, h3.Title span")
+            title_elem = card.title
 
             # Imagen
-            img = item.select_one(".Image img, figure img")
+            img = card.image
 
             # Año desde .Qlty
-            year_elem = item.select_one(".Qlty")
+            year_elem = card.year
             year = clean_text(year_elem.get_text()) if year_elem else None
 
             title = clean_text(title_elem.get_text()) if title_elem else clean_text(link.get_text())
@@ -64,8 +74,8 @@ async def scrape_search(query: str) -> SearchResult:
             )
             search_result.series.append(series)
 
-        except Exception as e:
-            print(f"Error parsing search result: {e}")
+        except Exception:
+            record_parse_failure("search", "result")
             continue
 
     return search_result
@@ -1,43 +1,59 @@
-from typing import Optional, List
+from typing import AsyncIterator, Callable, Dict, Optional, List, Tuple
 from schemas import SeriesBase, SeriesDetail, Season, Episode, Server
-from utils import fetch_page, extract_id_from_url, clean_text, make_absolute_url
-from config import BASE_URL
+from utils import fetch_html, parse_in_pool, extract_id_from_url, clean_text, make_absolute_url
+from scrapers.cards import extract_card
+from metrics import record_parse_failure
+from config import BASE_URL, SEASON_CONCURRENCY, CACHE_TTL_SEASON
+from cache import response_cache
+import asyncio
 import re
 
 
+def series_list_url(page: int = 1) -> str:
+    """
+    URL de una página del listado /series-online/
+    """
+    return f"{BASE_URL}/series-online/" if page == 1 else f"{BASE_URL}/series-online/page/{page}/"
+
+
 async def scrape_series_list(page: int = 1) -> List[SeriesBase]:
     """
     Scrape del listado de series desde /series-online/
     """
-    url = f"{BASE_URL}/series-online/" if page == 1 else f"{BASE_URL}/series-online/page/{page}/"
-    soup = await fetch_page(url)
+    content = await fetch_html(series_list_url(page))
 
-    if not soup:
+    if not content:
         return []
 
+    return await parse_in_pool(content, parse_series_list, List[SeriesBase])
+
+
+def parse_series_list(soup) -> List[SeriesBase]:
+    """
+    Extrae las series de una página del listado
+    """
     series_list = []
     # Buscar todas las cards .TPost.B dentro de la lista
     items = soup.select(".TPost.B, article.TPost.B")
 
     for item in items:
         try:
-            # Buscar enlace a la serie
-            link = item.select_one("a[href*='/serie/']")
-            if not link:
-                # Buscar cualquier enlace dentro del item
-                link = item.select_one("a")
+            card = extract_card(item)
+
+            # Buscar enlace a la serie (o cualquier enlace dentro del item)
+            link = card.serie_link or card.link
 
             # Título
-            title_elem = item.select_one(".Title, a.Title")
+            title_elem = card.title
 
             # Imagen
-            img = item.select_one(".Image img, figure img")
+            img = card.image
 
             # Año (en .Qlty generalmente)
-            year_elem = item.select_one(".Qlty")
+            year_elem = card.year
 
             # Info adicional (puede contener duración, año, etc)
-            info_elem = item.select_one(".Info")
+            info_elem = card.info
 
             if link and link.get("href"):
                 url = make_absolute_url(link.get("href"))
@@ -61,8 +77,8 @@ async def scrape_series_list(page: int = 1) -> List[SeriesBase]:
                     rating=None,  # No visible en listado
                 )
                 series_list.append(series)
-        except Exception as e:
-            print(f"Error parsing series: {e}")
+        except Exception:
+            record_parse_failure("series_list", "series")
             continue
 
     return series_list
@@ -72,18 +88,61 @@ async def scrape_series_detail(series_id: str) -> Optional[SeriesDetail]:
     """
     Scrape del detalle de una serie incluyendo temporadas y episodios
     """
+    series_detail, season_urls = await scrape_series_header(series_id)
+    if not series_detail:
+        return None
+
+    # Temporadas - enlaces a /temporada/
+    if season_urls:
+        # Copia: el resultado del parseo puede estar compartido (revalidation.py)
+        series_detail = series_detail.model_copy(update={"seasons": await scrape_seasons(season_urls)})
+
+    return series_detail
+
+
+async def scrape_series_header(series_id: str) -> Tuple[Optional[SeriesDetail], Dict[int, List[str]]]:
+    """
+    Scrape de la página de una serie: ficha (con las temporadas de las
+    miniseries, que enlazan los episodios directamente) y URLs de temporada
+    (todas las enlazadas para cada número, en orden)
+    """
     # La URL correcta es /serie/{series_id}/
     series_url = f"{BASE_URL}/serie/{series_id}/"
-    soup = await fetch_page(series_url)
+    content = await fetch_html(series_url)
 
-    if not soup:
+    if not content:
         # Intentar sin trailing slash
         series_url = f"{BASE_URL}/serie/{series_id}"
-        soup = await fetch_page(series_url)
+        content = await fetch_html(series_url)
+
+    if not content:
+        return None, {}
+
+    return await parse_in_pool(
+        content,
+        parse_series_page,
+        Tuple[Optional[SeriesDetail], Dict[int, List[str]]],
+        series_id,
+        series_url,
+    )
 
-    if not soup:
-        return None
 
+def parse_series_page(soup, series_id: str, series_url: str) -> Tuple[Optional[SeriesDetail], Dict[int, List[str]]]:
+    """
+    Ficha de una serie y URLs de sus temporadas. Si no hay enlaces a
+    temporadas (miniserie) los episodios se extraen de la propia ficha.
+    """
+    series_detail = parse_series_info(soup, series_id, series_url)
+    season_urls = parse_season_links(soup)
+    if series_detail and not season_urls:
+        series_detail.seasons = parse_episode_links(soup)
+    return series_detail, season_urls
+
+
+def parse_series_info(soup, series_id: str, series_url: str) -> Optional[SeriesDetail]:
+    """
+    Extrae la información de la ficha de una serie (sin temporadas)
+    """
     try:
         # Información básica - buscar en el header de la serie
         title_elem = soup.select_one("h1.Title, .Title, h1")
@@ -117,19 +176,14 @@ async def scrape_series_detail(series_id: str) -> Optional[SeriesDetail]:
         # Cast - buscar en metadata si existe
         cast = []
         # Patrón común: buscar en textos que contengan "Actores:" o similar
-        cast_section = soup.find(string=re.compile(r'Actores?:', re.I))
-        if cast_section:
-            # Buscar elementos hermanos
-            parent = cast_section.find_parent()
-            if parent:
-                cast_links = parent.find_all("a")
-                for actor in cast_links[:10]:
-                    actor_name = clean_text(actor.get_text())
-                    if actor_name:
-                        cast.append(actor_name)
-
-        # Temporadas - buscar enlaces a /temporada/
-        seasons = await scrape_seasons_from_links(soup, series_id)
+        # (elemento que contiene el texto, para buscar los enlaces hermanos)
+        parent = soup.find_text(re.compile(r'Actores?:', re.I))
+        if parent:
+            cast_links = parent.select("a")
+            for actor in cast_links[:10]:
+                actor_name = clean_text(actor.get_text())
+                if actor_name:
+                    cast.append(actor_name)
 
         series_detail = SeriesDetail(
             id=series_id,
@@ -141,64 +195,144 @@ async def scrape_series_detail(series_id: str) -> Optional[SeriesDetail]:
             rating=None,  # No siempre disponible
             genres=genres,
             cast=cast,
-            seasons=seasons,
         )
 
         return series_detail
 
-    except Exception as e:
-        print(f"Error parsing series detail: {e}")
+    except Exception:
+        record_parse_failure("series_page", "detail")
         return None
 
 
-async def scrape_seasons_from_links(soup, series_id: str) -> List[Season]:
+async def load_season_episodes(
+    season_url: str,
+    refresh: bool = False,
+    on_load: Optional[Callable[[List[Episode]], None]] = None,
+) -> Tuple[List[Episode], str]:
+    """
+    Episodios de una temporada (cacheados por URL durante CACHE_TTL_SEASON)
+    y su estado de caché. `on_load` recibe los episodios solo cuando se
+    descargan del origen (no en los aciertos de caché).
+    """
+    async def load() -> List[Episode]:
+        episodes = await scrape_season_episodes(season_url)
+        if episodes and on_load is not None:
+            on_load(episodes)
+        return episodes
+
+    return await response_cache.get_or_load(
+        f"season:{season_url}",
+        CACHE_TTL_SEASON,
+        load,
+        List[Episode],
+        refresh=refresh,
+    )
+
+
+async def fetch_season(season_num: int, season_urls: List[str]) -> Optional[Season]:
+    """
+    Temporada con sus episodios; None si no se pudo obtener. Si la página
+    enlaza la temporada varias veces y una URL no da episodios se prueba la
+    siguiente.
+    """
+    for season_url in season_urls:
+        try:
+            episodes, _ = await load_season_episodes(season_url)
+        except Exception:
+            record_parse_failure("season_episodes", "season")
+            continue
+        if episodes:
+            return Season(number=season_num, episodes=episodes)
+    return None
+
+
+async def iter_seasons(season_urls: Dict[int, List[str]]) -> AsyncIterator[Season]:
+    """
+    Obtiene las temporadas en paralelo y las devuelve según se terminan de
+    parsear (no en orden de número)
+    """
+    semaphore = asyncio.Semaphore(SEASON_CONCURRENCY)
+
+    async def fetch_limited(season_num: int, urls: List[str]) -> Optional[Season]:
+        async with semaphore:
+            return await fetch_season(season_num, urls)
+
+    tasks = [asyncio.ensure_future(fetch_limited(num, urls)) for num, urls in season_urls.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            season = await next_done
+            if season:
+                yield season
+    finally:
+        # El consumidor puede abandonar a mitad (cliente desconectado)
+        for task in tasks:
+            task.cancel()
+
+
+async def scrape_seasons(season_urls: Dict[int, List[str]]) -> List[Season]:
     """
-    Extrae las temporadas desde los enlaces /temporada/{series-id-N}/
+    Obtiene las temporadas a partir de sus URLs /temporada/{series-id-N}/
+    """
+    # Obtener los episodios de todas las temporadas en paralelo
+    seasons = [season async for season in iter_seasons(season_urls)]
+
+    # Convertir a lista ordenada
+    seasons.sort(key=lambda x: x.number)
+
+    return seasons
+
+
+def parse_episode_links(soup) -> List[Season]:
+    """
+    Miniseries sin temporadas: construye una única temporada con los
+    enlaces /episodio/ de la propia ficha
     """
     seasons = []
 
+    episode_links = soup.select("a[href*='/episodio/']")
+    if episode_links:
+        episodes = []
+        for ep_link in episode_links:
+            try:
+                ep_url = make_absolute_url(ep_link.get("href"))
+                ep_id = extract_id_from_url(ep_url)
+
+                # Extraer temporada y episodio del formato: serie-slug-SxE
+                match = re.search(r'-(\d+)x(\d+)', ep_id)
+                if match:
+                    season_num = int(match.group(1))
+                    ep_num = int(match.group(2))
+                else:
+                    ep_num = len(episodes) + 1
+                    season_num = 1
+
+                episode = Episode(
+                    number=ep_num,
+                    title=clean_text(ep_link.get_text()) or f"Episodio {ep_num}",
+                    url=ep_url,
+                    image=None,
+                    servers=[]
+                )
+                episodes.append(episode)
+            except Exception:
+                record_parse_failure("series_page", "episode_link")
+                continue
+
+        if episodes:
+            seasons.append(Season(number=1, episodes=episodes))
+
+    return seasons
+
+
+def parse_season_links(soup) -> Dict[int, List[str]]:
+    """
+    Extrae las URLs de temporada por número desde los enlaces /temporada/
+    """
     # Buscar todos los enlaces a temporadas
     season_links = soup.select("a[href*='/temporada/']")
 
-    if not season_links:
-        # Si no hay enlaces a temporadas, puede ser una miniserie
-        # Buscar episodios directamente
-        episode_links = soup.select("a[href*='/episodio/']")
-        if episode_links:
-            episodes = []
-            for ep_link in episode_links:
-                try:
-                    ep_url = make_absolute_url(ep_link.get("href"))
-                    ep_id = extract_id_from_url(ep_url)
-
-                    # Extraer temporada y episodio del formato: serie-slug-SxE
-                    match = re.search(r'-(\d+)x(\d+)', ep_id)
-                    if match:
-                        season_num = int(match.group(1))
-                        ep_num = int(match.group(2))
-                    else:
-                        ep_num = len(episodes) + 1
-                        season_num = 1
-
-                    episode = Episode(
-                        number=ep_num,
-                        title=clean_text(ep_link.get_text()) or f"Episodio {ep_num}",
-                        url=ep_url,
-                        image=None,
-                        servers=[]
-                    )
-                    episodes.append(episode)
-                except Exception as e:
-                    print(f"Error parsing episode link: {e}")
-                    continue
-
-            if episodes:
-                seasons.append(Season(number=1, episodes=episodes))
-
-        return seasons
-
-    # Procesar enlaces a temporadas
-    season_dict = {}
+    # Todas las URLs de cada número de temporada, en orden de aparición
+    season_urls = {}
 
     for link in season_links:
         try:
@@ -212,34 +346,33 @@ async def scrape_seasons_from_links(soup, series_id: str) -> List[Season]:
             else:
                 continue
 
-            # Evitar duplicados
-            if season_num in season_dict:
-                continue
-
-            # Obtener episodios de esta temporada
-            episodes = await scrape_season_episodes(season_url)
+            # Si la primera no tiene episodios se prueban las siguientes
+            urls = season_urls.setdefault(season_num, [])
+            if season_url not in urls:
+                urls.append(season_url)
 
-            if episodes:
-                season_dict[season_num] = Season(number=season_num, episodes=episodes)
-
-        except Exception as e:
-            print(f"Error parsing season link: {e}")
+        except Exception:
+            record_parse_failure("series_page", "season_link")
             continue
 
-    # Convertir dict a lista ordenada
-    seasons = [season_dict[num] for num in sorted(season_dict.keys())]
-
-    return seasons
+    return season_urls
 
 
 async def scrape_season_episodes(season_url: str) -> List[Episode]:
     """
     Extrae los episodios de una temporada específica
     """
-    soup = await fetch_page(season_url)
-    if not soup:
+    content = await fetch_html(season_url)
+    if not content:
         return []
 
+    return await parse_in_pool(content, parse_season_episodes, List[Episode])
+
+
+def parse_season_episodes(soup) -> List[Episode]:
+    """
+    Extrae los episodios de la página de una temporada
+    """
     episodes = []
 
     # Buscar enlaces a episodios
@@ -284,8 +417,8 @@ async def scrape_season_episodes(season_url: str) -> List[Episode]:
             if not any(e.number == ep_num for e in episodes):
                 episodes.append(episode)
 
-        except Exception as e:
-            print(f"Error parsing episode: {e}")
+        except Exception:
+            record_parse_failure("season_episodes", "episode")
             continue
 
     # Ordenar por número de episodio
@@ -298,10 +431,17 @@ async def scrape_episode_servers(episode_url: str) -> List[Server]:
     """
     Extrae los servidores de streaming de un episodio
     """
-    soup = await fetch_page(episode_url)
-    if not soup:
+    content = await fetch_html(episode_url)
+    if not content:
         return []
 
+    return await parse_in_pool(content, parse_episode_servers, List[Server])
+
+
+def parse_episode_servers(soup) -> List[Server]:
+    """
+    Extrae los servidores de la página de un episodio
+    """
     servers = []
 
     # Selectores comunes para servidores
@@ -336,8 +476,8 @@ async def scrape_episode_servers(episode_url: str) -> List[Server]:
                     quality=quality
                 )
                 servers.append(server)
-        except Exception as e:
-            print(f"Error parsing server: {e}")
+        except Exception:
+            record_parse_failure("episode_servers", "server")
             continue
 
     return servers
@@ -0,0 +1,169 @@
+import bisect
+import heapq
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from schemas import SeriesBase, SeriesDetail
+from compact import CompactBaseStore
+
+# Palabras vacías en español que no aportan a la búsqueda
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los",
+    "o", "para", "por", "un", "una", "unos", "unas", "y",
+}
+
+# Peso de cada campo al puntuar
+TITLE_WEIGHT = 3.0
+GENRE_WEIGHT = 1.0
+CAST_WEIGHT = 1.0
+# Factor aplicado cuando el término solo coincide como prefijo
+PREFIX_FACTOR = 0.6
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """
+    Minúsculas y sin acentos ("Acción" -> "accion", "Ñu" -> "nu")
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Tokens normalizados de un texto, sin palabras vacías
+    """
+    if not text:
+        return []
+    return [token for token in _TOKEN_RE.findall(normalize(text)) if token not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    Índice invertido en memoria sobre títulos, géneros y reparto de las series.
+
+    Se alimenta con los SeriesBase/SeriesDetail que se van scrapeando (y con el
+    catálogo local al arrancar) y admite búsqueda por prefijo para autocompletar.
+    """
+
+    def __init__(self):
+        # Datos de listado de cada serie, en forma compacta
+        self._docs = CompactBaseStore()
+        # Título normalizado de cada serie, para desempatar sin recalcularlo
+        self._titles: Dict[str, str] = {}
+        # Campos indexados de cada serie, para no reindexar si no cambian
+        self._fields: Dict[str, Tuple] = {}
+        # término -> {id_serie: peso}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Set[str]] = {}
+        # Vocabulario ordenado para las búsquedas por prefijo (se reconstruye bajo demanda)
+        self._terms: List[str] = []
+        self._terms_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, series: SeriesBase) -> None:
+        """
+        Indexa (o reindexa) una serie
+        """
+        genres = tuple(series.genres) if isinstance(series, SeriesDetail) else None
+        cast = tuple(series.cast) if isinstance(series, SeriesDetail) else None
+
+        previous = self._fields.get(series.id)
+        if previous is not None:
+            # Un SeriesBase de un listado no debe borrar géneros y reparto ya indexados
+            if genres is None:
+                genres, cast = previous[1], previous[2]
+            if previous == (series.title, genres, cast):
+                return
+            self.remove(series.id)
+
+        weights: Dict[str, float] = {}
+        for field, weight in (
+            ([series.title], TITLE_WEIGHT),
+            (genres or (), GENRE_WEIGHT),
+            (cast or (), CAST_WEIGHT),
+        ):
+            for text in field:
+                for token in tokenize(text):
+                    weights[token] = max(weights.get(token, 0.0), weight)
+
+        for token, weight in weights.items():
+            postings = self._postings.setdefault(token, {})
+            if not postings:
+                self._terms_dirty = True
+            postings[series.id] = weight
+
+        self._docs.set(series)
+        self._titles[series.id] = normalize(series.title)
+        self._fields[series.id] = (series.title, genres, cast)
+        self._doc_terms[series.id] = set(weights)
+
+    def add_many(self, series_list: Iterable[SeriesBase]) -> None:
+        for series in series_list:
+            self.add(series)
+
+    def remove(self, series_id: str) -> None:
+        for token in self._doc_terms.pop(series_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(series_id, None)
+                if not postings:
+                    del self._postings[token]
+                    self._terms_dirty = True
+        self._docs.pop(series_id)
+        self._titles.pop(series_id, None)
+        self._fields.pop(series_id, None)
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + "\uffff")
+        return self._terms[start:end]
+
+    def search(self, query: str, limit: int = 50) -> List[SeriesBase]:
+        """
+        Series que contienen todos los términos de la búsqueda (como palabra
+        completa o como prefijo, para autocompletar), ordenadas por relevancia
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        scores: Optional[Dict[str, float]] = None
+        for token in tokens:
+            token_scores: Dict[str, float] = {}
+            for term in self._prefix_terms(token):
+                factor = 1.0 if term == token else PREFIX_FACTOR
+                for series_id, weight in self._postings[term].items():
+                    score = weight * factor
+                    if score > token_scores.get(series_id, 0.0):
+                        token_scores[series_id] = score
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    series_id: score + token_scores[series_id]
+                    for series_id, score in scores.items()
+                    if series_id in token_scores
+                }
+            if not scores:
+                return []
+
+        normalized_query = normalize(query.strip())
+
+        def rank(series_id: str) -> Tuple[float, int, int]:
+            title = self._titles[series_id]
+            # Desempate: títulos que empiezan por la búsqueda y títulos más cortos
+            return (-scores[series_id], 0 if title.startswith(normalized_query) else 1, len(title))
+
+        ranked = heapq.nsmallest(limit, scores, key=rank)
+        return [self._docs.get(series_id) for series_id in ranked]
+
+
+search_index = SearchIndex()
@@ -0,0 +1,70 @@
+"""
+Servidor de producción: WORKERS procesos con uvloop y httptools
+
+Uso (desde python_app/):
+    WORKERS=4 python serve.py
+
+WORKERS=0 arranca un worker por CPU. Con varios workers la caché en disco
+(CACHE_DISK_PATH) se activa por defecto y la comparten todos: una clave la
+descarga un solo worker y el resto la lee de disco. Los límites de peticiones
+al origen se reparten entre los workers. Al recibir SIGTERM/SIGINT se dejan
+de aceptar conexiones y se esperan las peticiones en curso hasta
+GRACEFUL_TIMEOUT segundos.
+
+Las métricas de /metrics se suman entre workers (modo multiproceso de
+prometheus_client) en PROMETHEUS_MULTIPROC_DIR, o en un directorio
+temporal si no se indica.
+
+Para desarrollo (un proceso con recarga automática) sigue usándose main.py.
+"""
+import importlib.util
+import os
+import tempfile
+import uvicorn
+from config import HOST, PORT, WORKERS, GRACEFUL_TIMEOUT, CACHE_DISK_PATH
+
+
+def _available(module: str, fallback: str) -> str:
+    """
+    Implementación de uvicorn a usar: `module` si está instalado
+    """
+    if importlib.util.find_spec(module) is not None:
+        return module
+    print(f"{module} no está instalado; usando {fallback}")
+    return fallback
+
+
+def _metrics_dir() -> str:
+    """
+    Directorio donde los workers escriben sus métricas; se vacía al arrancar
+    (los ficheros de una ejecución anterior sumarían contadores viejos)
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="seriesflix-metrics-")
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".db"):
+            os.remove(os.path.join(directory, name))
+    # Los workers heredan el entorno y prometheus_client lo lee al importarse
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    return directory
+
+
+def main() -> None:
+    if WORKERS > 1:
+        _metrics_dir()
+        print(f"Arrancando {WORKERS} workers (caché compartida: {CACHE_DISK_PATH or 'desactivada'})")
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        loop=_available("uvloop", "asyncio"),
+        http=_available("httptools", "h11"),
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple, Union
+from schemas import HomeContent, SeriesBase, SeriesDetail, Season, SeasonInfo, Server, EpisodeServers, SearchResult
+from scrapers.home_scraper import scrape_home
+from scrapers.search_scraper import scrape_search
+from scrapers.series_scraper import (
+    scrape_series_list,
+    scrape_series_detail,
+    scrape_series_header,
+    iter_seasons,
+    load_season_episodes,
+    scrape_episode_servers,
+)
+from cache import response_cache, MISS
+from metrics import record_cache
+from catalog import Catalog, get_serving_catalog, serving_version
+from compact import CompactCatalog
+from search_index import search_index
+from changes import change_feed
+from config import (
+    CATALOG_SERVE,
+    SEARCH_INDEX_ENABLED,
+    SEARCH_INDEX_LIMIT,
+    CACHE_TTL_HOME,
+    CACHE_TTL_SERIES_LIST,
+    CACHE_TTL_SERIES_DETAIL,
+    CACHE_TTL_SEASON_INDEX,
+    CACHE_TTL_EPISODE_SERVERS,
+    CACHE_TTL_SEARCH,
+    SERVERS_BATCH_CONCURRENCY,
+)
+
+# Acceso cacheado a los scrapers, compartido por los routers y el precalentamiento.
+# Cada función devuelve (resultado, estado_de_caché); con refresh=True se ignora
+# la caché y se vuelve a scrapear el origen. Solo lo que se obtiene del origen
+# (no lo que sale de la caché o del catálogo, que rastrea crawler.py) se añade
+# al índice de búsqueda y pasa por el feed de cambios (changes.py) para
+# detectar episodios nuevos.
+
+# Estado de caché para respuestas servidas desde el catálogo local
+CATALOG = "CATALOG"
+# Estado de caché para búsquedas resueltas por el índice local
+INDEX = "INDEX"
+
+
+class _ServingCatalog:
+    """
+    Catálogo del que se sirve una petición. Lo que se construye a partir de
+    él se guarda en la memoria de la caché (con su JSON) bajo la versión del
+    catálogo, así que solo se vuelve a construir cuando el crawler lo modifica.
+    """
+
+    def __init__(self, catalog: Union[Catalog, CompactCatalog], version: Optional[int]):
+        self.catalog = catalog
+        self.version = version
+
+    def cached(self, key: str, build: Callable[[], Any], type_: Any) -> Any:
+        return response_cache.get_or_build(f"catalog:{self.version}:{key}", build, type_)
+
+
+def _serving_catalog(refresh: bool) -> Optional[_ServingCatalog]:
+    if not CATALOG_SERVE or refresh:
+        return None
+    # La versión se lee antes que el catálogo: como mucho se guardan datos
+    # nuevos con la versión anterior, nunca datos antiguos con la nueva
+    version = serving_version()
+    catalog = get_serving_catalog()
+    if catalog is None:
+        return None
+    return _ServingCatalog(catalog, version)
+
+
+def _without_seasons(series: Optional[SeriesDetail]) -> Optional[SeriesDetail]:
+    return series.model_copy(update={"seasons": []}) if series else None
+
+
+async def _load_home() -> Optional[HomeContent]:
+    content = await scrape_home()
+    if content:
+        search_index.add_many(content.featured + content.trending_series)
+    change_feed.observe_home(content)
+    return content
+
+
+async def get_home(refresh: bool = False) -> Tuple[Optional[HomeContent], str]:
+    return await response_cache.get_or_load("home", CACHE_TTL_HOME, _load_home, HomeContent, refresh=refresh)
+
+
+async def _load_series_list(page: int) -> List[SeriesBase]:
+    series_list = await scrape_series_list(page)
+    search_index.add_many(series_list)
+    return series_list
+
+
+async def get_series_list(page: int, refresh: bool = False) -> Tuple[List[SeriesBase], str]:
+    serving = _serving_catalog(refresh)
+    if serving is not None:
+        series_list = serving.cached(
+            f"series:list:{page}", lambda: serving.catalog.get_listing(page), List[SeriesBase]
+        )
+        if series_list:
+            record_cache(f"series:list:{page}", CATALOG)
+            return series_list, CATALOG
+
+    return await response_cache.get_or_load(
+        f"series:list:{page}",
+        CACHE_TTL_SERIES_LIST,
+        lambda: _load_series_list(page),
+        List[SeriesBase],
+        refresh=refresh,
+    )
+
+
+async def _load_series_detail(series_id: str) -> Optional[SeriesDetail]:
+    series = await scrape_series_detail(series_id)
+    if series:
+        search_index.add(series)
+    change_feed.observe_series(series)
+    return series
+
+
+def _catalog_series(serving: _ServingCatalog, series_id: str) -> Optional[SeriesDetail]:
+    return serving.cached(f"series:detail:{series_id}", lambda: serving.catalog.get_series(series_id), SeriesDetail)
+
+
+async def get_series_detail(series_id: str, refresh: bool = False) -> Tuple[Optional[SeriesDetail], str]:
+    serving = _serving_catalog(refresh)
+    if serving is not None:
+        series = _catalog_series(serving, series_id)
+        if series:
+            record_cache(f"series:detail:{series_id}", CATALOG)
+            return series, CATALOG
+
+    return await response_cache.get_or_load(
+        f"series:detail:{series_id}",
+        CACHE_TTL_SERIES_DETAIL,
+        lambda: _load_series_detail(series_id),
+        SeriesDetail,
+        refresh=refresh,
+    )
+
+
+async def _scrape_series_info(series_id: str) -> Optional[SeriesDetail]:
+    series, _ = await scrape_series_header(series_id)
+    return _without_seasons(series)
+
+
+async def get_series_info(series_id: str, refresh: bool = False) -> Tuple[Optional[SeriesDetail], str]:
+    """
+    Ficha de una serie sin temporadas. Reutiliza el detalle completo si ya
+    está en el catálogo o en caché; si no, solo se scrapea la página de la
+    serie (sin descargar las temporadas).
+    """
+    serving = _serving_catalog(refresh)
+    if serving is not None:
+        series = serving.cached(
+            f"series:info:{series_id}", lambda: _without_seasons(serving.catalog.get_series(series_id)), SeriesDetail
+        )
+        if series:
+            record_cache(f"series:info:{series_id}", CATALOG)
+            return series, CATALOG
+
+    if not refresh and await response_cache.get_entry(f"series:detail:{series_id}", SeriesDetail) is not None:
+        series, cache_status = await get_series_detail(series_id)
+        if series:
+            return series.model_copy(update={"seasons": []}), cache_status
+
+    return await response_cache.get_or_load(
+        f"series:info:{series_id}",
+        CACHE_TTL_SERIES_DETAIL,
+        lambda: _scrape_series_info(series_id),
+        SeriesDetail,
+        refresh=refresh,
+    )
+
+
+async def _scrape_season_index(series_id: str) -> Optional[List[SeasonInfo]]:
+    series, season_urls = await scrape_series_header(series_id)
+    if not series:
+        return None
+    if season_urls:
+        return [SeasonInfo(number=number, url=urls[0]) for number, urls in sorted(season_urls.items())]
+    # Miniserie: los episodios están en la propia ficha
+    return [SeasonInfo(number=season.number) for season in series.seasons]
+
+
+async def get_season_index(series_id: str, refresh: bool = False) -> Tuple[Optional[List[SeasonInfo]], str]:
+    """
+    Temporadas de una serie (número y URL) a partir de la página de la serie,
+    sin descargar ninguna temporada. None si la serie no existe.
+    """
+    serving = _serving_catalog(refresh)
+    if serving is not None and serving.catalog.has_series(series_id):
+        record_cache(f"series:seasons:{series_id}", CATALOG)
+        index = serving.cached(
+            f"series:seasons:{series_id}", lambda: serving.catalog.get_season_index(series_id), List[SeasonInfo]
+        )
+        return index, CATALOG
+
+    return await response_cache.get_or_load(
+        f"series:seasons:{series_id}",
+        CACHE_TTL_SEASON_INDEX,
+        lambda: _scrape_season_index(series_id),
+        Optional[List[SeasonInfo]],
+        refresh=refresh,
+    )
+
+
+async def get_season(series_id: str, number: int, refresh: bool = False) -> Tuple[Optional[Season], str]:
+    """
+    Una temporada de una serie: descarga la página de la serie (o usa el
+    índice cacheado) y solo la página de esa temporada
+    """
+    serving = _serving_catalog(refresh)
+    if serving is not None and serving.catalog.has_series(series_id):
+        record_cache(f"series:seasons:{series_id}", CATALOG)
+        season = serving.cached(
+            f"series:season:{series_id}:{number}", lambda: serving.catalog.get_season(series_id, number), Season
+        )
+        return season, CATALOG
+
+    # Si el detalle completo ya está en caché no hace falta descargar nada
+    if not refresh and await response_cache.get_entry(f"series:detail:{series_id}", SeriesDetail) is not None:
+        series, cache_status = await get_series_detail(series_id)
+        if series:
+            return next((s for s in series.seasons if s.number == number), None), cache_status
+
+    index, cache_status = await get_season_index(series_id, refresh)
+    info = next((season for season in index or [] if season.number == number), None)
+    if info is None:
+        return None, cache_status
+    if info.url is None:
+        # Miniserie: el detalle sale de la misma página, sin más descargas
+        series, cache_status = await get_series_detail(series_id, refresh)
+        if not series:
+            return None, cache_status
+        return next((s for s in series.seasons if s.number == number), None), cache_status
+
+    episodes, cache_status = await load_season_episodes(
+        info.url,
+        refresh,
+        on_load=lambda loaded: change_feed.observe_season(series_id, Season(number=number, episodes=loaded)),
+    )
+    return (Season(number=number, episodes=episodes) if episodes else None), cache_status
+
+
+async def _iter_list(seasons: List[Season]) -> AsyncIterator[Season]:
+    for season in seasons:
+        yield season
+
+
+async def stream_series_detail(
+    series_id: str,
+) -> Tuple[Optional[SeriesDetail], AsyncIterator[Season], str]:
+    """
+    Detalle de una serie por partes: la ficha (sin temporadas) en cuanto se
+    parsea la página de la serie y un iterador con cada temporada según se
+    scrapea. Al terminar, la serie completa se guarda en la misma entrada de
+    caché que usa get_series_detail.
+    """
+    serving = _serving_catalog(False)
+    if serving is not None:
+        series = _catalog_series(serving, series_id)
+        if series:
+            record_cache(f"series:detail:{series_id}", CATALOG)
+            return series.model_copy(update={"seasons": []}), _iter_list(series.seasons), CATALOG
+
+    key = f"series:detail:{series_id}"
+    if await response_cache.get_entry(key, SeriesDetail) is not None:
+        # Ya cacheada (fresca o caducada): se sirve igual que el endpoint normal
+        series, cache_status = await get_series_detail(series_id)
+        if series:
+            return series.model_copy(update={"seasons": []}), _iter_list(series.seasons), cache_status
+
+    header, season_urls = await scrape_series_header(series_id)
+    if not header:
+        return None, _iter_list([]), MISS
+
+    async def seasons() -> AsyncIterator[Season]:
+        collected = list(header.seasons)
+        for season in header.seasons:
+            yield season
+        async for season in iter_seasons(season_urls):
+            collected.append(season)
+            yield season
+
+        series = header.model_copy(update={"seasons": sorted(collected, key=lambda x: x.number)})
+        response_cache.set(key, series, CACHE_TTL_SERIES_DETAIL, SeriesDetail)
+        search_index.add(series)
+        change_feed.observe_series(series)
+
+    return header.model_copy(update={"seasons": []}), seasons(), MISS
+
+
+async def get_episode_servers(episode_url: str, refresh: bool = False) -> Tuple[List[Server], str]:
+    return await response_cache.get_or_load(
+        f"servers:{episode_url}",
+        CACHE_TTL_EPISODE_SERVERS,
+        lambda: scrape_episode_servers(episode_url),
+        List[Server],
+        refresh=refresh,
+    )
+
+
+async def get_episode_servers_batch(episode_urls: List[str]) -> List[EpisodeServers]:
+    """
+    Servidores de varios episodios resueltos en paralelo (como mucho
+    SERVERS_BATCH_CONCURRENCY a la vez). Cada episodio lleva su propio error,
+    así que un fallo no invalida el lote.
+    """
+    semaphore = asyncio.Semaphore(SERVERS_BATCH_CONCURRENCY)
+
+    async def resolve(episode_url: str) -> EpisodeServers:
+        async with semaphore:
+            try:
+                servers, _ = await get_episode_servers(episode_url)
+            except Exception as e:
+                print(f"Error fetching servers for {episode_url}: {e}")
+                return EpisodeServers(episode_url=episode_url, error=str(e))
+        if not servers:
+            return EpisodeServers(episode_url=episode_url, error="No se encontraron servidores")
+        return EpisodeServers(episode_url=episode_url, servers=servers)
+
+    # Las URLs repetidas se resuelven una sola vez
+    unique_urls = list(dict.fromkeys(episode_urls))
+    return list(await asyncio.gather(*(resolve(url) for url in unique_urls)))
+
+
+async def _load_search(query: str) -> Optional[SearchResult]:
+    results = await scrape_search(query)
+    if results is not None:
+        search_index.add_many(results.series)
+    return results
+
+
+async def search(query: str, refresh: bool = False) -> Tuple[SearchResult, str]:
+    # Primero el índice local; la búsqueda en el origen queda como respaldo
+    if SEARCH_INDEX_ENABLED and not refresh:
+        series = search_index.search(query, limit=SEARCH_INDEX_LIMIT)
+        if series:
+            record_cache("search", INDEX)
+            return SearchResult(series=series), INDEX
+
+    key = " ".join(query.lower().split())
+    results, cache_status = await response_cache.get_or_load(
+        f"search:{key}",
+        CACHE_TTL_SEARCH,
+        lambda: _load_search(query),
+        SearchResult,
+        refresh=refresh,
+    )
+    if results is None:
+        return SearchResult(), cache_status
+    return results, cache_status
@@ -0,0 +1,22 @@
+"""
+Pruebas de la API (desde python_app/):
+    python -m pytest -q tests
+
+Las descargas van a orígenes de prueba dentro del proceso (sin red), con la
+caché, el regulador y las peticiones condicionales desactivados para que
+cada petición llegue al origen.
+"""
+import os
+import sys
+
+os.environ.update(
+    CACHE_ENABLED="0",
+    CACHE_DISK_PATH="",
+    REVALIDATE_ENABLED="0",
+    GOVERNOR_ENABLED="0",
+    HTTP2="0",
+    CATALOG_PATH="",
+    PREWARM_ENABLED="0",
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
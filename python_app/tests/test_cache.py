@@ -0,0 +1,173 @@
+import asyncio
+import sqlite3
+import time
+
+from cache import ResponseCache
+from governor import PRIORITY_BACKGROUND, PRIORITY_USER, background_priority, current_priority, priority_group
+
+
+def _caches(path, lease_seconds=5, count=2):
+    # Varias instancias sobre el mismo fichero hacen de varios workers
+    caches = []
+    for _ in range(count):
+        cache = ResponseCache(1 << 20, enabled=True, lease_seconds=lease_seconds)
+        cache.open_disk(str(path))
+        caches.append(cache)
+    return caches
+
+
+def test_single_flight_across_workers(tmp_path):
+    first, second = _caches(tmp_path / "cache.db")
+    calls = []
+
+    async def slow_loader():
+        calls.append("first")
+        await asyncio.sleep(0.3)
+        return b"first"
+
+    async def other_loader():
+        calls.append("second")
+        return b"second"
+
+    async def main():
+        loading = asyncio.ensure_future(first.get_or_load("html:x", 60, slow_loader, bytes))
+        await asyncio.sleep(0.1)
+        return await asyncio.gather(loading, second.get_or_load("html:x", 60, other_loader, bytes))
+
+    try:
+        (value, _), (shared, _) = asyncio.run(main())
+    finally:
+        first.close()
+        second.close()
+
+    assert value == shared == b"first"
+    assert calls == ["first"]
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    first, second = _caches(tmp_path / "cache.db", lease_seconds=0.3)
+    # Reserva de un worker que se ha caído sin liberarla
+    assert first.disk.acquire_lease("html:x", "muerto", 0.3)
+
+    async def loader():
+        return b"second"
+
+    start = time.monotonic()
+    try:
+        value, _ = asyncio.run(second.get_or_load("html:x", 60, loader, bytes))
+        # Al terminar la carga la reserva queda libre
+        second.disk.flush()
+        released = first.disk.acquire_lease("html:x", "otro", 5)
+    finally:
+        first.close()
+        second.close()
+
+    assert value == b"second"
+    assert released
+    assert time.monotonic() - start >= 0.25
+
+
+def test_locked_database_does_not_block_the_loop(tmp_path):
+    (cache,) = _caches(tmp_path / "cache.db", count=1)
+    # Otro proceso con la base de datos bloqueada para escritura
+    other = sqlite3.connect(str(tmp_path / "cache.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def loader():
+        return b"value"
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.ensure_future(ticker())
+        asyncio.get_running_loop().call_later(0.3, other.execute, "COMMIT")
+        value, _ = await cache.get_or_load("html:x", 60, loader, bytes)
+        ticking.cancel()
+        return value, ticks
+
+    try:
+        value, ticks = asyncio.run(main())
+    finally:
+        cache.close()
+        other.close()
+
+    assert value == b"value"
+    assert ticks >= 10
+
+
+def test_writes_while_another_worker_holds_the_lock(tmp_path):
+    first, second = _caches(tmp_path / "cache.db")
+    other = sqlite3.connect(str(tmp_path / "cache.db"), isolation_level=None)
+    first.set("key", b"old", 60, bytes)
+    first.disk.flush()
+    other.execute("BEGIN IMMEDIATE")
+
+    async def main():
+        start = time.monotonic()
+        for number in range(50):
+            first.set(f"key:{number}", b"value", 60, bytes)
+        blocked = time.monotonic() - start
+        # Otro worker lee del disco mientras tanto
+        stored = await second.get_entry("key", bytes)
+        return blocked, stored
+
+    try:
+        blocked, stored = asyncio.run(main())
+        other.execute("COMMIT")
+        first.disk.flush()
+        written = first.disk.get("key:49")
+    finally:
+        first.close()
+        second.close()
+        other.close()
+
+    assert blocked < 0.1
+    assert stored[0] == b"old"
+    assert written is not None and written[0] == b"value"
+
+
+def test_failed_load_serves_expired_entry_unless_stale_ttl_is_zero():
+    cache = ResponseCache(1 << 20, enabled=True)
+
+    async def failing():
+        return None
+
+    async def main(stale_ttl):
+        # Entrada que ya ha pasado su margen de caducidad
+        cache.memory.set("key", b"old", None, 3, time.time() - 2, time.time() - 1)
+        return await cache.get_or_load("key", 60, failing, bytes, stale_ttl=stale_ttl)
+
+    assert asyncio.run(main(60)) == (b"old", "STALE")
+    assert asyncio.run(main(0)) == (None, "MISS")
+
+
+def test_user_joining_a_background_load_promotes_only_that_load():
+    cache = ResponseCache(1 << 20, enabled=True)
+    gate = asyncio.Event()
+    seen = []
+
+    async def loader():
+        await gate.wait()
+        seen.append(current_priority())
+        return b"new"
+
+    async def main():
+        # Carga lanzada por el crawler o el precalentamiento
+        with background_priority():
+            crawler = priority_group()
+            loading = cache._load("key", 60, loader, bytes, None)
+        await asyncio.sleep(0)
+        joined = asyncio.ensure_future(cache.get_or_load("key", 60, loader, bytes, refresh=True))
+        await asyncio.sleep(0)
+        gate.set()
+        await loading
+        return (await joined)[0], crawler.value
+
+    assert asyncio.run(main()) == (b"new", PRIORITY_BACKGROUND)
+    assert seen == [PRIORITY_USER]
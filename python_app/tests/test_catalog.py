@@ -0,0 +1,28 @@
+import sqlite3
+import time
+
+from catalog import Catalog, load_compact_catalog
+from schemas import SeriesDetail
+
+
+def test_reads_while_the_crawler_is_writing(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    catalog = Catalog(path)
+    catalog.set_series(SeriesDetail(id="serie", title="Serie", url="https://origin/serie/serie/"))
+    # El crawler (otra conexión) a mitad de una transacción de escritura
+    crawler = sqlite3.connect(path, isolation_level=None)
+    crawler.execute("BEGIN EXCLUSIVE")
+    crawler.execute("UPDATE series SET data = '{}' WHERE id = 'serie'")
+
+    start = time.monotonic()
+    try:
+        series = catalog.get_series("serie")
+        compact = load_compact_catalog(path)
+    finally:
+        crawler.execute("ROLLBACK")
+        crawler.close()
+        catalog.close()
+
+    assert time.monotonic() - start < 1
+    assert series.title == "Serie"
+    assert compact.get_series("serie").title == "Serie"
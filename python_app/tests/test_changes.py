@@ -0,0 +1,42 @@
+import asyncio
+
+import changes
+from cache import ResponseCache
+from changes import ChangeFeed
+from schemas import Episode, Season
+
+
+def _season(*numbers: int) -> Season:
+    return Season(number=1, episodes=[
+        Episode(number=number, url=f"https://origin/episodio/serie-1x{number}/") for number in numbers
+    ])
+
+
+def test_workers_share_changes_through_the_disk(tmp_path, monkeypatch):
+    cache = ResponseCache(1 << 20, enabled=True)
+    cache.open_disk(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(changes, "response_cache", cache)
+    monkeypatch.setattr(changes, "CHANGES_POLL_INTERVAL", 0.05)
+    # Dos instancias hacen de dos workers sobre el mismo SQLite
+    waiting, detecting = ChangeFeed(), ChangeFeed()
+
+    async def main():
+        cursor = await waiting.latest()
+        woken = asyncio.ensure_future(waiting.wait(cursor, 5))
+        await asyncio.sleep(0.1)
+        for feed in (waiting, detecting):
+            feed.observe_season("serie", _season(1, 2), _season(1))
+        await asyncio.gather(waiting.flush(), detecting.flush())
+        changed = await woken
+        idle = await waiting.wait(await waiting.latest(), 0.1)
+        return changed, idle, await waiting.since(cursor, 10)
+
+    try:
+        changed, idle, updates = asyncio.run(main())
+    finally:
+        cache.close()
+
+    assert changed and not idle
+    # El mismo episodio visto por los dos workers aparece una sola vez
+    assert [(change.season, change.episode["number"]) for change in updates.changes] == [(1, 2)]
+    assert updates.cursor == updates.changes[-1].cursor and not updates.reset
@@ -0,0 +1,58 @@
+from catalog import Catalog, load_compact_catalog
+from compact import URLTable
+from schemas import Episode, SeriesBase, SeriesDetail, Season, Server
+
+
+def test_url_table_shares_prefixes():
+    urls = URLTable()
+    first = urls.split("https://origin/episodio/serie-1x1/")
+    second = urls.split("https://origin/episodio/serie-1x2/")
+
+    assert first[0] == second[0] and first[1] == "serie-1x1/"
+    assert urls.join(*second) == "https://origin/episodio/serie-1x2/"
+    assert urls.join(*urls.split(None)) is None
+    assert len(urls) == 2
+
+
+def test_compact_catalog_reads_like_the_sqlite_catalog(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    catalog = Catalog(path)
+    series = SeriesDetail(
+        id="serie",
+        title="Serie",
+        url="https://origin/serie/serie/",
+        image="https://origin/img/serie.jpg",
+        year="2020",
+        genres=["Drama", "Comedia"],
+        cast=["Ana"],
+    )
+    seasons = [
+        Season(number=2, episodes=[
+            Episode(
+                number=1,
+                title="Piloto",
+                url="https://origin/episodio/serie-2x1/",
+                servers=[Server(name="uno", url="https://video/1", quality="HD")],
+            ),
+            Episode(number=2, url="https://origin/episodio/serie-2x2/", image="https://origin/img/2x2.jpg"),
+        ]),
+        Season(number=1, episodes=[Episode(number=1, url="https://origin/episodio/serie-1x1/")]),
+    ]
+    catalog.set_series(series)
+    for season in seasons:
+        catalog.set_season("serie", season, f"https://origin/temporada/serie-{season.number}/")
+    catalog.set_listing(1, [series, SeriesBase(id="otra", title="Otra", url="https://origin/serie/otra/")])
+
+    try:
+        compact = load_compact_catalog(path)
+        assert compact.get_series("serie") == catalog.get_series("serie")
+        assert compact.get_listing(1) == catalog.get_listing(1)
+        assert compact.get_season_index("serie") == catalog.get_season_index("serie")
+        assert compact.get_season("serie", 2) == catalog.get_season("serie", 2)
+        assert list(compact.iter_series()) == list(catalog.iter_series())
+    finally:
+        catalog.close()
+
+    assert compact.get_listing(2) is None
+    assert compact.get_series("otra") is None and not compact.has_series("otra")
+    assert compact.get_season("serie", 3) is None
@@ -0,0 +1,119 @@
+import asyncio
+import re
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+import utils
+from benchmarks.origin import load_fixtures
+from catalog import Catalog
+from changes import change_feed
+from config import BASE_URL
+from crawler import Crawler
+
+
+class FixtureSite:
+    """
+    Sitio con las páginas grabadas: `pages` páginas de listado con series
+    distintas y temporadas propias de cada serie
+    """
+
+    def __init__(self, pages: int):
+        self.pages = pages
+        self.fixtures = load_fixtures(BASE_URL)
+        # Episodios añadidos por slug de temporada
+        self.extra_episodes: Dict[str, List[int]] = {}
+        self.requests: Counter = Counter()
+        self.app = Starlette(routes=[
+            Route("/series-online/", self.listing),
+            Route("/series-online/page/{page:int}/", self.listing),
+            Route("/serie/{slug}/", self.serie),
+            Route("/temporada/{slug}/", self.season),
+        ])
+
+    async def listing(self, request: Request) -> Response:
+        page = request.path_params.get("page", 1)
+        self.requests["listing"] += 1
+        if page > self.pages:
+            return Response(status_code=404)
+        html = re.sub(
+            rb'/serie/([^/"]+)/',
+            lambda m: b"/serie/%s-p%d/" % (m.group(1), page),
+            self.fixtures["series_list"],
+        )
+        return Response(html, media_type="text/html")
+
+    async def serie(self, request: Request) -> Response:
+        self.requests["serie"] += 1
+        slug = request.path_params["slug"].encode()
+        html = self.fixtures["serie"].replace(b"/temporada/casa-del-papel-", b"/temporada/" + slug + b"-")
+        return Response(html, media_type="text/html")
+
+    async def season(self, request: Request) -> Response:
+        self.requests["season"] += 1
+        slug = request.path_params["slug"]
+        items = "".join(
+            f'<li><article class="TPost B"><a href="{BASE_URL}/episodio/{slug}x{number}/">'
+            f'<h2 class="Title">Episodio {number}</h2></a></article></li>'
+            for number in self.extra_episodes.get(slug, [])
+        )
+        html = self.fixtures["season"].replace(b"</ul></section>", items.encode() + b"</ul></section>")
+        return Response(html, media_type="text/html")
+
+
+def _run(site: FixtureSite, crawl) -> None:
+    async def main():
+        utils._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=site.app))
+        try:
+            await crawl()
+        finally:
+            await utils.close_http_client()
+
+    asyncio.run(main())
+
+
+def test_incremental_crawl_resumes_and_finds_new_episodes(tmp_path):
+    site = FixtureSite(pages=2)
+    catalog = Catalog(str(tmp_path / "catalog.db"))
+    results = {}
+
+    async def crawl():
+        # Primer rastreo interrumpido tras la página 1
+        await Crawler(catalog).run(max_pages=1)
+        results["page1"] = set(catalog.series_ids())
+
+        # El siguiente sigue por la página 2 aunque la 1 no haya cambiado
+        results["resume"] = await Crawler(catalog).run()
+        results["all"] = set(catalog.series_ids())
+
+        # Episodio nuevo en una serie ya rastreada: el listado no cambia
+        series_id = results["series_id"] = sorted(results["page1"])[0]
+        site.extra_episodes[f"{series_id}-2"] = [17]
+        site.requests.clear()
+        cursor = await change_feed.latest()
+        results["episode"] = await Crawler(catalog).run()
+        results["changes"] = (await change_feed.since(cursor, 10)).changes
+        results["season"] = catalog.get_season(series_id, 2)
+
+    _run(site, crawl)
+    catalog.close()
+
+    assert results["page1"]
+    assert results["resume"]["pages"] == 2
+    assert len(results["all"]) == 2 * len(results["page1"])
+
+    # Se para en la página 1 (nada nuevo y la 2 ya completada), sin volver a
+    # procesar fichas y solo con la temporada que ha cambiado
+    stats = results["episode"]
+    assert stats["pages"] == 1
+    assert stats["series"] == 0
+    assert stats["seasons"] == 1
+    assert site.requests["listing"] == 1
+    assert results["season"].episodes[-1].number == 17
+    # El episodio nuevo llega al feed de cambios (comparado con el catálogo)
+    assert [(c.series_id, c.season, c.episode["number"]) for c in results["changes"]] == [(results["series_id"], 2, 17)]
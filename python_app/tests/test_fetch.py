@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+import utils
+from config import BASE_URL
+from governor import CircuitBreaker, governor
+
+
+def test_cancelled_hedged_get_cancels_the_request_in_flight(monkeypatch):
+    monkeypatch.setattr(utils, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(utils, "HEDGE_DELAY", 5)
+
+    async def slow(request: Request) -> Response:
+        await asyncio.sleep(1)
+        return Response("tarde")
+
+    app = Starlette(routes=[Route("/", slow)])
+
+    async def main():
+        utils._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        try:
+            # El cliente se va antes de que haga falta la petición de respaldo
+            hedged = asyncio.ensure_future(utils._get_hedged(f"{BASE_URL}/"))
+            await asyncio.sleep(0.05)
+            hedged.cancel()
+            await asyncio.gather(hedged, return_exceptions=True)
+            await asyncio.sleep(0)
+            return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        finally:
+            await utils.close_http_client()
+
+    assert asyncio.run(main()) == []
+
+
+def _download(monkeypatch, statuses):
+    # Cada petición responde con el siguiente estado de la lista (el último se repite)
+    requests = []
+
+    async def page(request: Request) -> Response:
+        requests.append(request.url.path)
+        return Response("<html></html>", status_code=statuses[min(len(requests), len(statuses)) - 1])
+
+    app = Starlette(routes=[Route("/", page)])
+    monkeypatch.setattr(utils, "FETCH_RETRY_BACKOFF", 0)
+    # Circuitos nuevos para no depender de otras pruebas
+    monkeypatch.setattr(governor, "_breakers", {})
+
+    async def main():
+        utils._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        try:
+            return await utils._download(f"{BASE_URL}/")
+        finally:
+            await utils.close_http_client()
+
+    return asyncio.run(main()), requests
+
+
+def test_download_retries_temporary_errors(monkeypatch):
+    monkeypatch.setattr(utils, "FETCH_RETRIES", 2)
+    content, requests = _download(monkeypatch, [503, 429, 200])
+    assert content == b"<html></html>" and len(requests) == 3
+
+    content, requests = _download(monkeypatch, [503])
+    assert content is None and len(requests) == 3
+
+    # Un 404 no se reintenta
+    content, requests = _download(monkeypatch, [404])
+    assert content is None and len(requests) == 1
+
+
+def test_open_circuit_stops_the_retries(monkeypatch):
+    monkeypatch.setattr(utils, "FETCH_RETRIES", 5)
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    monkeypatch.setattr(governor, "breaker", lambda url: breaker)
+
+    content, requests = _download(monkeypatch, [500])
+    assert content is None and len(requests) == 2
+    assert breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from governor import PRIORITY_BACKGROUND, PRIORITY_USER, CircuitBreaker, OutboundGovernor, PriorityGroup
+
+
+def test_promoted_group_moves_ahead_in_the_queue():
+    governor = OutboundGovernor()
+    host = governor.host("http://origin/")
+    host.max_concurrency = host.limit = 1
+    host.rate = 0
+    admitted = []
+
+    async def request(name, group):
+        await host.acquire(group)
+        admitted.append(name)
+        host.release(True, 0.0)
+
+    async def main():
+        await host.acquire()
+        background = PriorityGroup(PRIORITY_BACKGROUND)
+        # Carga lanzada desde la del grupo en segundo plano
+        nested = PriorityGroup(PRIORITY_BACKGROUND, background)
+        waiting = [
+            asyncio.ensure_future(request("other", PriorityGroup(PRIORITY_BACKGROUND))),
+            asyncio.ensure_future(request("background", background)),
+            asyncio.ensure_future(request("nested", nested)),
+            asyncio.ensure_future(request("user", None)),
+        ]
+        await asyncio.sleep(0)
+        governor.promote(background)
+        host.release(True, 0.0)
+        await asyncio.gather(*waiting)
+        return nested.value
+
+    assert asyncio.run(main()) == PRIORITY_USER
+    assert admitted == ["background", "nested", "user", "other"]
+
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.1)
+    for _ in range(2):
+        breaker.record(False)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    # Pasado el intervalo, una sola petición de prueba
+    time.sleep(0.1)
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    # Si la prueba falla se vuelve a abrir al momento
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opened == 2
+
+    time.sleep(0.1)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0 and breaker.allow()
+
+
+def test_circuit_breaker_disabled_with_zero_threshold():
+    breaker = CircuitBreaker(failure_threshold=0, reset_seconds=60)
+    for _ in range(10):
+        breaker.record(False)
+    assert breaker.allow()
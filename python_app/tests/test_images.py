@@ -0,0 +1,127 @@
+import asyncio
+import os
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import RedirectResponse, Response
+from starlette.routing import Route
+
+import images
+import utils
+from config import BASE_URL
+from images import ImageCache, ImageProxy, download_image
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+async def _image(request: Request) -> Response:
+    return Response(PNG, media_type="image/png")
+
+
+async def _redirect(request: Request) -> Response:
+    return RedirectResponse(request.query_params["to"])
+
+
+def _download(url: str):
+    app = Starlette(routes=[Route("/img/a.png", _image), Route("/redirect", _redirect)])
+
+    async def main():
+        utils._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), follow_redirects=True)
+        try:
+            return await download_image(url)
+        finally:
+            await utils.close_http_client()
+
+    return asyncio.run(main())
+
+
+def test_download_follows_redirects_to_allowed_hosts():
+    assert _download(f"{BASE_URL}/img/a.png") == (PNG, "image/png")
+    assert _download(f"{BASE_URL}/redirect?to={BASE_URL}/img/a.png") == (PNG, "image/png")
+
+
+def test_download_rejects_redirects_to_other_hosts():
+    assert _download(f"{BASE_URL}/redirect?to=http://169.254.169.254/img/a.png") is None
+    assert _download(f"{BASE_URL}/redirect?to=/redirect?to=http://127.0.0.1:1/img/a.png") is None
+
+
+def test_download_errors_return_none():
+    async def broken(request: Request) -> Response:
+        # Cuerpo que no corresponde al Content-Encoding declarado
+        return Response(b"no es gzip", media_type="image/png", headers={"Content-Encoding": "gzip"})
+
+    app = Starlette(routes=[Route("/img/broken.png", broken)])
+
+    async def main():
+        utils._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        try:
+            return await download_image(f"{BASE_URL}/img/broken.png")
+        finally:
+            await utils.close_http_client()
+
+    assert asyncio.run(main()) is None
+
+
+def test_cache_stays_under_limit_with_several_workers(tmp_path):
+    # Dos workers que escriben en el mismo directorio
+    workers = [ImageCache(str(tmp_path), 100_000, workers=2) for _ in range(2)]
+    for i in range(40):
+        workers[i % 2].put(f"{i:040x}", os.urandom(5_000), "image/jpeg")
+        total = sum(f.stat().st_size for f in tmp_path.rglob("*") if f.is_file())
+        assert total <= 100_000
+
+    # Las más usadas recientemente se conservan
+    assert workers[0].get(f"{39:040x}") is not None
+    assert workers[0].get(f"{0:040x}") is None
+
+
+def _proxy(tmp_path, monkeypatch):
+    downloads = []
+
+    async def download(url):
+        downloads.append(url)
+        return PNG, "image/png"
+
+    monkeypatch.setattr(images, "download_image", download)
+    return ImageProxy(ImageCache(str(tmp_path), 1_000_000)), downloads
+
+
+def test_image_removed_by_another_worker_is_fetched_again(tmp_path, monkeypatch):
+    proxy, downloads = _proxy(tmp_path, monkeypatch)
+    url = f"{BASE_URL}/img/a.png"
+    first, _ = asyncio.run(proxy.get(url, None, False))
+
+    # Otro worker borra el fichero justo después de encontrarlo en disco
+    found = proxy.cache.get
+    removed = []
+
+    def get(key):
+        image = found(key)
+        if image is not None and not removed:
+            os.remove(image.path)
+            removed.append(image.path)
+        return image
+
+    monkeypatch.setattr(proxy.cache, "get", get)
+    second, _ = asyncio.run(proxy.get(url, None, False))
+
+    assert len(downloads) == 2
+    assert second.etag == first.etag and os.path.exists(second.path)
+
+
+def test_images_that_cannot_be_resized_are_not_retried(tmp_path, monkeypatch):
+    proxy, _ = _proxy(tmp_path, monkeypatch)
+    attempts = []
+
+    def thumbnail(path, width, image_format):
+        attempts.append(path)
+        raise OSError("cannot identify image file")
+
+    monkeypatch.setattr(images, "_thumbnail", thumbnail)
+    url = f"{BASE_URL}/img/a.png"
+    served = [asyncio.run(proxy.get(url, 92, True))[0] for _ in range(3)]
+
+    # Se sirve la original sin volver a intentarlo hasta que pasa failed_ttl
+    assert len(attempts) == 1
+    assert all(image is not None and image.path.endswith(".png") for image in served)
@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+from prometheus_client import REGISTRY
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from metrics import (
+    ServerTimingMiddleware,
+    cache_kind,
+    collect_parse_failures,
+    finish_parse_failures,
+    record_cache,
+    record_fetch,
+    record_parse,
+    record_parse_failure,
+    render_metrics,
+)
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_server_timing_header_adds_up_each_stage():
+    async def page(request: Request) -> Response:
+        record_fetch(0.02, 200, 1_000)
+        record_fetch(0.03, 200, 1_000)
+        record_parse("home", 0.004, 0.001)
+        return Response("ok")
+
+    app = ServerTimingMiddleware(Starlette(routes=[Route("/", page)]))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/")
+
+    response = asyncio.run(main())
+    stages = dict(item.split(";dur=") for item in response.headers["server-timing"].split(", "))
+
+    assert stages["fetch"] == "50.0" and stages["parse"] == "4.0" and stages["extract"] == "1.0"
+    assert float(stages["total"]) >= 0
+
+
+def test_counters_group_keys_and_outcomes():
+    assert cache_kind("series:detail:serie") == "series:detail"
+    assert cache_kind("html:https://origin/serie/") == "html"
+
+    hits = _sample("cache_requests_total", kind="series:detail", status="HIT")
+    errors = _sample("origin_fetch_seconds_count", outcome="error")
+    record_cache("series:detail:serie", "HIT")
+    record_fetch(0.5, None)
+
+    assert _sample("cache_requests_total", kind="series:detail", status="HIT") == hits + 1
+    assert _sample("origin_fetch_seconds_count", outcome="error") == errors + 1
+    body, content_type = render_metrics()
+    assert b'cache_requests_total{kind="series:detail",status="HIT"}' in body
+    assert b"outbound_queue_depth" in body and content_type.startswith("text/plain")
+
+
+def test_parse_failures_are_collected_in_the_pool_and_counted_otherwise():
+    before = _sample("parse_failures_total", scraper="home", section="item")
+    token = collect_parse_failures()
+    record_parse_failure("home", "item")
+    assert finish_parse_failures(token) == [("home", "item")]
+    assert _sample("parse_failures_total", scraper="home", section="item") == before
+
+    record_parse_failure("home", "item")
+    assert _sample("parse_failures_total", scraper="home", section="item") == before + 1
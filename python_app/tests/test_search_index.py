@@ -0,0 +1,49 @@
+from schemas import SeriesBase, SeriesDetail
+from search_index import SearchIndex, normalize, tokenize
+
+
+def _base(series_id: str, title: str) -> SeriesBase:
+    return SeriesBase(id=series_id, title=title, url=f"https://origin/serie/{series_id}/")
+
+
+def test_tokens_ignore_accents_case_and_stopwords():
+    assert normalize("Acción Ñu") == "accion nu"
+    assert tokenize("La Casa de Papel") == ["casa", "papel"]
+
+
+def test_search_ranks_titles_and_matches_prefixes():
+    index = SearchIndex()
+    index.add_many([
+        _base("casa-papel", "La Casa de Papel"),
+        _base("casa", "Casa"),
+        _base("dragon", "La casa del dragón"),
+        _base("otra", "Otra serie"),
+    ])
+    index.add(SeriesDetail(id="drama", title="Drama", url="https://origin/serie/drama/", genres=["Casa"]))
+
+    # Título antes que género; a igual puntuación, el título más corto
+    assert [series.id for series in index.search("casa")] == ["casa", "casa-papel", "dragon", "drama"]
+    # Todos los términos, el último como prefijo (autocompletar)
+    assert [series.id for series in index.search("casa drag")] == ["dragon"]
+    assert [series.id for series in index.search("DRAGÓN")] == ["dragon"]
+    assert index.search("de la") == []
+    assert len(index.search("casa", limit=2)) == 2
+
+
+def test_listing_entries_keep_indexed_details():
+    index = SearchIndex()
+    index.add(SeriesDetail(
+        id="serie", title="Serie", url="https://origin/serie/serie/", genres=["Comedia"], cast=["Ana Pérez"]
+    ))
+    # El mismo título desde un listado no borra géneros ni reparto
+    index.add(_base("serie", "Serie"))
+    assert [series.id for series in index.search("perez")] == ["serie"]
+
+    # Un cambio de título reindexa la serie
+    index.add(_base("serie", "Nuevo"))
+    assert index.search("serie") == []
+    assert [series.title for series in index.search("nuevo")] == ["Nuevo"]
+    assert [series.id for series in index.search("comedia")] == ["serie"]
+
+    index.remove("serie")
+    assert len(index) == 0 and index.search("nuevo") == []
@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import services
+from routers import series
+from schemas import Episode, EpisodeServers, EpisodeServersRequest, Season, SeriesDetail, Server
+
+
+def test_batch_by_season_loads_only_that_season(monkeypatch):
+    requested = []
+
+    async def get_season(series_id, number, refresh=False):
+        requested.append((series_id, number))
+        if number != 2:
+            return None, "MISS"
+        return Season(number=2, episodes=[
+            Episode(number=1, url="https://origin/episodio/serie-2x1/"),
+            Episode(number=2, url="https://origin/episodio/serie-2x2/"),
+        ]), "MISS"
+
+    async def get_series_detail(series_id, refresh=False):
+        raise AssertionError("no debe descargar todas las temporadas")
+
+    async def get_episode_servers_batch(episode_urls):
+        return [EpisodeServers(episode_url=url) for url in episode_urls]
+
+    monkeypatch.setattr(services, "get_season", get_season)
+    monkeypatch.setattr(services, "get_series_detail", get_series_detail)
+    monkeypatch.setattr(services, "get_episode_servers_batch", get_episode_servers_batch)
+
+    response = asyncio.run(series.get_episode_servers_batch(EpisodeServersRequest(series_id="serie", season=2)))
+    assert [item["episode_url"] for item in json.loads(response.body)] == [
+        "https://origin/episodio/serie-2x1/",
+        "https://origin/episodio/serie-2x2/",
+    ]
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(series.get_episode_servers_batch(EpisodeServersRequest(series_id="serie", season=5)))
+    assert error.value.status_code == 404
+    assert requested == [("serie", 2), ("serie", 5)]
+
+
+def _series() -> SeriesDetail:
+    return SeriesDetail(
+        id="serie",
+        title="Serie",
+        url="https://origin/serie/serie/",
+        seasons=[
+            Season(number=number, episodes=[Episode(number=1, url=f"https://origin/episodio/serie-{number}x1/")])
+            for number in (1, 2)
+        ],
+    )
+
+
+def _detail(monkeypatch, cached: SeriesDetail, **params):
+    loaded = []
+
+    async def get_series_detail(series_id, refresh=False):
+        loaded.append("detail")
+        return cached, "HIT"
+
+    async def get_series_info(series_id, refresh=False):
+        loaded.append("info")
+        return cached.model_copy(update={"seasons": []}), "HIT"
+
+    async def get_episode_servers_batch(episode_urls):
+        return [EpisodeServers(episode_url=url, servers=[Server(name="s", url=url + "ver")]) for url in episode_urls]
+
+    monkeypatch.setattr(services, "get_series_detail", get_series_detail)
+    monkeypatch.setattr(services, "get_series_info", get_series_info)
+    monkeypatch.setattr(services, "get_episode_servers_batch", get_episode_servers_batch)
+    params = {"include_servers": None, "fields": None, **params}
+    response = asyncio.run(series.get_series_detail("serie", **params))
+    return json.loads(response.body), loaded
+
+
+def test_fields_returns_only_the_requested_paths(monkeypatch):
+    body, loaded = _detail(monkeypatch, _series(), fields="id,title")
+    # Sin seasons no se descargan las temporadas
+    assert body == {"id": "serie", "title": "Serie"} and loaded == ["info"]
+
+    body, loaded = _detail(monkeypatch, _series(), fields="id, seasons.episodes.url")
+    assert body == {
+        "id": "serie",
+        "seasons": [
+            {"episodes": [{"url": "https://origin/episodio/serie-1x1/"}]},
+            {"episodes": [{"url": "https://origin/episodio/serie-2x1/"}]},
+        ],
+    }
+    assert loaded == ["detail"]
+
+    for fields in ("bogus", "title.x", " , "):
+        with pytest.raises(HTTPException) as error:
+            _detail(monkeypatch, _series(), fields=fields)
+        assert error.value.status_code == 422
+
+
+def test_include_servers_fills_only_the_requested_seasons(monkeypatch):
+    cached = _series()
+    body, _ = _detail(monkeypatch, cached, include_servers="season:2")
+
+    servers = {season["number"]: season["episodes"][0]["servers"] for season in body["seasons"]}
+    assert servers[1] == []
+    assert servers[2] == [{"name": "s", "url": "https://origin/episodio/serie-2x1/ver", "quality": None}]
+    # El modelo cacheado no se queda con los servidores
+    assert all(not episode.servers for season in cached.seasons for episode in season.episodes)
+
+    body, _ = _detail(monkeypatch, cached, include_servers="all", fields="seasons.episodes.servers")
+    assert all(season["episodes"][0]["servers"] for season in body["seasons"])
+
+    with pytest.raises(HTTPException) as error:
+        _detail(monkeypatch, cached, include_servers="temporada:1")
+    assert error.value.status_code == 422
+
+
+def _stream(monkeypatch, format):
+    async def get_seasons():
+        for season in _series().seasons:
+            yield season
+
+    async def stream_series_detail(series_id):
+        return _series().model_copy(update={"seasons": []}), get_seasons(), "MISS"
+
+    monkeypatch.setattr(services, "stream_series_detail", stream_series_detail)
+
+    async def main():
+        response = await series.stream_series_detail("serie", format=format)
+        return response, "".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(main())
+
+
+def test_ndjson_stream_sends_the_series_then_each_season(monkeypatch):
+    response, body = _stream(monkeypatch, "ndjson")
+    events = [json.loads(line) for line in body.splitlines()]
+
+    assert response.media_type == "application/x-ndjson"
+    assert [event["type"] for event in events] == ["series", "season", "season", "end"]
+    assert events[0]["data"]["title"] == "Serie" and "seasons" not in events[0]["data"]
+    assert [event["data"]["number"] for event in events[1:3]] == [1, 2]
+
+
+def test_sse_stream_sends_named_events(monkeypatch):
+    response, body = _stream(monkeypatch, "sse")
+    events = [block.split("\n") for block in body.strip().split("\n\n")]
+
+    assert response.media_type == "text/event-stream"
+    assert [lines[0] for lines in events] == ["event: series", "event: season", "event: season", "event: end"]
+    assert json.loads(events[2][1].removeprefix("data: "))["number"] == 2
@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+import utils
+from benchmarks.origin import load_fixtures
+from config import BASE_URL
+from scrapers.series_scraper import scrape_series_detail
+
+
+def test_duplicate_season_link_falls_back_to_the_next_url():
+    fixtures = load_fixtures(BASE_URL)
+    first = f'<a href="{BASE_URL}/temporada/casa-del-papel-1/">'.encode()
+    # Otro enlace a la temporada 1, antes del bueno, que no tiene episodios
+    serie_html = fixtures["serie"].replace(
+        first, f'<a href="{BASE_URL}/temporada/roto-casa-del-papel-1/">1</a>'.encode() + first, 1
+    )
+
+    async def serie(request: Request) -> Response:
+        return Response(serie_html, media_type="text/html")
+
+    async def season(request: Request) -> Response:
+        if request.path_params["slug"].startswith("roto-"):
+            return Response(b"<html><body></body></html>", media_type="text/html")
+        return Response(fixtures["season"], media_type="text/html")
+
+    app = Starlette(routes=[Route("/serie/{slug}/", serie), Route("/temporada/{slug}/", season)])
+
+    async def main():
+        utils._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        try:
+            return await scrape_series_detail("casa-del-papel")
+        finally:
+            await utils.close_http_client()
+
+    series = asyncio.run(main())
+    numbers = [season.number for season in series.seasons]
+    assert numbers[0] == 1
+    assert series.seasons[0].episodes
+    assert len(numbers) == len(set(numbers))
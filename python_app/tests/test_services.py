@@ -0,0 +1,139 @@
+import asyncio
+
+import services
+from cache import response_cache
+from catalog import close_catalog, load_resident_catalog, open_catalog
+from changes import change_feed
+from search_index import search_index
+from schemas import Episode, Season, SeriesDetail
+
+
+def _series(episodes: int) -> SeriesDetail:
+    return SeriesDetail(
+        id="serie",
+        title="Serie",
+        url="https://origin/serie/serie/",
+        seasons=[Season(number=1, episodes=[
+            Episode(number=number, url=f"https://origin/episodio/serie-1x{number}/")
+            for number in range(1, episodes + 1)
+        ])],
+    )
+
+
+def test_change_feed_only_sees_series_loaded_from_the_origin(monkeypatch):
+    loaded = []
+    observed = []
+
+    async def scrape(series_id):
+        loaded.append(series_id)
+        return _series(len(loaded) + 1)
+
+    monkeypatch.setattr(response_cache, "enabled", True)
+    monkeypatch.setattr(services, "scrape_series_detail", scrape)
+    monkeypatch.setattr(change_feed, "observe_series", observed.append)
+
+    async def main():
+        first, _ = await services.get_series_detail("serie")
+        hit, status = await services.get_series_detail("serie")
+        refreshed, _ = await services.get_series_detail("serie", refresh=True)
+        return first, hit, status, refreshed
+
+    try:
+        first, hit, status, refreshed = asyncio.run(main())
+    finally:
+        response_cache.clear()
+
+    assert status == "HIT" and hit is first
+    # Solo las dos cargas del origen, no el acierto de caché
+    assert observed == [first, refreshed]
+    assert len(refreshed.seasons[0].episodes) == 3
+
+
+def test_cache_hits_are_not_indexed_again(monkeypatch):
+    indexed = []
+
+    async def scrape(series_id):
+        return _series(2)
+
+    monkeypatch.setattr(response_cache, "enabled", True)
+    monkeypatch.setattr(services, "scrape_series_detail", scrape)
+    monkeypatch.setattr(search_index, "add", indexed.append)
+
+    async def main():
+        first, _ = await services.get_series_detail("serie")
+        await services.get_series_detail("serie")
+        return first
+
+    try:
+        first = asyncio.run(main())
+    finally:
+        response_cache.clear()
+
+    assert indexed == [first]
+
+
+def test_catalog_hits_reuse_the_serialized_response_until_it_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "enabled", True)
+    catalog = open_catalog(str(tmp_path / "catalog.db"))
+    series = _series(2)
+    catalog.set_series(series)
+    catalog.set_season("serie", series.seasons[0])
+
+    def detail():
+        return asyncio.run(services.get_series_detail("serie"))
+
+    try:
+        (first, status), (second, _) = detail(), detail()
+        # El JSON se serializó al guardarlo y se reutiliza en cada respuesta
+        reused = response_cache.to_json(first, services.SeriesDetail) is response_cache.to_json(
+            second, services.SeriesDetail
+        )
+        # El crawler añade un episodio
+        catalog.set_season("serie", _series(3).seasons[0])
+        changed, _ = detail()
+
+        # Con la copia residente la versión es la de la última recarga
+        resident = load_resident_catalog()
+        loaded, _ = detail()
+        again, _ = detail()
+    finally:
+        close_catalog()
+        response_cache.clear()
+
+    assert status == services.CATALOG
+    assert second is first
+    assert reused
+    assert changed is not first and len(changed.seasons[0].episodes) == 3
+    assert resident is not None and again is loaded and len(loaded.seasons[0].episodes) == 3
+
+
+def test_streamed_series_is_cached_for_the_detail_endpoint(monkeypatch):
+    full = _series(2)
+    header = full.model_copy(update={"seasons": []})
+
+    async def scrape_header(series_id):
+        return header, {1: [f"https://origin/temporada/{series_id}-1/"]}
+
+    async def iter_seasons(season_urls):
+        for season in full.seasons:
+            yield season
+
+    monkeypatch.setattr(response_cache, "enabled", True)
+    monkeypatch.setattr(services, "scrape_series_header", scrape_header)
+    monkeypatch.setattr(services, "iter_seasons", iter_seasons)
+
+    async def main():
+        series, seasons, status = await services.stream_series_detail("serie")
+        streamed = [season async for season in seasons]
+        cached, cached_status = await services.get_series_detail("serie")
+        return series, streamed, status, cached, cached_status
+
+    try:
+        series, streamed, status, cached, cached_status = asyncio.run(main())
+    finally:
+        response_cache.clear()
+
+    assert status == "MISS" and series.seasons == []
+    assert streamed == full.seasons
+    # Al terminar el stream la serie completa queda en la caché del detalle
+    assert cached_status == "HIT" and cached == full
@@ -0,0 +1,72 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+import utils
+from cache import response_cache
+from config import BASE_URL
+from schemas import SeriesBase
+
+PAGE = '<html><head><meta charset="iso-8859-1"></head><body><p>Canción</p></body></html>'.encode("latin-1")
+
+
+def parse_paragraph(root):
+    return root.select_one("p").get_text()
+
+
+def _never(el) -> bool:
+    return False
+
+
+def test_stream_parse_detects_charset_and_fills_html_cache(monkeypatch):
+    requests = []
+
+    async def page(request: Request) -> Response:
+        requests.append(request.url.path)
+        # Sin charset en Content-Type: manda el <meta> del documento
+        return Response(PAGE, headers={"Content-Type": "text/html"})
+
+    app = Starlette(routes=[Route("/", page)])
+    monkeypatch.setattr(response_cache, "enabled", True)
+
+    async def main():
+        utils._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        try:
+            first = await utils.stream_parse(f"{BASE_URL}/", _never, parse_paragraph, str)
+            second = await utils.stream_parse(f"{BASE_URL}/", _never, parse_paragraph, str)
+            return first, second
+        finally:
+            await utils.close_http_client()
+
+    try:
+        assert asyncio.run(main()) == ("Canción", "Canción")
+    finally:
+        response_cache.clear()
+    # La segunda sale de la caché de HTML que llenó la primera
+    assert requests == ["/"]
+
+
+def parse_title(root):
+    return [SeriesBase(id="serie", title=root.select_one("p").get_text(), url=f"{BASE_URL}/serie/serie/")]
+
+
+def test_thread_pool_returns_the_parsed_models_as_is(monkeypatch):
+    monkeypatch.setattr(utils, "PARSE_EXECUTOR", "thread")
+    monkeypatch.setattr(utils, "_parse_executor", None)
+
+    def no_rebuild(type_):
+        raise AssertionError("con hilos no se reconstruye el resultado")
+
+    monkeypatch.setattr(utils, "type_adapter", no_rebuild)
+    content = b"<html><body><p>Serie</p></body></html>"
+    try:
+        result = asyncio.run(utils.parse_in_pool(content, parse_title, list))
+    finally:
+        utils.shutdown_parse_pool()
+        utils.parsed_results.clear()
+
+    assert [series.title for series in result] == ["Serie"]
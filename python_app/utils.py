@@ -1,21 +1,423 @@
+import asyncio
+import random
+import time
 import httpx
-from bs4 import BeautifulSoup
-from typing import Optional
-from config import HEADERS, TIMEOUT, BASE_URL
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from pydantic import BaseModel
+from config import (
+    HEADERS,
+    TIMEOUT,
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    FETCH_RETRIES,
+    FETCH_RETRY_BACKOFF,
+    FETCH_RETRY_MAX_BACKOFF,
+    HEDGE_ENABLED,
+    HEDGE_DELAY,
+    HEDGE_MIN_DELAY,
+    BASE_URL,
+    HTTP2,
+    MAX_CONNECTIONS,
+    MAX_KEEPALIVE_CONNECTIONS,
+    KEEPALIVE_EXPIRY,
+    CACHE_TTL_HTML,
+    PARSER_BACKEND,
+    PARSE_EXECUTOR,
+    PARSE_WORKERS,
+)
+from cache import response_cache, type_adapter
+from revalidation import validators, parsed_results
+from metrics import (
+    record_fetch,
+    record_parse,
+    collect_parse_failures,
+    finish_parse_failures,
+    count_parse_failures,
+)
+from governor import CircuitBreaker, PRIORITY_USER, current_priority, governor
+from parsing import LxmlStreamParser, get_parser
 
+# Cliente compartido por toda la app; se abre y cierra en el lifespan de main.py
+_client: Optional[httpx.AsyncClient] = None
 
-async def fetch_page(url: str) -> Optional[BeautifulSoup]:
+# Backend de parseo HTML (bs4, lxml o selectolax)
+_parse = get_parser(PARSER_BACKEND)
+
+
+def _build_client() -> httpx.AsyncClient:
+    """
+    Crea el cliente HTTP con pool de conexiones, keep-alive y HTTP/2
+    """
+    # El pool gestiona el keep-alive; "Connection" no está permitido en HTTP/2
+    headers = {k: v for k, v in HEADERS.items() if k.lower() != "connection"}
+    return httpx.AsyncClient(
+        headers=headers,
+        follow_redirects=True,
+        timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT, read=READ_TIMEOUT),
+        http2=HTTP2,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def start_http_client() -> None:
+    """
+    Inicializa el cliente HTTP compartido
+    """
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+
+async def close_http_client() -> None:
+    """
+    Cierra el cliente HTTP compartido y libera las conexiones del pool
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    # El estado del regulador (colas, temporizadores) es del event loop actual
+    governor.reset()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente compartido, creándolo si se usa fuera de la app (scripts)
+    """
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+# Respuestas que merece la pena reintentar (saturación o fallo temporal del origen)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"HTTP {response.status_code} for url '{response.url}'")
+        self.response = response
+
+
+async def _get_once(url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
     """
-    Realiza una petición HTTP y devuelve el contenido parseado con BeautifulSoup
+    Un GET a través del regulador; registra el resultado en el circuito del host
     """
+    breaker = governor.breaker(url)
     try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=TIMEOUT) as client:
-            response = await client.get(url, headers=HEADERS)
+        # El regulador limita ritmo y concurrencia por host y prioriza a los usuarios
+        async with governor.slot(url) as slot:
+            start = time.perf_counter()
+            try:
+                response = await get_http_client().get(url, headers=headers)
+            except httpx.TransportError:
+                record_fetch(time.perf_counter() - start, None)
+                raise
+            record_fetch(time.perf_counter() - start, response.status_code, len(response.content))
+            slot.record(response.status_code, response.headers.get("Retry-After"))
+    except httpx.TransportError:
+        breaker.record(False)
+        raise
+    breaker.record(response.status_code < 500)
+    if response.status_code in RETRY_STATUSES:
+        raise _RetryableStatus(response)
+    return response
+
+
+async def _get_hedged(url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """
+    GET con petición de respaldo: si la primera tarda más que el p95 reciente
+    del host se lanza otra y gana la primera respuesta correcta
+    """
+    if (
+        not HEDGE_ENABLED
+        or current_priority() != PRIORITY_USER
+        or governor.breaker(url).state != CircuitBreaker.CLOSED
+    ):
+        return await _get_once(url, headers)
+
+    delay = governor.host(url).latency_percentile(0.95) or HEDGE_DELAY
+    pending = {asyncio.ensure_future(_get_once(url, headers))}
+    # Cualquier salida (también una cancelación) cancela las peticiones en curso
+    try:
+        done, pending = await asyncio.wait(pending, timeout=max(delay, HEDGE_MIN_DELAY))
+        if done:
+            return next(iter(done)).result()
+
+        pending.add(asyncio.ensure_future(_get_once(url, headers)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                return succeeded[0].result()
+            failed = next(iter(done))
+        # Las dos han fallado: se propaga el último error
+        return failed.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _download(url: str) -> Optional[bytes]:
+    """
+    Descarga el HTML de una URL usando el cliente compartido, con reintentos
+    (espera exponencial aleatoria) ante errores de red, 429 y 5xx.
+    Si se conocen sus validadores la petición es condicional y un 304
+    devuelve el HTML guardado.
+    """
+    known = validators.get(url)
+    headers = known.headers() if known is not None else None
+    for attempt in range(FETCH_RETRIES + 1):
+        if not governor.breaker(url).allow():
+            # Origen caído: se falla al momento y la caché sirve lo que tenga
+            print(f"Error fetching {url}: circuito abierto, origen no disponible")
+            return None
+        try:
+            response = await _get_hedged(url, headers)
+            if response.status_code == 304 and known is not None:
+                validators.not_modified += 1
+                return known.content
             response.raise_for_status()
-            return BeautifulSoup(response.content, 'lxml')
+            validators.store(
+                url,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                response.content,
+            )
+            return response.content
+        except (httpx.TransportError, _RetryableStatus) as e:
+            if attempt == FETCH_RETRIES:
+                print(f"Error fetching {url}: {str(e)}")
+                return None
+            await asyncio.sleep(random.uniform(0, min(FETCH_RETRY_MAX_BACKOFF, FETCH_RETRY_BACKOFF * 2 ** attempt)))
+        except Exception as e:
+            print(f"Error fetching {url}: {str(e)}")
+            return None
+    return None
+
+
+async def fetch_html(url: str) -> Optional[bytes]:
+    """
+    Devuelve el HTML crudo de una URL (cacheado durante CACHE_TTL_HTML)
+    """
+    # Descargas concurrentes de la misma URL comparten una única petición;
+    # el HTML crudo nunca se sirve caducado
+    content, _ = await response_cache.get_or_load(
+        f"html:{url}", CACHE_TTL_HTML, lambda: _download(url), bytes, stale_ttl=0
+    )
+    return content or None
+
+
+def parse_html(content: bytes):
+    """
+    Parsea HTML crudo con el backend configurado y devuelve el nodo raíz
+    (API común de parsing.py)
+    """
+    return _parse(content)
+
+
+async def fetch_page(url: str):
+    """
+    Realiza una petición HTTP y devuelve el contenido parseado
+    """
+    content = await fetch_html(url)
+    if not content:
+        return None
+    return parse_html(content)
+
+
+# Pool donde se parsea el HTML y se extraen los datos, fuera del event loop
+_parse_executor: Optional[Executor] = None
+
+
+def _get_parse_executor() -> Optional[Executor]:
+    global _parse_executor
+    if PARSE_EXECUTOR == "inline":
+        return None
+    if _parse_executor is None:
+        if PARSE_EXECUTOR == "process":
+            _parse_executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        elif PARSE_EXECUTOR == "thread":
+            _parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="parse")
+        else:
+            raise ValueError(f"PARSE_EXECUTOR desconocido: {PARSE_EXECUTOR!r} (inline, thread o process)")
+    return _parse_executor
+
+
+def shutdown_parse_pool() -> None:
+    """
+    Detiene el pool de parseo
+    """
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+
+
+def _to_plain(value: Any) -> Any:
+    """
+    Convierte modelos pydantic (también anidados en listas, tuplas o dicts) a datos planos
+    """
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_plain(item) for key, item in value.items()}
+    return value
+
+
+def _scraper_name(parse_fn: Callable[..., Any]) -> str:
+    # Etiqueta de las métricas: parse_series_list -> series_list
+    return parse_fn.__name__.removeprefix("parse_")
+
+
+def _parse_timed(parse_fn: Callable[..., Any], content: bytes, args: tuple) -> Tuple[Any, float, float]:
+    start = time.perf_counter()
+    root = parse_html(content)
+    parsed = time.perf_counter()
+    result = parse_fn(root, *args)
+    return result, parsed - start, time.perf_counter() - parsed
+
+
+def _parse_to_plain(parse_fn: Callable[..., Any], content: bytes, args: tuple) -> Tuple[Any, float, float, list]:
+    """
+    Se ejecuta en el pool: parsea el HTML, extrae y devuelve datos planos,
+    junto con los tiempos y los fallos de extracción (las métricas se
+    registran en el proceso principal)
+    """
+    token = collect_parse_failures()
+    try:
+        result, parse_seconds, extract_seconds = _parse_timed(parse_fn, content, args)
+    finally:
+        failures = finish_parse_failures(token)
+    return _to_plain(result), parse_seconds, extract_seconds, failures
+
+
+async def parse_in_pool(content: bytes, parse_fn: Callable[..., Any], result_type: Any, *args: Any) -> Any:
+    """
+    Parsea `content` y aplica `parse_fn(raíz, *args)` en el pool de parseo.
+    Con el pool de procesos solo cruzan datos planos y el resultado se
+    reconstruye como `result_type`; con el de hilos se devuelve tal cual.
+    Si el mismo HTML ya se parseó se devuelve el resultado anterior (que se
+    comparte, así que no debe modificarse).
+    `parse_fn` debe ser una función de módulo (se serializa con pickle en
+    el modo process).
+    """
+    # Mismo HTML que la última vez (304 o sin cambios): mismo resultado
+    key = parsed_results.key(parse_fn, content, args)
+    result = parsed_results.get(key)
+    if result is not None:
+        return result
+
+    executor = _get_parse_executor()
+    if executor is None:
+        result, parse_seconds, extract_seconds = _parse_timed(parse_fn, content, args)
+    elif isinstance(executor, ThreadPoolExecutor):
+        # Mismo proceso: los fallos de extracción se cuentan directamente
+        loop = asyncio.get_running_loop()
+        result, parse_seconds, extract_seconds = await loop.run_in_executor(
+            executor, _parse_timed, parse_fn, content, args
+        )
+    else:
+        loop = asyncio.get_running_loop()
+        data, parse_seconds, extract_seconds, failures = await loop.run_in_executor(
+            executor, _parse_to_plain, parse_fn, content, args
+        )
+        count_parse_failures(failures)
+        result = type_adapter(result_type).validate_python(data)
+    record_parse(_scraper_name(parse_fn), parse_seconds, extract_seconds)
+
+    parsed_results.set(key, result)
+    return result
+
+
+async def stream_parse(
+    url: str,
+    stop: Callable[[Any], bool],
+    parse_fn: Callable[..., Any],
+    result_type: Any,
+    *args: Any,
+) -> Any:
+    """
+    Descarga `url` en streaming y va alimentando un parser incremental de lxml.
+    `stop(elemento)` recibe cada elemento según se cierra; cuando devuelve True
+    se corta la descarga (se cierra la respuesta) y `parse_fn(raíz, *args)` se
+    aplica al árbol parcial. Si la condición no se cumple se procesa la página
+    completa, con el mismo resultado que parse_in_pool, y se guarda en la
+    caché de HTML.
+
+    Si el HTML ya está en caché, se está descargando o se conocen sus
+    validadores se usa fetch_html (caché, single-flight y petición
+    condicional) y parse_in_pool.
+    """
+    key = f"html:{url}"
+    if await response_cache.get(key, bytes) is not None or response_cache.loading(key) or validators.get(url) is not None:
+        content = await fetch_html(url)
+        if not content:
+            return None
+        return await parse_in_pool(content, parse_fn, result_type, *args)
+
+    breaker = governor.breaker(url)
+    if not breaker.allow():
+        print(f"Error fetching {url}: circuito abierto, origen no disponible")
+        return None
+    start = time.perf_counter()
+    parse_seconds = 0.0
+    chunks = []
+    done = False
+    try:
+        async with governor.slot(url) as slot:
+            async with get_http_client().stream("GET", url) as response:
+                slot.record(response.status_code, response.headers.get("Retry-After"))
+                breaker.record(response.status_code < 500)
+                response.raise_for_status()
+                # Sin charset en la cabecera, el del <meta> del documento
+                parser = LxmlStreamParser(response.charset_encoding)
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    # Cada trozo se parsea al llegar: el coste queda repartido
+                    chunk_start = time.perf_counter()
+                    done = any(stop(el) for el in parser.feed(chunk))
+                    parse_seconds += time.perf_counter() - chunk_start
+                    if done:
+                        break
+                status_code = response.status_code
+                headers = response.headers
+    except httpx.TransportError as e:
+        breaker.record(False)
+        record_fetch(time.perf_counter() - start, None)
+        print(f"Error fetching {url}: {str(e)}")
+        return None
     except Exception as e:
         print(f"Error fetching {url}: {str(e)}")
         return None
+    content = b"".join(chunks)
+    record_fetch(time.perf_counter() - start - parse_seconds, status_code, len(content))
+    if not done:
+        # Página completa: la pueden reutilizar fetch_html y la revalidación
+        response_cache.set(key, content, CACHE_TTL_HTML, bytes, stale_ttl=0)
+        validators.store(url, headers.get("ETag"), headers.get("Last-Modified"), content)
+
+    root = parser.close()
+    # El árbol no se puede enviar a otro proceso: con el pool de procesos la
+    # extracción va al pool de hilos por defecto del event loop
+    executor = _get_parse_executor()
+    extract_start = time.perf_counter()
+    if executor is None:
+        result = parse_fn(root, *args)
+    else:
+        loop = asyncio.get_running_loop()
+        thread_executor = executor if isinstance(executor, ThreadPoolExecutor) else None
+        result = await loop.run_in_executor(thread_executor, parse_fn, root, *args)
+    record_parse(_scraper_name(parse_fn), parse_seconds, time.perf_counter() - extract_start)
+    return result
 
 
 def extract_id_from_url(url: str) -> str: